@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import os
+import sys
+import json
+import cProfile
+import pstats
+import subprocess
+from optparse import OptionParser
+
+# Modify python path
+projdir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+pypath = os.path.join(projdir, 'src', 'python')
+sys.path.insert(0, pypath)
+
+from marbles.ie.ccg.datapath import list_ldc_auto_files, iter_ldc_derivations
+from marbles.ie.semantics.benchmark import ComposeBenchmark, compare_benchmarks
+
+
+def iter_derivations(files, stride):
+    for fn in files:
+        i = 0
+        for uid, ccgbank in iter_ldc_derivations(fn):
+            if (i % stride) == 0:
+                yield uid, ccgbank
+            i += 1
+
+
+def get_commit_id():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=projdir).strip()
+    except Exception:
+        return None
+
+
+if __name__ == '__main__':
+    usage = 'Usage: %prog [options] [auto-files]'
+    parser = OptionParser(usage)
+    parser.add_option('-s', '--sections', type='string', action='store', dest='sections', default='00',
+                      help='Comma separated list of ccgbank sections. Used when no files are given. Default is 00.')
+    parser.add_option('-n', '--limit', type='int', action='store', dest='limit', default=None,
+                      help='Maximum number of derivations.')
+    parser.add_option('-k', '--stride', type='int', action='store', dest='stride', default=1,
+                      help='Use every k\'th derivation in each file.')
+    parser.add_option('-o', '--output', type='string', action='store', dest='output', default=None,
+                      help='Save results as json.')
+    parser.add_option('-c', '--compare', type='string', action='store', dest='compare', default=None,
+                      help='Compare results with a json file saved by a previous run.')
+    parser.add_option('-p', '--profile', type='string', action='store', dest='profile', default=None,
+                      help='Run under cProfile and save the stats to this file.')
+    parser.add_option('-m', '--tracemalloc', action='store_true', dest='tracemalloc', default=False,
+                      help='Track allocations per rule. Counts bytes with tracemalloc when available, '
+                           'otherwise counts gc objects.')
+
+    (options, args) = parser.parse_args()
+    files = args if len(args) != 0 else list_ldc_auto_files(sections=options.sections.split(','))
+    bench = ComposeBenchmark(trace_alloc=options.tracemalloc)
+    derivations = iter_derivations(files, max(1, options.stride))
+
+    if options.profile is not None:
+        profiler = cProfile.Profile()
+        profiler.runcall(bench.run, derivations, options.limit)
+        profiler.dump_stats(options.profile)
+        pstats.Stats(options.profile).sort_stats('cumulative').print_stats(30)
+    else:
+        bench.run(derivations, options.limit)
+
+    bench.print_report()
+    result = bench.get_json(get_commit_id())
+
+    if options.output is not None:
+        with open(options.output, 'w') as fd:
+            json.dump(result, fd, indent=2, sort_keys=True)
+
+    if options.compare is not None:
+        with open(options.compare, 'r') as fd:
+            base = json.load(fd)
+        print('\nComparison with %s (%s)' % (options.compare, base.get('label')))
+        print('%-10s %12s %12s %8s' % ('rule', 'base(us)', 'now(us)', 'ratio'))
+        for rule, b, c, r in compare_benchmarks(base, result):
+            print('%-10s %12.2f %12.2f %8.2f' % (rule, 1000000.0 * b, 1000000.0 * c, r))
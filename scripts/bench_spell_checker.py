@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import os
+import sys
+import time
+import resource
+import argparse
+
+
+# Modify python path
+projdir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+pypath = os.path.join(projdir, 'src', 'python')
+sys.path.insert(0, pypath)
+
+
+from marbles.ie.kb.spell import SymSpell, CompiledSymSpell, NBEST_SUGGESTIONS
+
+
+def maxrss_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+if __name__ == '__main__':
+    datapath = os.path.join(pypath, 'marbles', 'ie', 'kb', 'data')
+    parser = argparse.ArgumentParser(description='Compare memory and latency of the text and compiled spelling dictionaries.')
+    parser.add_argument('-f', '--format', type=str, choices=['dat', 'bin'], default='bin',
+                        help='Dictionary format. Run once per format since memory is measured per process.')
+    parser.add_argument('-w', '--words', type=str, default=None,
+                        help='File of words to look up, one per line. Default is a small built-in list.')
+    args = parser.parse_args()
+
+    if args.words is not None:
+        with open(args.words, 'r') as fp:
+            words = [x.strip() for x in fp if len(x.strip()) != 0]
+    else:
+        words = ['acept', 'cepted', 'accomodation', 'recieve', 'goverment', 'there', 'hellot', 'beleive',
+                 'occured', 'seperate', 'untill', 'wich', 'publically', 'tommorow', 'embarass']
+
+    rss = maxrss_mb()
+    start = time.time()
+    if args.format == 'bin':
+        spellchecker = CompiledSymSpell.load(os.path.join(datapath, 'dictionary-en.bin'))
+    else:
+        spellchecker = SymSpell()
+        with open(os.path.join(datapath, 'dictionary-en.dat'), 'r') as fp:
+            spellchecker.restore(fp)
+    load_time = time.time() - start
+    rss = maxrss_mb() - rss
+
+    start = time.time()
+    for w in words:
+        spellchecker.get_suggestions(w, NBEST_SUGGESTIONS)
+    search_time = time.time() - start
+
+    print('format:               %s' % args.format)
+    print('dictionary entries:   %d' % len(spellchecker.dictionary))
+    print('load time:            %.3f seconds' % load_time)
+    print('resident memory:      %.1f MB' % rss)
+    print('get_suggestions:      %.3f ms/word over %d words' % (1000.0 * search_time / len(words), len(words)))
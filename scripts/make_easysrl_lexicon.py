@@ -5,6 +5,7 @@ from __future__ import unicode_literals, print_function
 import os
 import re
 import sys
+from optparse import OptionParser
 
 # Modify python path
 projdir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
@@ -16,7 +17,9 @@ sys.path.insert(0, pypath)
 #from marbles.ie.parse import parse_ccg_derivation
 from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation
 from marbles.ie.ccg.utils import sentence_from_pt
-from marbles.ie.semantics.ccg import extract_lexicon_from_pt
+from marbles.ie.semantics.ccg import iter_lexicon_from_pt
+from marbles.ie.semantics.lexicon import save_lexicon
+from marbles.ie.utils.mapreduce import map_ordered, clear_checkpoints
 from marbles.ie.ccg import Category
 from marbles import safe_utf8_encode, safe_utf8_decode
 
@@ -41,7 +44,33 @@ def print_progress(progress, tick=1, done=False):
 idsrch = re.compile(r'^.*ccg_derivation(?P<id>\d+)\.txt')
 
 
-def make_lexicon(daemon):
+def extract_lexicon_from_file(fn):
+    """Map step for make_lexicon(). Runs in a worker process.
+
+    Returns:
+        A list of (dictionary-index, stem, usage, uid) tuples in the order they were found.
+    """
+    idx = idsrch.match(fn).group('id')
+    with open(fn, 'r') as fd:
+        lines = fd.readlines()
+
+    entries = []
+    for i in range(len(lines)):
+        ccgbank = lines[i].strip()
+        if len(ccgbank) == 0 or ccgbank[0] == '#':
+            continue
+
+        # CCG parser is Java so output is UTF-8.
+        ccgbank = safe_utf8_decode(ccgbank)
+        pt = parse_ccg_derivation(ccgbank)
+        s = sentence_from_pt(pt).strip()
+
+        uid = '%s-%04d' % (idx, i)
+        entries.extend([(n, stem, c, uid) for n, stem, c in iter_lexicon_from_pt(pt)])
+    return entries
+
+
+def make_lexicon(daemon, processes=1, checkpoint_dir=None):
     global pypath, projdir, datapath, idsrch
     allfiles = []
     projdir = os.path.dirname(os.path.dirname(__file__))
@@ -62,53 +91,22 @@ def make_lexicon(daemon):
         if 'ccg_derivation' not in fname:
             continue
         ldcpath1 = os.path.join(ldcpath, fname)
-        if os.path.isfile(ldcpath1):
+        if os.path.isfile(ldcpath1) and idsrch.match(ldcpath1) is not None:
             allfiles.append(ldcpath1)
 
-    failed_parse = 0
-    failed_ccg_derivation = []
-    start = 0
-    progress = -1
-    dictionary = None
-    for fn in allfiles:
-        idx = idsrch.match(fn)
-        if idx is None:
-            continue
-        idx = idx.group('id')
-
-        with open(fn, 'r') as fd:
-            lines = fd.readlines()
-
-        name, _ = os.path.splitext(os.path.basename(fn))
-        for i in range(start, len(lines)):
-            start = 0
-            ccgbank = lines[i].strip()
-            if len(ccgbank) == 0 or ccgbank[0] == '#':
-                continue
-
-            if progress < 0:
-                print('%s-%04d' % (name, i))
-            else:
-                progress = print_progress(progress, 10)
-
-            try:
-                # CCG parser is Java so output is UTF-8.
-                ccgbank = safe_utf8_decode(ccgbank)
-                pt = parse_ccg_derivation(ccgbank)
-                s = sentence_from_pt(pt).strip()
-            except Exception:
-                failed_parse += 1
-                raise
-                continue
-
-            uid = '%s-%04d' % (idx, i)
-            try:
-                #dictionary[0-25][stem][set([c]), set(uid)]
-                dictionary = extract_lexicon_from_pt(pt, dictionary, uid=uid)
-            except Exception as e:
-                print(e)
-                raise
-                continue
+    #dictionary[0-25][stem][set([c]), set(uid)]
+    dictionary = map(lambda x: {}, [None]*27)
+    # Replay the entries in file order so dictionary iteration order, and hence the output, is the
+    # same as a serial run.
+    for fn, entries in map_ordered(extract_lexicon_from_file, allfiles, processes, checkpoint_dir):
+        print('%s: %d entries' % (os.path.basename(fn), len(entries)))
+        for n, stem, c, uid in entries:
+            di = dictionary[n].setdefault(stem, {})
+            si = di.setdefault(c, set())
+            si.add(uid)
+
+    # Indexed copy of the lexicon, see marbles.ie.semantics.lexicon.CompactLexicon.
+    save_lexicon(dictionary, os.path.join(easysrl_path, 'lexicon.bin'))
 
     rtdict = {}
     for idx in range(len(dictionary)):
@@ -155,8 +153,18 @@ def make_lexicon(daemon):
 
 
 if __name__ == '__main__':
-    make_lexicon('easysrl')
-    make_lexicon('neuralccg')
+    usage = 'Usage: %prog [options] [daemons]'
+    parser = OptionParser(usage)
+    parser.add_option('-j', '--processes', type='int', action='store', dest='processes', default=1,
+                      help='Number of worker processes. Use 0 for the cpu count. Default is 1.')
+    parser.add_option('-C', '--checkpoint-dir', type='string', action='store', dest='checkpoint_dir', default=None,
+                      help='Save per file results here so an interrupted run can be resumed.')
+
+    (options, args) = parser.parse_args()
+    for daemon in args or ['easysrl', 'neuralccg']:
+        checkpoint_dir = None if options.checkpoint_dir is None else os.path.join(options.checkpoint_dir, daemon)
+        make_lexicon(daemon, options.processes or None, checkpoint_dir)
+        clear_checkpoints(checkpoint_dir)
 
 
 
@@ -54,5 +54,7 @@ if __name__ == '__main__':
     print("  length of longest word in corpus: %i" % spellchecker.longest_word_length)
     with open(os.path.join(pypath, 'marbles', 'ie', 'kb', 'data', 'dictionary-en.dat'), 'w') as fp:
         spellchecker.save(fp)
+    with open(os.path.join(pypath, 'marbles', 'ie', 'kb', 'data', 'dictionary-en.bin'), 'wb') as fp:
+        spellchecker.save_compiled(fp)
 
 
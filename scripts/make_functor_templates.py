@@ -21,7 +21,9 @@ from marbles.ie.ccg.model import FunctorTemplate, Model
 from marbles.ie.ccg import Category
 from marbles.ie.utils.cache import Cache
 from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation
-from marbles.ie.semantics.ccg import Ccg2Drs, PushOp, save_undefined_unary_rules
+from marbles.ie.semantics.ccg import Ccg2Drs, PushOp, save_undefined_unary_rules, get_undefined_unary_rules, \
+    add_undefined_unary_rules
+from marbles.ie.utils.mapreduce import map_ordered, clear_checkpoints
 
 #from marbles.ie.parse import parse_ccg_derivation
 
@@ -38,8 +40,71 @@ def print_progress(progress, tick=1, done=False):
     return progress
 
 
+def extract_from_ldc_file(fn):
+    """Map step for build_from_ldc_ccgbank(). Runs in a worker process.
+
+    Returns:
+        A tuple of the predarg category signatures, parse failure messages, and undefined unary rules
+        found in the file.
+    """
+    with open(fn, 'r') as fd:
+        lines = fd.readlines()
+    predargs = []
+    failed_parse = []
+    unary = get_undefined_unary_rules()
+    for hdr,ccgbank in zip(lines[0::2], lines[1::2]):
+        pt = None
+        try:
+            pt = parse_ccg_derivation(ccgbank)
+            extract_predarg_categories_from_pt(pt, predargs)
+        except Exception as e:
+            failed_parse.append(safe_utf8_encode('CCGBANK: ' + ccgbank.strip()))
+            failed_parse.append(safe_utf8_encode('Error: %s' % e))
+        # Now attempt to track undefined unary rules
+        if pt is not None:
+            try:
+                builder = Ccg2Drs()
+                builder.build_execution_sequence(pt)
+                # Calling this will track undefined
+                builder.get_predarg_ccgbank()
+            except Exception as e:
+                pass
+    # Categories are returned as signatures to keep the pickled result small.
+    return [x.signature for x in predargs], failed_parse, get_undefined_unary_rules().difference(unary)
+
+
+def extract_from_ldc_file2(fn):
+    """Map step for build_from_ldc_ccgbank2(). Runs in a worker process.
+
+    Returns:
+        A tuple of the predarg category signatures, parse failure messages, and undefined unary rules
+        found in the file.
+    """
+    with open(fn, 'r') as fd:
+        lines = fd.readlines()
+    predargs = []
+    failed_parse = []
+    unary = get_undefined_unary_rules()
+    for hdr,ccgbank in zip(lines[0::2], lines[1::2]):
+        pt = None
+        try:
+            pt = parse_ccg_derivation(ccgbank)
+            builder = Ccg2Drs()
+            builder.build_execution_sequence(pt)
+            for x in filter(lambda x: x.isinstance(PushOp), builder.exeque):
+                predargs.append(x.predarg)
+            # Calling this will track undefined. The category cache is cleared, and so disabled, by the
+            # caller so there is nothing else to return to the parent.
+            builder.get_predarg_ccgbank()
+        except Exception as e:
+            failed_parse.append(safe_utf8_encode('CCGBANK: ' + ccgbank.strip()))
+            failed_parse.append(safe_utf8_encode('Error: %s' % e))
+    # Categories are returned as signatures to keep the pickled result small.
+    return [x.signature for x in predargs], failed_parse, get_undefined_unary_rules().difference(unary)
+
+
 # deprecated - use build_from_ldc_ccgbank2
-def build_from_ldc_ccgbank(fn_dict, outdir, verbose=False, verify=True):
+def build_from_ldc_ccgbank(fn_dict, outdir, verbose=False, verify=True, processes=1, checkpoint_dir=None):
     print('Building function templates from LDC ccgbank...')
 
     allfiles = []
@@ -58,27 +123,13 @@ def build_from_ldc_ccgbank(fn_dict, outdir, verbose=False, verify=True):
     failed_rules = []
     rules = []
     progress = 0
-    for fn in allfiles:
+    # Results are merged in file order so the output matches a serial run.
+    for fn, result in map_ordered(extract_from_ldc_file, allfiles, processes, checkpoint_dir):
         progress = print_progress(progress, 10)
-        with open(fn, 'r') as fd:
-            lines = fd.readlines()
-        for hdr,ccgbank in zip(lines[0::2], lines[1::2]):
-            pt = None
-            try:
-                pt = parse_ccg_derivation(ccgbank)
-                extract_predarg_categories_from_pt(pt, rules)
-            except Exception as e:
-                failed_parse.append(safe_utf8_encode('CCGBANK: ' + ccgbank.strip()))
-                failed_parse.append(safe_utf8_encode('Error: %s' % e))
-            # Now attempt to track undefined unary rules
-            if pt is not None:
-                try:
-                    builder = Ccg2Drs()
-                    builder.build_execution_sequence(pt)
-                    # Calling this will track undefined
-                    builder.get_predarg_ccgbank()
-                except Exception as e:
-                    pass
+        predargs, failed, unary = result
+        rules.extend([Category(x) for x in predargs])
+        failed_parse.extend(failed)
+        add_undefined_unary_rules(unary)
 
     progress = (progress / 10) * 1000
     for predarg in rules:
@@ -125,7 +176,7 @@ def build_from_ldc_ccgbank(fn_dict, outdir, verbose=False, verify=True):
     return fn_dict
 
 
-def build_from_ldc_ccgbank2(fn_dict, outdir, verbose=False, verify=True):
+def build_from_ldc_ccgbank2(fn_dict, outdir, verbose=False, verify=True, processes=1, checkpoint_dir=None):
     print('Building function templates from LDC ccgbank...')
 
     allfiles = []
@@ -144,23 +195,13 @@ def build_from_ldc_ccgbank2(fn_dict, outdir, verbose=False, verify=True):
     failed_rules = []
     rules = []
     progress = 0
-    for fn in allfiles:
+    # Results are merged in file order so the output matches a serial run.
+    for fn, result in map_ordered(extract_from_ldc_file2, allfiles, processes, checkpoint_dir):
         progress = print_progress(progress, 10)
-        with open(fn, 'r') as fd:
-            lines = fd.readlines()
-        for hdr,ccgbank in zip(lines[0::2], lines[1::2]):
-            pt = None
-            try:
-                pt = parse_ccg_derivation(ccgbank)
-                builder = Ccg2Drs()
-                builder.build_execution_sequence(pt)
-                for x in filter(lambda x: x.isinstance(PushOp), builder.exeque):
-                    rules.append(x.predarg)
-                # Calling this will track undefined and add to category cache
-                builder.get_predarg_ccgbank()
-            except Exception as e:
-                failed_parse.append(safe_utf8_encode('CCGBANK: ' + ccgbank.strip()))
-                failed_parse.append(safe_utf8_encode('Error: %s' % e))
+        predargs, failed, unary = result
+        rules.extend([Category(x) for x in predargs])
+        failed_parse.extend(failed)
+        add_undefined_unary_rules(unary)
 
     progress = (progress / 10) * 1000
     for predarg in rules:
@@ -275,6 +316,10 @@ if __name__ == "__main__":
     parser.add_option('-L', '--ldc', action='store_true', dest='ldc', default=False, help='Use LDC to generate template.')
     parser.add_option('-M', '--merge', action='store_true', dest='merge', default=False, help='Merge old cached categories.')
     parser.add_option('-v', '--verbose', action='store_true', dest='verbose', default=False, help='Verbose output.')
+    parser.add_option('-j', '--processes', type='int', action='store', dest='processes', default=1,
+                      help='Number of worker processes for -L. Use 0 for the cpu count. Default is 1.')
+    parser.add_option('-C', '--checkpoint-dir', type='string', action='store', dest='checkpoint_dir', default=None,
+                      help='Save per file results for -L here so an interrupted run can be resumed.')
 
     (options, args) = parser.parse_args()
     fn_dict = {}
@@ -301,7 +346,9 @@ if __name__ == "__main__":
         build_from_model(fn_dict, outdir, options.esrl, options.verbose)
 
     if options.ldc:
-        build_from_ldc_ccgbank(fn_dict, outdir, options.verbose)
+        build_from_ldc_ccgbank(fn_dict, outdir, options.verbose, processes=options.processes or None,
+                               checkpoint_dir=options.checkpoint_dir)
+        clear_checkpoints(options.checkpoint_dir)
 
     elapsed = datetime.datetime.now() - tstart
     print('Processing time = %d seconds' % elapsed.total_seconds())
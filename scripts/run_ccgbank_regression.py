@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import os
+import sys
+import json
+from optparse import OptionParser
+
+# Modify python path
+projdir = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+pypath = os.path.join(projdir, 'src', 'python')
+sys.path.insert(0, pypath)
+
+from marbles.ie.ccg.datapath import list_ldc_auto_files, iter_ldc_derivations, list_easysrl_files, \
+    iter_easysrl_derivations
+from marbles.ie.semantics.regression import RegressionHarness, ResultCache, CHECKS, compare_results
+
+
+def iter_derivations(files, iterfn, stride):
+    for fn in files:
+        i = 0
+        for uid, ccgbank in iterfn(fn):
+            if (i % stride) == 0:
+                yield uid, ccgbank
+            i += 1
+
+
+if __name__ == '__main__':
+    usage = 'Usage: %prog [options] [files]'
+    parser = OptionParser(usage)
+    parser.add_option('-c', '--check', type='string', action='store', dest='check', default='compose',
+                      help='Check to run, one of [%s]. Default is compose.' % ', '.join(sorted(CHECKS.keys())))
+    parser.add_option('-s', '--sections', type='string', action='store', dest='sections', default=None,
+                      help='Comma separated list of ccgbank sections. Default is all sections.')
+    parser.add_option('-e', '--easysrl', action='store_true', dest='easysrl', default=False,
+                      help='Use the EasySRL derivations rather than the LDC AUTO files.')
+    parser.add_option('-j', '--processes', type='int', action='store', dest='processes', default=None,
+                      help='Number of worker processes. Default is the cpu count.')
+    parser.add_option('-n', '--limit', type='int', action='store', dest='limit', default=None,
+                      help='Maximum number of derivations.')
+    parser.add_option('-k', '--stride', type='int', action='store', dest='stride', default=1,
+                      help='Use every k\'th derivation in each file.')
+    parser.add_option('-C', '--cache-dir', type='string', action='store', dest='cache_dir',
+                      default=os.path.join(projdir, 'build', 'regression'),
+                      help='Result cache folder. Default is build/regression.')
+    parser.add_option('-N', '--no-cache', action='store_true', dest='no_cache', default=False,
+                      help='Do not read or write cached results.')
+    parser.add_option('-b', '--baseline', type='string', action='store', dest='baseline', default=None,
+                      help='Compare with results cached for this code version. Use "last" for the most recent '
+                           'other version.')
+    parser.add_option('-o', '--output', type='string', action='store', dest='output', default=None,
+                      help='Save the report as json.')
+
+    (options, args) = parser.parse_args()
+    if options.easysrl:
+        files = args if len(args) != 0 else list_easysrl_files()
+        iterfn = iter_easysrl_derivations
+    else:
+        sections = options.sections.split(',') if options.sections is not None else None
+        files = args if len(args) != 0 else list_ldc_auto_files(sections=sections)
+        iterfn = iter_ldc_derivations
+
+    cache_dir = None if options.no_cache else options.cache_dir
+    harness = RegressionHarness(options.check, cache_dir=cache_dir, processes=options.processes)
+    harness.run(iter_derivations(files, iterfn, max(1, options.stride)), options.limit)
+    harness.print_report()
+
+    if options.output is not None:
+        with open(options.output, 'w') as fd:
+            json.dump(harness.get_json(), fd, indent=2, sort_keys=True)
+
+    if options.baseline is not None and harness.cache is not None:
+        baseline = options.baseline
+        if baseline == 'last':
+            versions = filter(lambda x: x != harness.version,
+                              ResultCache.list_versions(options.cache_dir, options.check))
+            baseline = versions[0] if len(versions) != 0 else None
+        if baseline is None:
+            print('No baseline results found')
+        else:
+            changes = compare_results(ResultCache(options.cache_dir, options.check, baseline), harness.cache)
+            print('\nComparison with version %s: %d changes' % (baseline, len(changes)))
+            for uid, change in changes:
+                print('  %-8s %s' % (change, uid))
+
+    sys.exit(0 if len(harness.failed) == 0 else 1)
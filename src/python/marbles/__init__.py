@@ -30,6 +30,10 @@ class Properties(object):
     # Exception rate limit. Exceptions of the same type, from same caller and line number are
     # are rate limited to 1 every `exception_rlimit` seconds.
     exception_rlimit = 2.0
+    # Cache freerefs, variables, constants, universes and accessible_universe on DRS instances.
+    drs_cache = True
+    # Cross-check cached DRS properties against a full traversal. Slow, use for debugging only.
+    drs_cache_verify = False
 
 
 try:
@@ -4,20 +4,21 @@ from __future__ import unicode_literals, print_function
 
 import StringIO
 import base64
+import collections
 import json
 import logging
 import mimetypes
 import time
 
 import boto3
+import botocore.exceptions
 import requests
-from nltk.tokenize import sent_tokenize
 
 from marbles.ie import grpc
 from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation
 from marbles.ie.semantics.ccg import process_ccg_pt
 from marbles.log import ExceptionRateLimitedLogAdaptor
-from marbles.ie.utils.text import preprocess_sentence
+from stream import CcgQueueSink, IndexSink, iter_article_sentences
 from svc import ServiceState
 
 _logger = ExceptionRateLimitedLogAdaptor(logging.getLogger(__name__))
@@ -39,6 +40,63 @@ def receive_messages(*args, **kwargs):
                     yield m
 
 
+def get_message_attributes(arc, hash, s3path, session=None, timeout=None):
+    """Get the news queue message attributes for an archived article. The thumbnail image, if any, is
+    stored in the message so the website has immediate access.
+
+    Args:
+        arc: The dictionary returned from Article.archive().
+        hash: The article hash.
+        s3path: The S3 bucket and object path of the archived article.
+        session: Optional requests session used to fetch the thumbnail.
+        timeout: Optional thumbnail request timeout.
+
+    Returns:
+        A dictionary of SQS message attributes.
+    """
+    global _logger
+    attributes = {
+        's3': {
+            'DataType': 'String',
+            'StringValue': s3path
+        },
+        'hash': {
+            'DataType': 'String',
+            'StringValue': hash
+        }
+    }
+    d = arc.setdefault('media', {})
+    if d.setdefault('thumbnail', -1) >= 0:
+        try:
+            media = d['content'][ d['thumbnail']]
+            r = (session or requests).get(media['url'], timeout=timeout)
+            b64media = base64.b64encode(r.content)
+            attributes['media_thumbnail'] = {
+                'DataType': 'String',
+                'StringValue': b64media
+            }
+            if 'type' in media:
+                attributes['media_type'] = {
+                    'DataType': 'String',
+                    'StringValue': media['type']
+                }
+            else:
+                # Infer type
+                mtype, _ = mimetypes.guess_type(media['url'])
+                if mtype is not None:
+                    attributes['media_type'] = {
+                        'DataType': 'String',
+                        'StringValue': mtype
+                    }
+                else:
+                    _logger.info('Could not infer mime type for url(%s) - message hash(%s)',
+                                 media['url'], hash)
+        except requests.RequestException as e:
+            # Non critical error - can happen when replaying old stories or when the media server fails
+            _logger.warning('Media not found when processing message hash(%s) - %s', hash, str(e))
+    return attributes
+
+
 class AwsNewsQueueBase(object):
     """News queue base class."""
 
@@ -91,36 +149,82 @@ class AwsNewsQueueReaderResources(AwsNewsQueueBase):
 class AwsNewsQueueWriter(object):
     """News queue writer handler. Reads RSS/ATOM feeds and writes to queue. """
 
-    def __init__(self, aws, state, sources, browser):
+    def __init__(self, aws, state, sources, browser, refresher=None, pool=None, dedup=None, uploader=None):
+        """Constructor.
+
+        Args:
+            aws: An AwsNewsQueueWriterResources instance.
+            state: The service state.
+            sources: A list of news sources. Each source has a scraper and a list of feeds.
+            browser: The browser shared by the source scrapers.
+            refresher: Optional marbles.newsfeed.refresher.FeedRefresher.
+            pool: Optional marbles.newsfeed.pool.ScraperPool. If set articles are archived in parallel
+                by the pool rather than by the source scrapers.
+            dedup: Optional marbles.aws.dedup.DedupIndex. If set hash lookups use the local index and
+                the S3 hash listing is only read in bulk by sync_dedup_index().
+            uploader: Optional marbles.aws.upload.UploadStage. If set S3 puts, thumbnail fetches and
+                news queue sends are overlapped across articles.
+        """
         self.browser = browser
+        self.pool = pool
         self.aws = aws
         self.sources = sources
         self.bucket_cache = set()
-        self.hash_cache = {}
+        # Insertion order is least recently used first
+        self.hash_cache = collections.OrderedDict()
+        self.dedup = dedup
+        self.uploader = uploader
         self.state = state
+        if refresher is None:
+            # Delay import so readers do not depend on the newsfeed scrapers
+            from marbles.newsfeed.refresher import FeedRefresher
+            refresher = FeedRefresher(state=state)
+        self.refresher = refresher
 
     def close(self):
         self.browser.close()
+        if self.pool is not None:
+            self.pool.close()
+        if self.uploader is not None:
+            self.complete_uploads(self.uploader.close())
+        if self.dedup is not None:
+            self.dedup.close()
 
     def check_bucket_exists(self, bucket):
         if bucket in self.bucket_cache:
             return True
-        # Bucket count never exceeds a few 100
-        # Refresh all so we handle deletions
-        self.bucket_cache = set()
-        for bkt in self.aws.s3.buckets.all():
-            self.bucket_cache.add(bkt.name)
-        return bucket in self.bucket_cache
+        # Only check the missing bucket. Deletions are handled by clear_bucket_cache().
+        try:
+            self.aws.s3.meta.client.head_bucket(Bucket=bucket)
+        except botocore.exceptions.ClientError as e:
+            # Other errors, for example 403, do not mean the bucket is missing
+            if e.response.get('Error', {}).get('Code') in ['404', 'NoSuchBucket']:
+                return False
+            raise
+        self.bucket_cache.add(bucket)
+        return True
 
     def check_hash_exists(self, hash):
         if hash in self.hash_cache:
+            # Move to most recently used
+            del self.hash_cache[hash]
             self.hash_cache[hash] = self.state.time()
             return True
-        exists = 0 != len([x for x in self.aws.s3.Bucket('marbles-ai-feeds-hash').objects.filter(Prefix=hash)])
+        if self.dedup is not None:
+            exists = hash in self.dedup
+        else:
+            exists = 0 != len([x for x in self.aws.s3.Bucket('marbles-ai-feeds-hash').objects.filter(Prefix=hash)])
         if exists:
             self.hash_cache[hash] = self.state.time()
         return exists
 
+    def sync_dedup_index(self, interval=6*3600):
+        """Bulk load the S3 hash listing into the local dedup index if the last sync was more than
+        `interval` seconds ago. Picks up articles published by other writers.
+        """
+        if self.dedup is not None and self.dedup.needs_sync(interval):
+            self.dedup.sync(self.aws.s3.Bucket('marbles-ai-feeds-hash'))
+
     def clear_bucket_cache(self):
         self.bucket_cache = set()
 
@@ -130,28 +234,68 @@ class AwsNewsQueueWriter(object):
         if limit >= len(self.hash_cache):
             return
         _logger.info('Retiring hash cache, current-size=%d, required-size=%d', len(self.hash_cache), limit)
-        # Each value is a timestamp floating point
-        vk_sort = sorted(self.hash_cache.items(), key=lambda x: x[1])
-        vk_sort.reverse()
-        self.hash_cache = dict(vk_sort[0:limit])
+        while len(self.hash_cache) > limit:
+            self.hash_cache.popitem(last=False)
 
     def refresh(self):
-        # TODO: Interleave work
+        """Refresh all feeds concurrently.
+
+        Returns:
+            The list of feeds that changed.
+        """
+        global _logger
+        feeds = []
+        for src in self.sources:
+            feeds.extend(src.feeds)
+        changed = self.refresher.refresh(feeds)
+        _logger.debug('Refreshed %d feeds, %d changed', len(feeds), len(changed))
+        return changed
+
+    def read_all(self, ignore_read):
+        self.sync_dedup_index()
+        if self.pool is not None:
+            self.read_all_pooled(ignore_read)
+        else:
+            for src in self.sources:
+                if self.state.terminate:
+                    break
+                self.read_from_source(src, ignore_read)
+            self.browser.get_blank()
+        if self.uploader is not None:
+            self.complete_uploads(self.uploader.flush())
+        if self.dedup is not None:
+            self.dedup.flush()
+
+    def read_all_pooled(self, ignore_read):
+        """Read articles from all sources with the scraper pool."""
+        global _logger
+        items = []
         for src in self.sources:
-            if self.state.terminate:
-                return
             for rss in src.feeds:
                 if self.state.terminate:
                     return
-                rss.refresh()
-                self.state.wait(1)
+                items.extend([(a, type(src.scraper)) for a in rss.get_articles(ignore_read=ignore_read)])
 
-    def read_all(self, ignore_read):
-        for src in self.sources:
-            if self.state.terminate:
-                return
-            self.read_from_source(src, ignore_read)
-        self.browser.get_blank()
+        for a, arc, error in self.pool.archive(items, self.state):
+            if error is not None:
+                _logger.exception('AwsNewsQueueWriter.read_all_pooled', exc_info=error, rlimitby=a.link)
+                if self.state.pass_on_exceptions:
+                    raise error
+                continue
+            hash = ''
+            try:
+                bucket, objname = a.get_aws_s3_names(arc['content'])
+                hash = objname.split('/')[-1]
+                self.publish_article(arc, bucket, objname)
+
+            except KeyboardInterrupt:
+                # Pass on so we can close when running in console mode
+                raise
+
+            except Exception as e:
+                _logger.exception('AwsNewsQueueWriter.read_all_pooled', exc_info=e, rlimitby=hash)
+                if self.state.pass_on_exceptions:
+                    raise
 
     def read_from_source(self, src, ignore_read):
         global _logger
@@ -170,76 +314,9 @@ class AwsNewsQueueWriter(object):
                 arc = a.archive(src.scraper)
                 bucket, objname = a.get_aws_s3_names(arc['content'])
                 hash = objname.split('/')[-1]
-                _logger.debug(hash + ' - ' + arc['title'])
-                if self.check_hash_exists(hash):
+                if not self.publish_article(arc, bucket, objname):
                     continue
 
-                if not self.check_bucket_exists(bucket):
-                    # Create a bucket
-                    self.aws.s3.create_bucket(Bucket=bucket,
-                                              CreateBucketConfiguration={'LocationConstraint': 'us-west-1'})
-                    self.bucket_cache.add(bucket)
-
-                strm = StringIO.StringIO()
-                json.dump(arc, strm, indent=2)
-                objpath = objname+'.json'
-                data = strm.getvalue()
-                self.aws.s3.Object(bucket, objpath).put(Body=data)
-
-                # Add to hash listing - allows us to find entries by hash
-                self.aws.s3.Object('marbles-ai-feeds-hash', hash).put(Body=bucket + '/' + objpath)
-
-                # Add to AWS processing queue
-                if self.aws.news_queue:
-                    attributes = {
-                        's3': {
-                            'DataType': 'String',
-                            'StringValue': bucket + '/' + objpath
-                        },
-                        'hash': {
-                            'DataType': 'String',
-                            'StringValue': hash
-                        }
-                    }
-                    # Store thumbnail in message so website has immediate access
-                    d = arc.setdefault('media', {})
-                    if d.setdefault('thumbnail', -1) >= 0:
-                        try:
-                            media = d['content'][ d['thumbnail']]
-                            r = requests.get(media['url'])
-                            b64media = base64.b64encode(r.content)
-                            attributes['media_thumbnail'] = {
-                                'DataType': 'String',
-                                'StringValue': b64media
-                            }
-                            if 'type' in d['content']:
-                                attributes['media_type'] = {
-                                    'DataType': 'String',
-                                    'StringValue': d['content']['type']
-                                }
-                            else:
-                                # Infer type
-                                mtype, _ = mimetypes.guess_type(media['url'])
-                                if mtype is not None:
-                                    attributes['media_type'] = {
-                                        'DataType': 'String',
-                                        'StringValue': mtype
-                                    }
-                                else:
-                                    _logger.info('Could not infer mime type for url(%s) - message hash(%s)',
-                                                 media['url'], hash)
-                        except requests.ConnectionError as e:
-                            # Non critical error - can happen when replaying old stories
-                            _logger.warning('Media not found when processing message hash(%s) - %s', hash, str(e))
-
-                    # Send the message to our queue
-                    response = self.aws.news_queue.send_message(MessageAttributes=attributes,
-                                                                MessageBody=data)
-                    _logger.debug('Sent hash(%s) -> news_queue(%s)', hash, response['MessageId'])
-
-                # Update hash cache
-                self.hash_cache[hash] = self.state.time()
-
             except KeyboardInterrupt:
                 # Pass on so we can close when running in console mode
                 raise
@@ -253,114 +330,203 @@ class AwsNewsQueueWriter(object):
 
             self.state.wait(1)
 
+    def publish_article(self, arc, bucket, objname):
+        """Save an archived article to S3 and add it to the news queue. If the writer has an upload
+        stage the I/O is done asynchronously and the hash cache is updated by complete_uploads().
+
+        Args:
+            arc: The dictionary returned from Article.archive().
+            bucket: The S3 bucket name.
+            objname: The S3 object name without the json extension.
+
+        Returns:
+            False if the article was already published.
+        """
+        global _logger
+        hash = objname.split('/')[-1]
+        _logger.debug(hash + ' - ' + arc['title'])
+        if self.check_hash_exists(hash) or (self.uploader is not None and hash in self.uploader):
+            return False
+
+        if not self.check_bucket_exists(bucket):
+            # Create a bucket
+            self.aws.s3.create_bucket(Bucket=bucket,
+                                      CreateBucketConfiguration={'LocationConstraint': 'us-west-1'})
+            self.bucket_cache.add(bucket)
+
+        strm = StringIO.StringIO()
+        json.dump(arc, strm, indent=2)
+        objpath = objname+'.json'
+        data = strm.getvalue()
+        if self.uploader is not None:
+            self.uploader.submit(hash, bucket, objpath, data, arc)
+            self.complete_uploads(self.uploader.poll())
+            return True
+
+        self.aws.s3.Object(bucket, objpath).put(Body=data)
+
+        # Add to hash listing - allows us to find entries by hash
+        self.aws.s3.Object('marbles-ai-feeds-hash', hash).put(Body=bucket + '/' + objpath)
+
+        # Add to AWS processing queue
+        if self.aws.news_queue:
+            attributes = get_message_attributes(arc, hash, bucket + '/' + objpath)
+            # Send the message to our queue
+            response = self.aws.news_queue.send_message(MessageAttributes=attributes,
+                                                        MessageBody=data)
+            _logger.debug('Sent hash(%s) -> news_queue(%s)', hash, response['MessageId'])
+
+        # Update hash cache
+        self.hash_cache[hash] = self.state.time()
+        if self.dedup is not None:
+            self.dedup.add(hash, bucket + '/' + objpath)
+        return True
+
+    def complete_uploads(self, results):
+        """Update the hash cache with articles uploaded by the upload stage.
+
+        Args:
+            results: A list of UploadResult instances returned from UploadStage.poll() or flush().
+        """
+        global _logger
+        for r in results:
+            if r.error is not None:
+                _logger.exception('AwsNewsQueueWriter.complete_uploads', exc_info=r.error, rlimitby=r.hash)
+                if self.state.pass_on_exceptions:
+                    raise r.error
+                continue
+            self.hash_cache[r.hash] = self.state.time()
+            if self.dedup is not None:
+                self.dedup.add(r.hash, r.s3path)
+
 
 class AwsNewsQueueReader(object):
     """News queue reader handler"""
 
-    def __init__(self, aws, state, options=0):
+    def __init__(self, aws, state, options=0, index=None):
+        """Constructor.
+
+        Args:
+            aws: An AwsNewsQueueReaderResources instance.
+            state: The service state.
+            options: Compose options passed to process_ccg_pt().
+            index: Optional marbles.ie.kb.localsearch.IndexWriter. If set parsed articles are added to
+                the local index.
+        """
         self.aws = aws
         self.state = state
         self.options = options
+        self.index = index
 
-    def run(self):
-        """Process messages."""
-        for message in receive_messages(self.aws.news_queue, MessageAttributeNames=['All']):
+    def parse_sentence(self, text, retry=3):
+        """Parse a sentence. Connection errors are retried.
+
+        Returns:
+            A dictionary with lexemes and constituents.
+        """
+        while True:
+            try:
+                ccgbank = grpc.ccg_parse(self.aws.stub, text, grpc.DEFAULT_SESSION)
+                break
+            except requests.exceptions.ConnectionError as e:
+                retry -= 1
+                if retry <= 0 or self.state.terminate:
+                    raise
+                _logger.exception('AwsNewsQueueReader.parse_sentence', exc_info=e)
+                time.sleep(0.25)
+        pt = parse_ccg_derivation(ccgbank)
+        ccg = process_ccg_pt(pt, options=self.options)
+        return {
+            'lexemes': [x.get_json() for x in ccg.get_span()],
+            'constituents': [c.get_json() for c in ccg.constituents]
+        }
+
+    def process_article(self, mhash, body, sinks):
+        """Parse an article and stream the results to sinks. Sentences are split and parsed one at a time
+        so the article is never held in memory as a whole.
+
+        Args:
+            mhash: The article hash.
+            body: The article dictionary with title and content.
+            sinks: A list of ArticleSink instances.
+
+        Returns:
+            True if the article was parsed, False if terminated.
+        """
+        title = self.parse_sentence(body['title'])
+        for sink in sinks:
+            sink.begin(mhash, title)
+        count = 0
+        for i, j, smod in iter_article_sentences(body['content']):
+            if self.state.terminate:
+                return False
+            entry = self.parse_sentence(smod)
+            for sink in sinks:
+                sink.add(i, j, entry)
+            count += 1
+        if count == 0:
+            _logger.debug('No paragraphs for story %s\n%s', mhash, body['title'])
+        return True
+
+    def run(self, wait_time=0):
+        """Process messages.
+
+        Args:
+            wait_time: Long poll time in seconds. If non zero the last receive blocks for this time
+                waiting for new messages, so the call can be repeated without busy polling.
+
+        Returns:
+            The number of messages received.
+        """
+        kwargs = {'MessageAttributeNames': ['All']}
+        if wait_time > 0:
+            kwargs['WaitTimeSeconds'] = wait_time
+        count = 0
+        for message in receive_messages(self.aws.news_queue, **kwargs):
             global _logger
+            count += 1
             # Attributes will be passed onto next queue
             attributes = message.message_attributes
             mhash = attributes['hash']['StringValue']
             _logger.debug('Received news_queue(%s) -> hash(%s)', message.message_id, mhash)
             body = json.loads(message.body)
-            retry = 3
-            ccgbank = None
-            title = body['title']
-            paragraphs_in = filter(lambda y: len(y) != 0, map(lambda x: x.strip(), body['content'].split('\n')))
-            paragraphs_out = []
-            if len(paragraphs_in) == 0:
-                _logger.debug('No paragraphs for story %s\n%s', (mhash, title))
-            # Use NLTK to split paragraphs into sentences.
-            for p in paragraphs_in:
-                sentences = filter(lambda x: len(x.strip()) != 0, sent_tokenize(p))
-                paragraphs_out.append(sentences)
+            index_sink = IndexSink(self.index) if self.index is not None else None
+            ccg_sink = CcgQueueSink(self.aws.ccg_queue, attributes) if self.aws.ccg_queue else None
+            sinks = filter(lambda x: x is not None, [index_sink, ccg_sink])
 
             if self.state.terminate:
                 break
 
-            result = {}
-            result['title'] = {}
-            while retry:
+            try:
+                completed = self.process_article(mhash, body, sinks)
+            except Exception as e:
+                # After X reads AWS sends the item to the dead letter queue.
+                # X is configurable in AWS console.
+                completed = False
+                _logger.exception('AwsNewsQueueReader.run', exc_info=e, rlimitby=mhash)
+                if self.state.pass_on_exceptions:
+                    raise
+            if not completed:
+                for sink in sinks:
+                    sink.abort()
+                continue
+
+            if index_sink is not None:
                 try:
-                    ccgbank = grpc.ccg_parse(self.aws.stub, title, grpc.DEFAULT_SESSION)
-                    pt = parse_ccg_derivation(ccgbank)
-                    ccg = process_ccg_pt(pt, options=self.options)
-                    result['title']['lexemes'] = [x.get_json() for x in ccg.get_span()]
-                    result['title']['constituents'] = [c.get_json() for c in ccg.constituents]
-                    ccgpara = []
-                    result['paragraphs'] = ccgpara
-                    for sentences in paragraphs_out:
-                        ccgsent = []
-                        ccgpara.append(ccgsent)
-                        for s in sentences:
-                            smod = preprocess_sentence(s)
-                            ccgbank = grpc.ccg_parse(self.aws.stub, smod, grpc.DEFAULT_SESSION)
-                            pt = parse_ccg_derivation(ccgbank)
-                            ccg = process_ccg_pt(pt, options=self.options)
-                            ccgentry = {}
-                            ccgentry['lexemes'] = [x.get_json() for x in ccg.get_span()]
-                            ccgentry['constituents'] = [c.get_json() for c in ccg.constituents]
-                            ccgsent.append(ccgentry)
-                    break   # exit while
-                except requests.exceptions.ConnectionError as e:
-                    time.sleep(0.25)
-                    retry -= 1
-                    _logger.exception('AwsNewsQueueReader.run', exc_info=e)
-                    if self.state.pass_on_exceptions:
-                        raise
+                    index_sink.end()
                 except Exception as e:
-                    # After X reads AWS sends the item to the dead letter queue.
-                    # X is configurable in AWS console.
-                    retry = 0
                     _logger.exception('AwsNewsQueueReader.run', exc_info=e, rlimitby=mhash)
                     if self.state.pass_on_exceptions:
                         raise
 
-                if self.state.terminate:
-                    retry = 0
-                    break
-
-            # retry == 0 indicates failure
-            if retry == 0:
-                continue
-
-
             try:
                 # Let the queue know that the message is processed
                 message.delete()
-                if self.aws.ccg_queue:
-                    ireduce = -1
-                    iorig = len(result['paragraphs'])
-
-                    while True:
-                        strm = StringIO.StringIO()
-                        # Add indent so easier to debug
-                        json.dump(result, strm, indent=2)
-                        data = strm.getvalue()
-                        if len(data) >= 200*1024:
-                            para = result['paragraphs']
-                            ireduce = max([1, (len(para) * 200 * 1024)/ len(data)])
-                            ireduce = min([len(para)-1, ireduce])
-                            result['paragraphs'] = para[0:ireduce]
-                        else:
-                            break
-
-                        if len(result['paragraphs']) <= 1:
-                            break
-
-                    if ireduce >= 0:
-                        _logger.warning('Hash(%s) ccg paragraphs reduced from %d to %d' % (mhash, iorig, ireduce))
-                    response = self.aws.ccg_queue.send_message(MessageAttributes=attributes, MessageBody=data)
-                    _logger.debug('Sent hash(%s) -> ccg_queue(%s)', mhash, response['MessageId'])
+                if ccg_sink is not None:
+                    ccg_sink.end()
             except Exception as e:
                 _logger.exception('AwsNewsQueueReader.run', exc_info=e, rlimitby=mhash)
                 if self.state.pass_on_exceptions:
-                    raise
\ No newline at end of file
+                    raise
+
+        return count
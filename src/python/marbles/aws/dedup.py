@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Persistent local index of published article hashes."""
+
+from __future__ import unicode_literals, print_function
+import anydbm
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import time
+
+from marbles import safe_utf8_encode
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+# magic, version, bit count, hash count, key count
+_BLOOM_HEADER = struct.Struct(b'<8s4I')
+_BLOOM_MAGIC = b'MBLBLOOM'
+_BLOOM_VERSION = 1
+
+
+class BloomFilter(object):
+    """Bloom filter over strings. Uses double hashing of an md5 digest."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        """Constructor.
+
+        Args:
+            capacity: Expected number of keys.
+            error_rate: False positive rate at capacity.
+        """
+        capacity = max(capacity, 1)
+        self.nbits = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.nhashes = max(int(round(self.nbits * math.log(2) / capacity)), 1)
+        self.bits = bytearray((self.nbits + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key):
+        h1, h2 = struct.unpack(b'<QQ', hashlib.md5(safe_utf8_encode(key)).digest())
+        for i in xrange(self.nhashes):
+            yield (h1 + i * h2) % self.nbits
+
+    def add(self, key):
+        for i in self._indexes(key):
+            self.bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        for i in self._indexes(key):
+            if not self.bits[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
+
+    def save(self, filename):
+        tmpname = filename + '.tmp'
+        with open(tmpname, 'wb') as fd:
+            fd.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, _BLOOM_VERSION, self.nbits, self.nhashes, self.count))
+            fd.write(bytes(self.bits))
+        os.rename(tmpname, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a bloom filter saved with save().
+
+        Returns:
+            A BloomFilter instance or None if the file is not a valid bloom filter.
+        """
+        with open(filename, 'rb') as fd:
+            data = fd.read()
+        if len(data) < _BLOOM_HEADER.size:
+            return None
+        magic, version, nbits, nhashes, count = _BLOOM_HEADER.unpack_from(data, 0)
+        if magic != _BLOOM_MAGIC or version != _BLOOM_VERSION or \
+                len(data) != _BLOOM_HEADER.size + (nbits + 7) // 8:
+            return None
+        bf = cls.__new__(cls)
+        bf.nbits = nbits
+        bf.nhashes = nhashes
+        bf.count = count
+        bf.bits = bytearray(data[_BLOOM_HEADER.size:])
+        return bf
+
+
+class DedupIndex(object):
+    """Set of published article hashes kept in a local dbm file with a bloom filter in front. Lookups of
+    new hashes are answered by the bloom filter, lookups of known hashes by the dbm file, so S3 is only
+    read in bulk by sync().
+    """
+
+    def __init__(self, path, capacity=1000000, error_rate=0.001):
+        """Constructor.
+
+        Args:
+            path: The index folder. Created if it does not exist.
+            capacity: Initial bloom filter capacity. The filter is rebuilt with double the capacity when
+                the number of hashes exceeds the capacity.
+            error_rate: Bloom filter false positive rate at capacity.
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.path = path
+        self.error_rate = error_rate
+        self.db = anydbm.open(os.path.join(path, 'hashes.db'), 'c')
+        self.meta = {'last_sync': 0}
+        self.dirty = False
+        metafile = os.path.join(path, 'meta.json')
+        if os.path.exists(metafile):
+            with open(metafile, 'r') as fd:
+                self.meta = json.load(fd)
+        self.bloom = None
+        self.capacity = self.meta.get('capacity', capacity)
+        bloomfile = os.path.join(path, 'bloom.bin')
+        if os.path.exists(bloomfile):
+            self.bloom = BloomFilter.load(bloomfile)
+        if self.bloom is None or self.bloom.count != len(self.db):
+            self._rebuild(max(self.capacity, 2 * len(self.db)))
+
+    def _rebuild(self, capacity):
+        global _logger
+        _logger.info('Rebuilding dedup bloom filter, capacity=%d', capacity)
+        self.bloom = BloomFilter(capacity, self.error_rate)
+        for k in self.db.keys():
+            self.bloom.add(k)
+        self.capacity = capacity
+        self.meta['capacity'] = capacity
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.db)
+
+    def __contains__(self, hash):
+        hash = safe_utf8_encode(hash)
+        if hash not in self.bloom:
+            return False
+        return self.db.has_key(hash)
+
+    def add(self, hash, value=''):
+        """Add a hash.
+
+        Args:
+            hash: The article hash.
+            value: Optional value, typically the S3 object path of the article.
+
+        Returns:
+            True if the hash was added, False if it already existed.
+        """
+        hash = safe_utf8_encode(hash)
+        if hash in self.bloom and self.db.has_key(hash):
+            return False
+        self.db[hash] = safe_utf8_encode(value)
+        self.bloom.add(hash)
+        self.dirty = True
+        if self.bloom.count > self.capacity:
+            self._rebuild(2 * self.bloom.count)
+        return True
+
+    def get(self, hash, default=None):
+        """Get the value stored with a hash."""
+        hash = safe_utf8_encode(hash)
+        if hash not in self.bloom or not self.db.has_key(hash):
+            return default
+        return self.db[hash]
+
+    def needs_sync(self, interval):
+        """Test if the last sync was more than `interval` seconds ago."""
+        return time.time() - self.meta['last_sync'] >= interval
+
+    def sync(self, bucket):
+        """Add all hashes in an S3 hash listing bucket. The bucket is listed in bulk, one request per
+        1000 keys.
+
+        Args:
+            bucket: A boto3 S3 Bucket resource, for example s3.Bucket('marbles-ai-feeds-hash').
+
+        Returns:
+            The number of hashes added.
+        """
+        global _logger
+        added = 0
+        for obj in bucket.objects.all():
+            hash = safe_utf8_encode(obj.key)
+            if hash not in self.bloom or not self.db.has_key(hash):
+                self.db[hash] = b''
+                self.bloom.add(hash)
+                added += 1
+        if self.bloom.count > self.capacity:
+            self._rebuild(2 * self.bloom.count)
+        self.meta['last_sync'] = time.time()
+        self.dirty = True
+        _logger.info('Synced dedup index, added=%d, size=%d', added, len(self.db))
+        self.flush()
+        return added
+
+    def flush(self):
+        """Write the bloom filter and meta data to disk."""
+        if not self.dirty:
+            return
+        if hasattr(self.db, 'sync'):
+            self.db.sync()
+        self.bloom.save(os.path.join(self.path, 'bloom.bin'))
+        tmpname = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmpname, 'w') as fd:
+            json.dump(self.meta, fd)
+        os.rename(tmpname, os.path.join(self.path, 'meta.json'))
+        self.dirty = False
+
+    def close(self):
+        self.flush()
+        self.db.close()
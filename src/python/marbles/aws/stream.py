@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Streaming article pipeline for the news queue reader."""
+
+from __future__ import unicode_literals, print_function
+import json
+import logging
+import re
+import threading
+
+from marbles.ie.utils.text import preprocess_sentences
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+_PARAGRAPH = re.compile(r'[^\n]+')
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+# Maximum ccg queue message size
+CCG_MESSAGE_LIMIT = 200 * 1024
+
+
+def get_sentence_tokenizer():
+    """Get the shared Punkt sentence tokenizer. The tokenizer is loaded once and shared across messages
+    and threads.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                import nltk.data
+                _tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+    return _tokenizer
+
+
+def iter_article_sentences(content, tokenizer=None):
+    """Split an article into sentences as they are required. Paragraphs are found and tokenized one at a
+    time so parsing can start on the first sentence without splitting the whole article.
+
+    Args:
+        content: The article content. Paragraphs are separated by new lines.
+        tokenizer: Optional sentence tokenizer with a tokenize() method. Defaults to get_sentence_tokenizer().
+
+    Yields:
+        A tuple (paragraph index, sentence index, preprocessed sentence). Empty paragraphs and sentences
+        are skipped and do not use an index.
+    """
+    tokenizer = tokenizer or get_sentence_tokenizer()
+    i = 0
+    for m in _PARAGRAPH.finditer(content):
+        p = m.group(0).strip()
+        if len(p) == 0:
+            continue
+        sentences = filter(lambda x: len(x.strip()) != 0, tokenizer.tokenize(p))
+        if len(sentences) == 0:
+            continue
+        for j, s in enumerate(preprocess_sentences(sentences)):
+            yield i, j, s
+        i += 1
+
+
+class ArticleSink(object):
+    """Receives parsed sentences of an article as they are produced."""
+
+    def begin(self, mhash, title):
+        """Start an article.
+
+        Args:
+            mhash: The article hash.
+            title: The parsed title, a dictionary with lexemes and constituents.
+        """
+        pass
+
+    def add(self, i, j, entry):
+        """Add a parsed sentence.
+
+        Args:
+            i: The paragraph index.
+            j: The sentence index within the paragraph.
+            entry: The parsed sentence, a dictionary with lexemes and constituents.
+        """
+        pass
+
+    def end(self):
+        """Complete the article. Called after all sentences are added."""
+        pass
+
+    def abort(self):
+        """Discard the article. Called when parsing fails."""
+        pass
+
+
+class IndexSink(ArticleSink):
+    """Adds parsed sentences to a local search index as they arrive. The article is an index batch so a
+    failed article, which will be received again, is rolled back rather than indexed twice.
+    """
+
+    def __init__(self, index):
+        """Constructor.
+
+        Args:
+            index: A marbles.ie.kb.localsearch.IndexWriter instance.
+        """
+        self.index = index
+        self.mhash = None
+
+    def begin(self, mhash, title):
+        self.mhash = mhash
+        self.index.begin()
+        self.index.add_sentence(title, mhash, -1, 0)
+
+    def add(self, i, j, entry):
+        self.index.add_sentence(entry, self.mhash, i, j)
+
+    def end(self):
+        self.index.commit()
+
+    def abort(self):
+        self.index.rollback()
+
+
+class CcgQueueSink(ArticleSink):
+    """Builds the ccg queue message as sentences arrive. Paragraphs which would take the message over the
+    size limit are dropped as they arrive, so memory is bounded by the message size and not the article size.
+    """
+
+    def __init__(self, queue, attributes, limit=CCG_MESSAGE_LIMIT):
+        """Constructor.
+
+        Args:
+            queue: The boto3 SQS Queue resource.
+            attributes: The message attributes passed on from the news queue.
+            limit: Maximum message size in bytes.
+        """
+        self.queue = queue
+        self.attributes = attributes
+        self.limit = limit
+        self.mhash = None
+        self.result = None
+        self.size = 0
+        self.current = None
+        self.current_size = 0
+        self.last_paragraph = -1
+        self.full = False
+        self.total = 0
+
+    def begin(self, mhash, title):
+        self.mhash = mhash
+        self.result = {'title': title, 'paragraphs': []}
+        self.size = len(json.dumps(self.result, indent=2))
+        self.current = None
+        self.current_size = 0
+        self.last_paragraph = -1
+        self.full = False
+        self.total = 0
+
+    def _close_paragraph(self):
+        if self.current is None:
+            return
+        self.total += 1
+        # Always keep one paragraph
+        if not self.full and (self.size + self.current_size < self.limit or len(self.result['paragraphs']) == 0):
+            self.result['paragraphs'].append(self.current)
+            self.size += self.current_size
+        else:
+            self.full = True
+        self.current = None
+        self.current_size = 0
+
+    def add(self, i, j, entry):
+        if i != self.last_paragraph:
+            self._close_paragraph()
+            self.last_paragraph = i
+            self.current = []
+        if self.full:
+            # Message is full, don't hold on to the sentence
+            return
+        self.current.append(entry)
+        # Nested indent adds more white space in the final message so this is an estimate
+        self.current_size += len(json.dumps(entry, indent=2)) + 4
+        if self.size + self.current_size >= self.limit and len(self.result['paragraphs']) != 0:
+            # Drop the paragraph now rather than waiting for it to complete
+            self.current = []
+            self.current_size = 0
+            self.full = True
+
+    def end(self):
+        self._close_paragraph()
+        paragraphs = self.result['paragraphs']
+        # Add indent so easier to debug
+        data = json.dumps(self.result, indent=2)
+        while len(data) >= self.limit and len(paragraphs) > 1:
+            paragraphs.pop()
+            data = json.dumps(self.result, indent=2)
+        if len(paragraphs) != self.total:
+            _logger.warning('Hash(%s) ccg paragraphs reduced from %d to %d' % (self.mhash, self.total, len(paragraphs)))
+        response = self.queue.send_message(MessageAttributes=self.attributes, MessageBody=data)
+        _logger.debug('Sent hash(%s) -> ccg_queue(%s)', self.mhash, response['MessageId'])
+        self.result = None
+
+    def abort(self):
+        self.result = None
+        self.current = None
@@ -5,6 +5,7 @@ from __future__ import unicode_literals, print_function
 import logging
 import os
 import signal
+import threading
 import time
 import sys
 import daemon.pidfile
@@ -21,6 +22,7 @@ _module_logger = logging.getLogger(__name__)
 class ServiceState(object):
     def __init__(self, logger=None):
         self.pass_on_exceptions = False
+        self._wake_event = threading.Event()
         if logger is not None and not isinstance(logger, ExceptionRateLimitedLogAdaptor):
             self.logger = ExceptionRateLimitedLogAdaptor(logger)
         else:
@@ -31,7 +33,12 @@ class ServiceState(object):
         return False
 
     def wait(self, seconds):
-        time.sleep(seconds)
+        self._wake_event.wait(seconds)
+        self._wake_event.clear()
+
+    def wake(self):
+        """Interrupt wait(). Can be called from any thread."""
+        self._wake_event.set()
 
     def time(self):
         return time.time()
@@ -77,14 +84,73 @@ class DefaultServiceState(ServiceState):
     def wait(self, seconds):
         self.logger.debug('Pausing for %s seconds', seconds)
         signal.signal(signal.SIGALRM, alarm_handler)
-        signal.alarm(seconds)
+        signal.setitimer(signal.ITIMER_REAL, max(seconds, 0.001))
         if not self.terminate:
             # FIXME: We have a race condition here.
             # If SIGTERM arrives just before the pause call we miss it for `seconds`.
             # A second SIGTERM will help
             signal.pause()
+        signal.setitimer(signal.ITIMER_REAL, 0)
         self.logger.debug('Continue')
 
+    def wake(self):
+        """Interrupt wait(). Can be called from any thread."""
+        if signal.getsignal(signal.SIGALRM) is alarm_handler:
+            os.kill(os.getpid(), signal.SIGALRM)
+
+
+class WorkSource(object):
+    """A source of work for the event driven run loop of a ServiceExecutor.
+
+    The callback is run when the source is due. If it reports work the source is due again after
+    `interval` seconds. If it reports no work the delay doubles, starting at one second, up to
+    `max_interval`. A source which blocks waiting for work, like an SQS long poll, should use zero
+    for both. Other threads, for example gRPC handlers, can call notify() to run a source now.
+    """
+
+    def __init__(self, name, callback, interval=0, max_interval=0):
+        """Constructor.
+
+        Args:
+            name: The source name used in log messages.
+            callback: Function taking no arguments. Returns a true value, typically the number of work
+                items processed, if work was done.
+            interval: Delay in seconds after the callback did work.
+            max_interval: Maximum delay in seconds when idle.
+        """
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.delay = 0
+        self.due = 0
+        self.executor = None
+        self._notified = False
+
+    def notify(self):
+        """Mark the source as ready and wake the run loop. Can be called from any thread."""
+        self._notified = True
+        if self.executor is not None:
+            self.executor.state.wake()
+
+    def is_ready(self, now):
+        return self._notified or now >= self.due
+
+    def run(self, now):
+        """Run the callback and schedule the next run.
+
+        Returns:
+            The callback result.
+        """
+        self._notified = False
+        result = self.callback()
+        if result:
+            self.delay = self.interval
+        else:
+            self.delay = min(max(2 * self.delay, self.interval, 1), self.max_interval)
+        self.due = now + self.delay
+        return result
+
 
 class ServiceExecutor(object):
 
@@ -94,8 +160,13 @@ class ServiceExecutor(object):
         Args:
             wakeup: Max timetosleep before calling on_wakeup().
             state_or_logger
+
+        Remarks:
+            If work sources are added with add_work_source() the run loop is event driven. Sources are
+            run when they are due and on_wake() is not called.
         """
         self.wakeup = wakeup
+        self.sources = []
         if state_or_logger is None:
             self.state = DefaultServiceState()
         elif isinstance(state_or_logger, ServiceState):
@@ -105,6 +176,35 @@ class ServiceExecutor(object):
         else:
             raise TypeError('state_or_logger must be a ServiceState, Logger, or LoggerAdaptor')
 
+    def add_work_source(self, source):
+        """Add a work source. Switches the run loop to event driven mode.
+
+        Args:
+            source: A WorkSource instance.
+        """
+        source.executor = self
+        self.sources.append(source)
+
+    def _run_sources(self):
+        """Run due work sources and wait until the next one is due."""
+        for src in self.sources:
+            if self.state.terminate:
+                return
+            if src.is_ready(time.time()):
+                try:
+                    src.run(time.time())
+                except Exception as e:
+                    src.due = time.time() + max(src.max_interval, 1)
+                    self.logger.exception('Work source %s failed', src.name, exc_info=e, rlimitby=src.name)
+                    if self.state.pass_on_exceptions:
+                        raise
+        if self.state.terminate:
+            return
+        now = time.time()
+        delay = min([0 if s.is_ready(now) else s.due - now for s in self.sources])
+        if delay > 0:
+            self.state.wait(min(delay, self.wakeup))
+
     def _run_loop(self):
         global hup_recv
         count = 0
@@ -118,6 +218,8 @@ class ServiceExecutor(object):
             if hup_signaled:
                 self.logger.info('HUP received, refreshing')
                 self.on_hup()
+            elif len(self.sources) != 0:
+                self._run_sources()
             else:
                 self.on_wake()
                 # If force_terminate() was called then exit
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Concurrent S3 upload and batched SQS send stage for the news archiver."""
+
+from __future__ import unicode_literals, print_function
+import logging
+import random
+import threading
+import time
+from concurrent import futures
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from marbles import safe_utf8_encode
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+# SQS limits for send_message_batch
+SQS_MAX_BATCH_COUNT = 10
+SQS_MAX_BATCH_BYTES = 256 * 1024
+
+
+def retry_with_backoff(fn, retries=3, backoff=0.5, exceptions=(Exception,)):
+    """Call a function, retrying with exponential backoff and jitter.
+
+    Args:
+        fn: A function taking no arguments.
+        retries: Number of retries after the first attempt.
+        backoff: Initial delay in seconds. The delay doubles after each attempt.
+        exceptions: The exceptions which cause a retry.
+
+    Returns:
+        The function result.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except exceptions:
+            if attempt >= retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+
+def get_message_size(body, attributes):
+    """Get the SQS size of a message. Attribute names, types and values all count."""
+    size = len(safe_utf8_encode(body))
+    for k, v in attributes.iteritems():
+        size += len(k) + len(v['DataType']) + len(v.get('StringValue', ''))
+    return size
+
+
+class UploadResult(object):
+    """Result of an article upload."""
+
+    def __init__(self, hash, s3path, error=None):
+        self.hash = hash
+        self.s3path = s3path
+        self.error = error
+
+
+class UploadStage(object):
+    """Overlaps the S3 puts and thumbnail fetch of many articles on a bounded thread pool, and sends the
+    news queue messages in batches. Call poll() regularly and flush() when done, both from the thread
+    which calls submit().
+    """
+
+    def __init__(self, s3client, queue=None, max_workers=8, max_pending=64, retries=3, backoff=0.5,
+                 timeout=30, hash_bucket='marbles-ai-feeds-hash'):
+        """Constructor.
+
+        Args:
+            s3client: A boto3 S3 client. Clients, unlike resources, can be shared between threads.
+            queue: Optional boto3 SQS Queue resource for the news queue.
+            max_workers: Number of upload threads.
+            max_pending: Maximum number of articles in flight. submit() blocks when this is reached.
+            retries: Number of retries for S3 puts, thumbnail fetches and SQS sends.
+            backoff: Initial retry delay in seconds.
+            timeout: Thumbnail request timeout in seconds.
+            hash_bucket: The S3 bucket for the hash listing.
+        """
+        self.s3client = s3client
+        self.queue = queue
+        self.max_pending = max_pending
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.hash_bucket = hash_bucket
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = {}
+        self._messages = []
+        self._completed = []
+        self._local = threading.local()
+
+    def __contains__(self, hash):
+        return hash in self._pending or any([x[0] == hash for x in self._messages])
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _get_session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=self.retries, backoff_factor=self.backoff, status_forcelist=[500, 502, 503, 504])
+            session.mount('http://', HTTPAdapter(max_retries=retry))
+            session.mount('https://', HTTPAdapter(max_retries=retry))
+            self._local.session = session
+        return session
+
+    def _upload(self, hash, bucket, objpath, data, arc):
+        # Delay import, marbles.aws imports this module
+        from marbles.aws import get_message_attributes
+        s3path = bucket + '/' + objpath
+        retry_with_backoff(lambda: self.s3client.put_object(Bucket=bucket, Key=objpath, Body=data),
+                           self.retries, self.backoff)
+        # Add to hash listing - allows us to find entries by hash
+        retry_with_backoff(lambda: self.s3client.put_object(Bucket=self.hash_bucket, Key=hash, Body=s3path),
+                           self.retries, self.backoff)
+        if self.queue is None:
+            return None
+        return get_message_attributes(arc, hash, s3path, session=self._get_session(), timeout=self.timeout)
+
+    def submit(self, hash, bucket, objpath, data, arc):
+        """Queue an article for upload.
+
+        Args:
+            hash: The article hash.
+            bucket: The S3 bucket.
+            objpath: The S3 object path.
+            data: The article json.
+            arc: The dictionary returned from Article.archive().
+        """
+        while len(self._pending) >= self.max_pending:
+            futures.wait([x[0] for x in self._pending.values()], return_when=futures.FIRST_COMPLETED)
+            self._collect()
+        self._pending[hash] = (self._executor.submit(self._upload, hash, bucket, objpath, data, arc),
+                               bucket + '/' + objpath, data)
+
+    def _collect(self):
+        for hash, (future, s3path, data) in self._pending.items():
+            if not future.done():
+                continue
+            del self._pending[hash]
+            error = future.exception()
+            if error is not None:
+                self._completed.append(UploadResult(hash, s3path, error))
+            elif self.queue is None:
+                self._completed.append(UploadResult(hash, s3path))
+            else:
+                self._messages.append((hash, s3path, data, future.result()))
+
+    def _send_batch(self, batch):
+        global _logger
+        entries = [{
+            'Id': hash,
+            'MessageBody': data,
+            'MessageAttributes': attributes
+        } for hash, _, data, attributes in batch]
+        lookup = dict([(x[0], x) for x in batch])
+        attempt = 0
+        while True:
+            try:
+                response = retry_with_backoff(lambda: self.queue.send_messages(Entries=entries),
+                                              self.retries, self.backoff)
+            except Exception as e:
+                for x in entries:
+                    hash, s3path, _, _ = lookup[x['Id']]
+                    self._completed.append(UploadResult(hash, s3path, e))
+                return
+            for ok in response.get('Successful', []):
+                hash, s3path, _, _ = lookup[ok['Id']]
+                _logger.debug('Sent hash(%s) -> news_queue(%s)', hash, ok['MessageId'])
+                self._completed.append(UploadResult(hash, s3path))
+            failed = response.get('Failed', [])
+            if len(failed) == 0:
+                return
+            retryable = set([x['Id'] for x in failed if not x.get('SenderFault', False)])
+            if attempt >= self.retries:
+                retryable = set()
+            for x in failed:
+                if x['Id'] not in retryable:
+                    hash, s3path, _, _ = lookup[x['Id']]
+                    self._completed.append(UploadResult(hash, s3path, RuntimeError(
+                        'send_messages failed: %s - %s' % (x.get('Code'), x.get('Message')))))
+            if len(retryable) == 0:
+                return
+            entries = [e for e in entries if e['Id'] in retryable]
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def _send_messages(self, partial):
+        while len(self._messages) != 0:
+            batch = []
+            size = 0
+            for msg in self._messages:
+                msize = get_message_size(msg[2], msg[3])
+                if len(batch) >= SQS_MAX_BATCH_COUNT or (len(batch) != 0 and size + msize > SQS_MAX_BATCH_BYTES):
+                    break
+                batch.append(msg)
+                size += msize
+            if not partial and len(batch) == len(self._messages) and len(batch) < SQS_MAX_BATCH_COUNT:
+                # Wait for more messages
+                return
+            self._messages = self._messages[len(batch):]
+            self._send_batch(batch)
+
+    def poll(self):
+        """Send full message batches and get completed uploads without blocking.
+
+        Returns:
+            A list of UploadResult instances.
+        """
+        self._collect()
+        self._send_messages(False)
+        completed = self._completed
+        self._completed = []
+        return completed
+
+    def flush(self):
+        """Wait for all uploads and send all queued messages.
+
+        Returns:
+            A list of UploadResult instances.
+        """
+        futures.wait([x[0] for x in self._pending.values()])
+        self._collect()
+        self._send_messages(True)
+        completed = self._completed
+        self._completed = []
+        return completed
+
+    def close(self):
+        """Flush and stop the upload threads.
+
+        Returns:
+            A list of UploadResult instances.
+        """
+        completed = self.flush()
+        self._executor.shutdown(wait=True)
+        return completed
@@ -1,4 +1,91 @@
 from __future__ import unicode_literals, print_function
 import os
+from marbles import PROJDIR
 
 DATA_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+LDC_AUTO_PATH=os.path.join(PROJDIR, 'data', 'ldc', 'ccgbank_1_1', 'data', 'AUTO')
+EASYSRL_CCGBANK_PATH=os.path.join(PROJDIR, 'data', 'ldc', 'easysrl', 'ccgbank')
+
+
+def list_ldc_auto_files(ldcpath=None, sections=None):
+    """List the derivation files in the LDC ccgbank AUTO tree.
+
+    Args:
+        ldcpath: The AUTO folder. Default is LDC_AUTO_PATH.
+        sections: Optional list of section names, e.g. ['00', '23']. Default is all sections.
+
+    Returns:
+        A sorted list of file paths.
+    """
+    ldcpath = ldcpath or LDC_AUTO_PATH
+    allfiles = []
+    for dir1 in sorted(os.listdir(ldcpath)):
+        if sections is not None and dir1 not in sections:
+            continue
+        ldcpath1 = os.path.join(ldcpath, dir1)
+        if os.path.isdir(ldcpath1):
+            for fname in sorted(os.listdir(ldcpath1)):
+                if '.auto' not in fname:
+                    continue
+                ldcpath2 = os.path.join(ldcpath1, fname)
+                if os.path.isfile(ldcpath2):
+                    allfiles.append(ldcpath2)
+    return allfiles
+
+
+def iter_ldc_derivations(filename):
+    """Iterate the derivations in a ccgbank AUTO file.
+
+    Args:
+        filename: The AUTO file path.
+
+    Yields:
+        A tuple of the header id and the ccgbank derivation string.
+    """
+    with open(filename, 'r') as fd:
+        hdr = None
+        for line in fd:
+            if hdr is None:
+                hdr = line.strip().split(' ')[0]
+                if hdr.startswith('ID='):
+                    hdr = hdr[3:]
+            else:
+                yield hdr, line.strip()
+                hdr = None
+
+
+def list_easysrl_files(ccgpath=None):
+    """List the EasySRL derivation files.
+
+    Args:
+        ccgpath: The EasySRL ccgbank folder. Default is EASYSRL_CCGBANK_PATH.
+
+    Returns:
+        A sorted list of file paths.
+    """
+    ccgpath = ccgpath or EASYSRL_CCGBANK_PATH
+    allfiles = []
+    for fname in sorted(os.listdir(ccgpath)):
+        if 'ccg_derivation' not in fname:
+            continue
+        ccgpath1 = os.path.join(ccgpath, fname)
+        if os.path.isfile(ccgpath1):
+            allfiles.append(ccgpath1)
+    return allfiles
+
+
+def iter_easysrl_derivations(filename):
+    """Iterate the derivations in an EasySRL derivation file.
+
+    Args:
+        filename: The file path.
+
+    Yields:
+        A tuple of the id, formatted as name-line-number, and the ccgbank derivation string.
+    """
+    name, _ = os.path.splitext(os.path.basename(filename))
+    with open(filename, 'r') as fd:
+        for i, line in enumerate(fd):
+            line = line.strip()
+            if len(line) != 0:
+                yield '%s-%04d' % (name, i), line
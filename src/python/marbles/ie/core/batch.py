@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""Columnar sentence store for bulk analytics."""
+
+from __future__ import unicode_literals, print_function
+
+import collections
+
+import numpy as np
+
+from marbles import safe_utf8_decode
+from marbles.ie.ccg import Category, POS
+from marbles.ie.core import constituent_types as ct
+from marbles.ie.core.sentence import BasicLexeme, Constituent, Sentence, Span
+
+
+class StringTable(object):
+    """Interned string table. Strings are mapped to consecutive integer ids."""
+
+    def __init__(self, strings=None):
+        self.strings = []
+        self.ids = {}
+        if strings is not None:
+            for s in strings:
+                self.intern(s)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def __contains__(self, s):
+        return s in self.ids
+
+    def intern(self, s):
+        """Get the id of a string, adding it to the table if necessary."""
+        try:
+            return self.ids[s]
+        except KeyError:
+            i = len(self.strings)
+            self.ids[s] = i
+            self.strings.append(s)
+            return i
+
+    def find(self, s):
+        """Get the id of a string or -1 if the string is not in the table."""
+        return self.ids.get(s, -1)
+
+    def to_array(self):
+        return np.array(self.strings, dtype=np.unicode_)
+
+
+def _ref_to_string(r):
+    # Ccg2Drs lexemes hold DRSRef instances, marshalled sentences hold strings.
+    if isinstance(r, basestring):
+        return safe_utf8_decode(r)
+    return r.var.to_string()
+
+
+class SentenceBatch(object):
+    """A batch of sentences stored as columns of numpy arrays rather than as lexeme, constituent and span
+    objects.
+
+    Lexeme attributes are stored in flat arrays indexed by a global lexeme index. The lexemes of sentence i
+    are in the range offsets[i]:offsets[i+1]. The `idx` and `head` columns are sentence relative, exactly
+    as in a Lexeme. Words, stems, POS tags, categories, constituent types, and referents are interned in
+    string tables. Referents of lexeme k are ref_ids[ref_offsets[k]:ref_offsets[k+1]]. Constituents
+    follow the same scheme using coffsets, and the span indexes of constituent j are
+    cspans[cspan_offsets[j]:cspan_offsets[j+1]].
+
+    Remarks:
+        The DRS and wikipedia data attached to a lexeme are not stored.
+    """
+
+    def __init__(self):
+        self.words = StringTable()
+        self.stems = StringTable()
+        self.poss = StringTable()
+        self.categories = StringTable()
+        self.vntypes = StringTable()
+        self.refnames = StringTable()
+        self.msgids = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.idx = np.zeros(0, dtype=np.int32)
+        self.head = np.zeros(0, dtype=np.int32)
+        self.mask = np.zeros(0, dtype=np.uint64)
+        self.word = np.zeros(0, dtype=np.int32)
+        self.stem = np.zeros(0, dtype=np.int32)
+        self.pos = np.zeros(0, dtype=np.int32)
+        self.category = np.zeros(0, dtype=np.int32)
+        self.ref_offsets = np.zeros(1, dtype=np.int64)
+        self.ref_ids = np.zeros(0, dtype=np.int32)
+        self.coffsets = np.zeros(1, dtype=np.int64)
+        self.vntype = np.zeros(0, dtype=np.int32)
+        self.chead = np.zeros(0, dtype=np.int32)
+        self.cspan_offsets = np.zeros(1, dtype=np.int64)
+        self.cspans = np.zeros(0, dtype=np.int32)
+        self._ghead = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.get_sentence(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get_sentence(i)
+
+    @property
+    def lexeme_count(self):
+        """The total number of lexemes in the batch."""
+        return len(self.idx)
+
+    @property
+    def constituent_count(self):
+        """The total number of constituents in the batch."""
+        return len(self.vntype)
+
+    @classmethod
+    def from_sentences(cls, sentences):
+        """Build a batch from a sequence of sentences.
+
+        Args:
+            sentences: An iterable of marbles.ie.core.sentence.Sentence instances. These can be Ccg2Drs
+                instances or sentences returned from marshal_sentence().
+
+        Returns:
+            A SentenceBatch instance.
+        """
+        batch = SentenceBatch()
+        offsets = [0]
+        idx = []
+        head = []
+        mask = []
+        word = []
+        stem = []
+        pos = []
+        category = []
+        ref_offsets = [0]
+        ref_ids = []
+        coffsets = [0]
+        vntype = []
+        chead = []
+        cspan_offsets = [0]
+        cspans = []
+        for sent in sentences:
+            batch.msgids.append(sent.msgid)
+            for lex in sent.lexemes:
+                idx.append(lex.idx)
+                head.append(lex.head)
+                mask.append(lex.mask)
+                word.append(batch.words.intern(lex.word))
+                stem.append(batch.stems.intern(lex.stem))
+                pos.append(batch.poss.intern(lex.pos.tag))
+                category.append(batch.categories.intern(lex.category.signature))
+                ref_ids.extend([batch.refnames.intern(_ref_to_string(r)) for r in lex.refs])
+                ref_offsets.append(len(ref_ids))
+            offsets.append(len(idx))
+            for c in sent.constituents:
+                vntype.append(batch.vntypes.intern(c.vntype.signature))
+                chead.append(c.chead)
+                cspans.extend(c.span.get_indexes())
+                cspan_offsets.append(len(cspans))
+            coffsets.append(len(vntype))
+
+        batch.offsets = np.array(offsets, dtype=np.int64)
+        batch.idx = np.array(idx, dtype=np.int32)
+        batch.head = np.array(head, dtype=np.int32)
+        batch.mask = np.array(mask, dtype=np.uint64)
+        batch.word = np.array(word, dtype=np.int32)
+        batch.stem = np.array(stem, dtype=np.int32)
+        batch.pos = np.array(pos, dtype=np.int32)
+        batch.category = np.array(category, dtype=np.int32)
+        batch.ref_offsets = np.array(ref_offsets, dtype=np.int64)
+        batch.ref_ids = np.array(ref_ids, dtype=np.int32)
+        batch.coffsets = np.array(coffsets, dtype=np.int64)
+        batch.vntype = np.array(vntype, dtype=np.int32)
+        batch.chead = np.array(chead, dtype=np.int32)
+        batch.cspan_offsets = np.array(cspan_offsets, dtype=np.int64)
+        batch.cspans = np.array(cspans, dtype=np.int32)
+        return batch
+
+    def get_sentence(self, i):
+        """Rebuild a sentence from the batch.
+
+        Args:
+            i: The sentence index.
+
+        Returns:
+            A marbles.ie.core.sentence.Sentence instance containing BasicLexeme instances. Referents are
+            strings, as for marshal_sentence().
+        """
+        lexemes = []
+        constituents = []
+        sentence = Sentence(lexemes, constituents, msgid=self.msgids[i])
+        for k in range(self.offsets[i], self.offsets[i+1]):
+            lex = BasicLexeme()
+            lex.idx = int(self.idx[k])
+            lex.head = int(self.head[k])
+            lex.mask = int(self.mask[k])
+            lex.word = self.words[self.word[k]]
+            lex.stem = self.stems[self.stem[k]]
+            lex.pos = POS.from_cache(self.poss[self.pos[k]])
+            lex.category = Category.from_cache(self.categories[self.category[k]])
+            lex.refs = [self.refnames[r] for r in self.ref_ids[self.ref_offsets[k]:self.ref_offsets[k+1]]]
+            lexemes.append(lex)
+
+        for j in range(self.coffsets[i], self.coffsets[i+1]):
+            span = Span(sentence, [int(x) for x in self.cspans[self.cspan_offsets[j]:self.cspan_offsets[j+1]]])
+            constituents.append(Constituent(span, ct.from_cache(self.vntypes[self.vntype[j]]), int(self.chead[j])))
+
+        sentence.map_heads_to_constituents()
+        return sentence
+
+    def get_lexeme_range(self, i):
+        """Get the global lexeme indexes of sentence i as a (start, end) tuple."""
+        return int(self.offsets[i]), int(self.offsets[i+1])
+
+    def get_sentence_index(self, gidx):
+        """Map global lexeme indexes to sentence indexes.
+
+        Args:
+            gidx: A global lexeme index or a numpy array of global lexeme indexes.
+
+        Returns:
+            The sentence index or a numpy array of sentence indexes.
+        """
+        return np.searchsorted(self.offsets, gidx, side='right') - 1
+
+    @property
+    def global_head(self):
+        """The head of each lexeme as a global lexeme index."""
+        if self._ghead is None:
+            counts = np.diff(self.offsets)
+            self._ghead = self.head.astype(np.int64) + np.repeat(self.offsets[:-1], counts)
+        return self._ghead
+
+    @property
+    def isroot(self):
+        """Boolean array which is True where the lexeme is the root of its dependency tree."""
+        return self.idx == self.head
+
+    def get_mask_index(self, required, excluded=0, gidx=None):
+        """Vectorized form of Span.subspan().
+
+        Args:
+            required: A mask of RT_? bits.
+            excluded: A mask of RT_? bits.
+            gidx: Optional numpy array of global lexeme indexes to refine. If None all lexemes in the batch
+                are considered.
+
+        Returns:
+            A sorted numpy array of global lexeme indexes.
+        """
+        mask = self.mask if gidx is None else self.mask[gidx]
+        sel = ((mask & np.uint64(required)) != 0) & ((mask & np.uint64(excluded)) == 0)
+        if gidx is None:
+            return np.flatnonzero(sel)
+        return np.sort(np.asarray(gidx)[sel])
+
+    def get_head_index(self, gidx, strict=False):
+        """Vectorized form of Span.get_head_span().
+
+        Args:
+            gidx: A numpy array of global lexeme indexes. The indexes can span multiple sentences, in which
+                case the result is the union of the head spans of the per sentence spans.
+            strict: If true then heads must point to a lexeme within the span. If false then some head must
+                point to a lexeme within the span.
+
+        Returns:
+            A sorted numpy array of global lexeme indexes.
+        """
+        gidx = np.unique(gidx)
+        if len(gidx) <= 1:
+            return gidx
+        ghead = self.global_head
+        isroot = self.isroot
+        inspan = np.zeros(self.lexeme_count, dtype=np.bool_)
+        inspan[gidx] = True
+        result = isroot[gidx] | ~inspan[ghead[gidx]]
+        if strict:
+            return gidx[result]
+
+        # Walk up the dependency tree until we reach the span or a root. The walk is bounded by the longest
+        # sentence so cycles in a malformed tree cannot loop forever.
+        cur = ghead[gidx]
+        active = np.flatnonzero(result & ~isroot[gidx])
+        for _ in range(int(np.diff(self.offsets).max())):
+            if len(active) == 0:
+                break
+            c = cur[active]
+            step = ~inspan[ghead[c]] & ~isroot[c]
+            cur[active[step]] = ghead[c[step]]
+            active = active[step]
+        result &= isroot[gidx] | ~inspan[ghead[cur]]
+        return gidx[result]
+
+    def get_depth(self):
+        """Get the depth of each lexeme in its dependency tree. Roots have depth zero.
+
+        Returns:
+            A numpy array of depths indexed by global lexeme index.
+        """
+        ghead = self.global_head
+        depth = np.zeros(self.lexeme_count, dtype=np.int32)
+        if self.lexeme_count == 0:
+            return depth
+        isroot = self.isroot
+        cur = ghead.copy()
+        active = np.flatnonzero(~isroot)
+        for _ in range(int(np.diff(self.offsets).max())):
+            if len(active) == 0:
+                break
+            depth[active] += 1
+            active = active[~isroot[cur[active]]]
+            cur[active] = ghead[cur[active]]
+        return depth
+
+    def get_constituent_index(self, vntype):
+        """Get the global indexes of constituents with the given type.
+
+        Args:
+            vntype: A constituent type from marbles.ie.core.constituent_types.
+
+        Returns:
+            A numpy array of global constituent indexes.
+        """
+        i = self.vntypes.find(vntype.signature)
+        if i < 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.vntype == i)
+
+    def get_constituent_lengths(self):
+        """Get the span length of each constituent."""
+        return np.diff(self.cspan_offsets)
+
+    def _histogram(self, column, table):
+        counts = np.bincount(column, minlength=len(table))
+        return collections.Counter(dict([(table[i], int(counts[i])) for i in np.flatnonzero(counts)]))
+
+    def get_pos_histogram(self, gidx=None):
+        """Count POS tags.
+
+        Returns:
+            A collections.Counter keyed by POS tag.
+        """
+        return self._histogram(self.pos if gidx is None else self.pos[gidx], self.poss)
+
+    def get_category_histogram(self, gidx=None):
+        """Count CCG categories.
+
+        Returns:
+            A collections.Counter keyed by category signature.
+        """
+        return self._histogram(self.category if gidx is None else self.category[gidx], self.categories)
+
+    def get_constituent_histogram(self):
+        """Count constituent types.
+
+        Returns:
+            A collections.Counter keyed by constituent type signature.
+        """
+        return self._histogram(self.vntype, self.vntypes)
+
+    def save(self, file):
+        """Save the batch in numpy .npz format.
+
+        Args:
+            file: A filename or open file.
+        """
+        np.savez_compressed(file,
+                            words=self.words.to_array(),
+                            stems=self.stems.to_array(),
+                            poss=self.poss.to_array(),
+                            categories=self.categories.to_array(),
+                            vntypes=self.vntypes.to_array(),
+                            refnames=self.refnames.to_array(),
+                            msgids=np.array(['' if x is None else x for x in self.msgids], dtype=np.unicode_),
+                            offsets=self.offsets, idx=self.idx, head=self.head, mask=self.mask,
+                            word=self.word, stem=self.stem, pos=self.pos, category=self.category,
+                            ref_offsets=self.ref_offsets, ref_ids=self.ref_ids,
+                            coffsets=self.coffsets, vntype=self.vntype, chead=self.chead,
+                            cspan_offsets=self.cspan_offsets, cspans=self.cspans)
+
+    @classmethod
+    def load(cls, file):
+        """Load a batch saved with SentenceBatch.save().
+
+        Args:
+            file: A filename or open file.
+
+        Returns:
+            A SentenceBatch instance.
+        """
+        batch = SentenceBatch()
+        with np.load(file) as data:
+            for name in ['words', 'stems', 'poss', 'categories', 'vntypes', 'refnames']:
+                setattr(batch, name, StringTable([unicode(x) for x in data[name]]))
+            batch.msgids = [unicode(x) or None for x in data['msgids']]
+            for name in ['offsets', 'idx', 'head', 'mask', 'word', 'stem', 'pos', 'category', 'ref_offsets',
+                         'ref_ids', 'coffsets', 'vntype', 'chead', 'cspan_offsets', 'cspans']:
+                setattr(batch, name, data[name])
+        return batch
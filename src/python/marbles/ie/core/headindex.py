@@ -0,0 +1,168 @@
+"""Precomputed index over the lexeme head (dependency) tree of a sentence."""
+
+from __future__ import unicode_literals, print_function
+
+
+class HeadIndex(object):
+    """Head tree index built from the lexeme head array.
+
+    The index holds a preorder numbering with subtree intervals for O(1) ancestor tests, and an Euler
+    tour with a sparse table for O(1) lowest common head queries. The head span of a set of k indexes
+    is found in O(k log k).
+
+    Remarks:
+        The index is a snapshot of the heads. It must be rebuilt if any lexeme head changes.
+    """
+
+    def __init__(self, heads):
+        """Constructor.
+
+        Args:
+            heads: A sequence where heads[i] is the head index of lexeme i. A lexeme which is its own
+                head is a root.
+        """
+        n = len(heads)
+        self.parent = list(heads)
+        children = [[] for _ in range(n)]
+        roots = []
+        for i in range(n):
+            h = heads[i]
+            if h == i or h < 0 or h >= n:
+                self.parent[i] = i
+                roots.append(i)
+            else:
+                children[h].append(i)
+
+        self.depth = [0] * n
+        self.tin = [-1] * n
+        self.tout = [-1] * n
+        self.tree = [-1] * n
+        self.preorder = []
+        self.first = [0] * n
+        self.euler = []
+        self.roots = []
+        # Nodes not reachable from a root are on a head cycle. Break the cycle at the lowest index.
+        for r in roots + range(n):
+            if self.tin[r] >= 0:
+                continue
+            if r not in roots:
+                self.parent[r] = r
+            self.roots.append(r)
+            self._walk(r, children)
+
+        # Sparse table over the Euler tour, entries are nodes with minimum depth.
+        self._sparse = [self.euler]
+        k = 1
+        while 2 * k <= len(self.euler):
+            prev = self._sparse[-1]
+            row = []
+            for i in range(len(self.euler) - 2 * k + 1):
+                a = prev[i]
+                b = prev[i + k]
+                row.append(a if self.depth[a] <= self.depth[b] else b)
+            self._sparse.append(row)
+            k *= 2
+
+    def _walk(self, root, children):
+        stk = [(root, 0)]
+        self.depth[root] = 0
+        while len(stk) != 0:
+            u, i = stk[-1]
+            if i == 0:
+                self.tin[u] = len(self.preorder)
+                self.tree[u] = root
+                self.preorder.append(u)
+                self.first[u] = len(self.euler)
+                self.euler.append(u)
+            if i < len(children[u]):
+                stk[-1] = (u, i + 1)
+                v = children[u][i]
+                if self.tin[v] < 0:
+                    self.depth[v] = self.depth[u] + 1
+                    stk.append((v, 0))
+            else:
+                self.tout[u] = len(self.preorder) - 1
+                stk.pop()
+                if len(stk) != 0:
+                    self.euler.append(stk[-1][0])
+
+    def __len__(self):
+        return len(self.parent)
+
+    def isroot(self, i):
+        return self.parent[i] == i
+
+    def get_root(self, i):
+        """Get the root of the tree containing lexeme i."""
+        return self.tree[i]
+
+    def is_ancestor(self, u, v, proper=False):
+        """Test if u is an ancestor of v.
+
+        Args:
+            u: A lexeme index.
+            v: A lexeme index.
+            proper: If True u must not be v.
+        """
+        if proper and u == v:
+            return False
+        return self.tin[u] <= self.tin[v] <= self.tout[u]
+
+    def get_lowest_common_head(self, u, v):
+        """Get the lowest common ancestor of two lexemes.
+
+        Returns:
+            A lexeme index or -1 if u and v are in different trees.
+        """
+        if self.tree[u] != self.tree[v]:
+            return -1
+        i = self.first[u]
+        j = self.first[v]
+        if i > j:
+            i, j = j, i
+        k = 0
+        while (2 << k) <= j - i + 1:
+            k += 1
+        a = self._sparse[k][i]
+        b = self._sparse[k][j - (1 << k) + 1]
+        return a if self.depth[a] <= self.depth[b] else b
+
+    def get_subtree(self, i):
+        """Get the indexes of the subtree rooted at lexeme i, in preorder."""
+        return self.preorder[self.tin[i]:self.tout[i] + 1]
+
+    def get_head_indexes(self, indexes):
+        """Get the heads of a set of lexemes. A lexeme is a head if none of its ancestors are in the set.
+        Equivalent to Span.get_head_span(strict=False).
+
+        Args:
+            indexes: An iterable of lexeme indexes.
+
+        Returns:
+            A sorted list of lexeme indexes.
+        """
+        stk = []
+        heads = []
+        for v in sorted(set(indexes), key=lambda x: self.tin[x]):
+            while len(stk) != 0 and self.tout[stk[-1]] < self.tin[v]:
+                stk.pop()
+            if len(stk) == 0:
+                heads.append(v)
+            stk.append(v)
+        return sorted(heads)
+
+    def get_nearest_ancestors(self, marked):
+        """For every lexeme find the nearest proper ancestor in a marked set.
+
+        Args:
+            marked: A container of lexeme indexes supporting the `in` operator.
+
+        Returns:
+            A list where item i is the nearest proper ancestor of lexeme i in `marked`, or -1.
+        """
+        nearest = [-1] * len(self.parent)
+        for v in self.preorder:
+            p = self.parent[v]
+            if p != v:
+                nearest[v] = p if p in marked else nearest[p]
+        return nearest
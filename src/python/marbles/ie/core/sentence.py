@@ -14,6 +14,7 @@ from marbles.ie.ccg import *
 from marbles.ie.kb import google_search
 from marbles.ie.core import constituent_types as ct
 from marbles.ie.core.constants import *
+from marbles.ie.core.headindex import HeadIndex
 from marbles.log import ExceptionRateLimitedLogAdaptor
 
 _actual_logger = logging.getLogger(__name__)
@@ -367,6 +368,7 @@ class Sentence(AbstractSentence):
             i2c = None
         self.i2c = {} if i2c is None else i2c
         self.msgid = msgid
+        self.head_index = None
         if i2c is None and self.constituents is not None:
             self.map_heads_to_constituents()
 
@@ -476,6 +478,19 @@ class Sentence(AbstractSentence):
         result = self._get_dependency_tree_as_string_helper(ctree, 0, [])
         return '\n'.join(result)
 
+    def build_head_index(self):
+        """Build the head index. Must be called after the lexeme heads are final.
+
+        Returns:
+            A HeadIndex instance.
+        """
+        self.head_index = HeadIndex([lex.head for lex in self.lexemes])
+        return self.head_index
+
+    def invalidate_head_index(self):
+        """Invalidate the head index. Must be called before lexeme heads are changed."""
+        self.head_index = None
+
     def map_heads_to_constituents(self):
         """Set constituent heads."""
 
@@ -489,11 +504,15 @@ class Sentence(AbstractSentence):
             assert lexhd.idx not in i2c
             i2c[lexhd.idx] = i
 
+        nearest = None if self.head_index is None else self.head_index.get_nearest_ancestors(i2c)
         for i in range(len(self.constituents)):
             c = self.constituents[i]
             lexhd = c.get_head()
             if lexhd.head in i2c:
                 c.chead = i2c[lexhd.head]
+            elif nearest is not None:
+                if nearest[lexhd.idx] >= 0:
+                    c.chead = i2c[nearest[lexhd.idx]]
             else:
                 while lexhd.head not in i2c and lexhd.head != lexhd.idx:
                     lexhd = self.lexemes[lexhd.head]
@@ -530,23 +549,21 @@ class Sentence(AbstractSentence):
         idxs_to_del = set(to_remove.get_indexes())
 
         # Find the sentence head
-        sentence_head = 0
-        while self[sentence_head].head != sentence_head:
-            sentence_head = self[sentence_head].head
+        hindex = self.head_index if self.head_index is not None else HeadIndex([lex.head for lex in self])
+        sentence_head = hindex.get_root(0)
 
         # Only allow deletion if it has a single child, otherwise we get multiple sentence heads
         if sentence_head in idxs_to_del and len(filter(lambda lex: lex.head == sentence_head, self)) != 2:
             idxs_to_del.remove(sentence_head)
 
-        # Reparent heads marked for deletion
+        # Reparent heads marked for deletion to the nearest ancestor which is kept
+        nearest = hindex.get_nearest_ancestors(set(range(len(self))).difference(idxs_to_del))
         for lex in itertools.ifilter(lambda x: x.idx not in idxs_to_del, self):
-            lasthead = -1
-            while lex.head in idxs_to_del and lex.head != lasthead:
-                lasthead = lex.head
-                lex.head = self[lex.head].head
             if lex.head in idxs_to_del:
-                # New head for sentence
-                lex.head = lex.idx
+                # No ancestor means a new head for sentence
+                lex.head = nearest[lex.idx] if nearest[lex.idx] >= 0 else lex.idx
+        # Heads have changed
+        self.invalidate_head_index()
 
         idxmap = map(lambda x: -1 if x in idxs_to_del else counter(), range(len(self)))
         for c in constituents:
@@ -895,6 +912,10 @@ class Span(AbstractSentence):
             return self
 
         indexes = set(self._indexes)
+        hindex = getattr(self._sent, 'head_index', None)
+        if not strict and hindex is not None:
+            return Span(self._sent, hindex.get_head_indexes(indexes))
+
         hds = set()
         if strict:
             for lex in self:
@@ -77,15 +77,26 @@ class Showable(object):
         Returns:
             A unicode string
         """
-        ls1 = ss1.split(u'\n')
-        ls2 = ss2.split(u'\n')
-        if len(ss2) == 0:
-            return u'\n'.join([x + u' ' for x in ls1])
-        elif len(ss1) == 0:
-            return u'\n'.join([u' ' + x for x in ls2])
+        return u'\n'.join(cls.lines_concat(ss1.split(u'\n'), ss2.split(u'\n')))
+
+    @classmethod
+    def lines_concat(cls, ls1, ls2):
+        """Line list version of show_concat(). A string is represented by the list of lines split at new lines
+        so a trailing new line is an empty last line.
+
+        Args:
+            ls1: A list of unicode strings.
+            ls2: A list of unicode strings.
+
+        Returns:
+            A new list of unicode strings.
+        """
+        if len(ls2) == 1 and len(ls2[0]) == 0:
+            return [x + u' ' for x in ls1]
+        elif len(ls1) == 1 and len(ls1[0]) == 0:
+            return [u' ' + x for x in ls2]
 
         result = []
-        n2 = len(ls2[0])
         for s1,s2 in zip(ls1,ls2):
             result.append(s1 + s2)
 
@@ -97,7 +108,7 @@ class Showable(object):
             n = len(ls2[0]) + 1
             for s1 in ls1[len(ls2):]:
                 result.append(s2 + (u' ' * n))
-        return u'\n'.join(result)
+        return result
 
     @classmethod
     def show_content(cls, n, s):
@@ -110,8 +121,20 @@ class Showable(object):
         Returns:
             A unicode string
         """
-        ls = s.split(u'\n')
-        return u'\n'.join(map(lambda x: cls.boxVerLine + u' ' + x + (u' ' * (n - 4 - len(x))) + u' ' + cls.boxVerLine, ls))
+        return u'\n'.join(cls.lines_content(n, s.split(u'\n')))
+
+    @classmethod
+    def lines_content(cls, n, ls):
+        """Line list version of show_content().
+
+        Args:
+            n: An integer
+            ls: A list of unicode strings.
+
+        Returns:
+            A new list of unicode strings.
+        """
+        return [cls.boxVerLine + u' ' + x + (u' ' * (n - 4 - len(x))) + u' ' + cls.boxVerLine for x in ls]
 
     @classmethod
     def show_horz_line(cls, n, lc, rc):
@@ -163,19 +186,34 @@ class Showable(object):
         """
         if len(m) == 0:
             return s
-        lns = s.split(u'\n')
+        return u'\n'.join(cls.lines_modifier(m, p, s.split(u'\n')))
+
+    @classmethod
+    def lines_modifier(cls, m, p, ls):
+        """Line list version of show_modifier().
+
+        Args:
+            m: A modifier string.
+            p: An integer.
+            ls: A list of unicode strings. The list is not modified.
+
+        Returns:
+            A list of unicode strings.
+        """
+        if len(m) == 0:
+            return ls
         k = len(m)
-        if len(lns) <= p:
-            return cls.show_concat(u' ' * k, s)
+        if len(ls) <= p:
+            return cls.lines_concat([u' ' * k], ls)
         ws = u' ' * (k+1)
-        for i in range(p):
-            lns[i] = ws + lns[i]
-        lns[p] = m + u' ' + lns[p]
-        for i in range(p+1, len(lns)-1):
-            lns[i] = ws + lns[i]
+        lns = [ws + x for x in ls[0:p]]
+        lns.append(m + u' ' + ls[p])
+        lns.extend([ws + x for x in ls[p+1:-1]])
+        if len(ls) > p+1:
+            lns.append(ls[-1])
         if len(lns[-1]) != 0:
             lns[-1] = ws + lns[-1]
-        return u'\n'.join(lns)
+        return lns
 
     @classmethod
     def show_padding(cls, s):
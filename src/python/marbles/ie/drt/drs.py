@@ -1,5 +1,5 @@
 from __future__ import unicode_literals, print_function
-from marbles import safe_utf8_decode, safe_utf8_encode, UNICODE_STRINGS
+from marbles import safe_utf8_decode, safe_utf8_encode, UNICODE_STRINGS, Properties
 from utils import iterable_type_check, union, union_inplace, intersect, rename_var, compare_lists_eq
 from common import SHOW_BOX, SHOW_LINEAR, SHOW_SET, SHOW_DEBUG
 from common import DRSVar, DRSConst, Showable
@@ -15,6 +15,20 @@ def _pure_refs(ld, gd, rs, srs):
     return all([(r.has_bound(ld, gd) or r not in srs) for r in rs])
 
 
+class _DRSCacheState(object):
+    """Counts in place renames of referents and relations. These are shared between DRS's without links back
+    to the DRS's using them, so a rename cannot be traced to the cached properties it changes.
+    """
+    generation = 0
+
+
+def invalidate_drs_caches():
+    """Invalidate all cached DRS properties. Must be called whenever a referent or relation is renamed in
+    place. Changes to the structure of a DRS are tracked per instance, see AbstractDRS._invalidate_cache().
+    """
+    _DRSCacheState.generation += 1
+
+
 class ConditionRef(object):
     """References a condition in a DRS."""
 
@@ -47,8 +61,70 @@ class ConditionRef(object):
         self.ld.remove_condition(self)
 
 
+class ConditionTable(object):
+    """Hash-consing table for DRS conditions. Structurally equal conditions map to the first instance added so
+    duplicates are found with one lookup. Use one table per document.
+
+    Remarks:
+        Conditions must not be modified while they are in the table.
+    """
+
+    def __init__(self, conds=None):
+        self._table = {}
+        if conds is not None:
+            for c in conds:
+                self.intern(c)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, c):
+        return c in self._table
+
+    def intern(self, c):
+        """Get the shared instance of a condition, adding `c` if it is not in the table.
+
+        Args:
+            c: A condition.
+
+        Returns:
+            The condition in the table.
+        """
+        return self._table.setdefault(c, c)
+
+    def add(self, c):
+        """Add a condition.
+
+        Args:
+            c: A condition.
+
+        Returns:
+            True if the condition was not already in the table.
+        """
+        n = len(self._table)
+        self._table.setdefault(c, c)
+        return n != len(self._table)
+
+    def unique(self, conds):
+        """Remove conditions already in the table and add the remaining conditions.
+
+        Args:
+            conds: An iterable of conditions.
+
+        Returns:
+            A list of new conditions. Ordering is maintained.
+        """
+        return [c for c in conds if self.add(c)]
+
+
 class AbstractDRS(Showable):
     """Abstract Core Discourse Representation Structure for DRS and PDRS"""
+    # Cached properties are valid while _cache_generation == _DRSCacheState.generation. A DRS is only
+    # modified in place by remove_condition() which calls _invalidate_cache(), so constructing or
+    # composing DRS's does not discard the properties cached on existing DRS's.
+    _cache = None
+    _cache_generation = -1
+
     def __init__(self):
         self._accessible_drs = None
 
@@ -73,6 +149,138 @@ class AbstractDRS(Showable):
         self._accessible_drs = None
         return True
 
+    def _traverse(self, key):
+        """Compute a cacheable property by a full traversal."""
+        if key == 'freerefs':
+            return sorted(set(self.get_freerefs(self)))
+        elif key == 'variables':
+            return sorted(set(self.get_variables(None)))
+        elif key == 'constants':
+            return sorted(set(self.get_constants(None)))
+        elif key == 'universes':
+            return sorted(set(self.get_universes(None)))
+        elif key == 'accessible_universe':
+            u = set()
+            g = self
+            while g is not None:
+                u = u.union(g.referents)
+                g = g.accessible_drs
+            return sorted(u)
+        raise KeyError(key)
+
+    def _get_cached(self, key, fn=None):
+        """Get a cached property.
+
+        Args:
+            key: The property name.
+            fn: Optional function that computes the property. The default is a full traversal.
+
+        Returns:
+            A shallow copy of the cached list.
+
+        Remarks:
+            If marbles.Properties.drs_cache_verify is True then cache hits are checked against a full traversal.
+        """
+        if not Properties.drs_cache:
+            return self._traverse(key)
+        cache = self._get_cache()
+        v = cache.get(key)
+        if v is None:
+            v = self._traverse(key) if fn is None else fn()
+            cache[key] = v
+        elif Properties.drs_cache_verify:
+            x = self._traverse(key)
+            if len(x) != len(v) or set(x) != set(v):
+                raise AssertionError('stale DRS cache for %s: cached=%s, actual=%s' % (key, v, x))
+        return [x for x in v]
+
+    def _invalidate_cache(self):
+        """Discard the cached properties of this DRS and of every DRS it is accessible from. A sub-DRS is
+        always accessible from the DRS containing it so this reaches every DRS whose properties depend on it.
+        """
+        d = self
+        while d is not None:
+            d._cache_generation = -1
+            d = d.accessible_drs
+
+    def _get_cache(self):
+        """Get the property cache, discarding stale properties."""
+        if self._cache_generation != _DRSCacheState.generation:
+            self._cache = {}
+            self._cache_generation = _DRSCacheState.generation
+        return self._cache
+
+    def _get_cached_show(self, key, fn):
+        """Get cached show() output.
+
+        Args:
+            key: A notation or 'boxlines'.
+            fn: Function that renders the output.
+
+        Returns:
+            The cached output. Callers must not modify it.
+
+        Remarks:
+            Output is cached on every DRS, not only on finished DRS's. This is safe because the output only
+            depends on the DRS and its sub-DRS's, and every in place change invalidates it: remove_condition()
+            invalidates the modified DRS and the DRS's it is accessible from, and renaming a referent or
+            relation invalidates all caches. Any other change builds new DRS instances.
+        """
+        if not Properties.drs_cache:
+            return fn()
+        cache = self._get_cache()
+        v = cache.get(('show', key))
+        if v is None:
+            v = fn()
+            cache[('show', key)] = v
+        elif Properties.drs_cache_verify:
+            x = fn()
+            if x != v:
+                raise AssertionError('stale DRS cache for show(%s): cached=%s, actual=%s' % (key, v, x))
+        return v
+
+    def _peek_cached_show(self, key):
+        """Get cached show() output without rendering.
+
+        Returns:
+            The cached output or None.
+        """
+        if not Properties.drs_cache or Properties.drs_cache_verify \
+                or self._cache_generation != _DRSCacheState.generation:
+            return None
+        return self._cache.get(('show', key))
+
+    def _box_lines(self):
+        """SHOW_BOX helper. Returns the output as a list of lines. Callers must not modify the list."""
+        return self.show(SHOW_BOX).split(u'\n')
+
+    def _write_show(self, out, notation):
+        """SHOW_LINEAR and SHOW_SET helper. Appends the output to the writer buffer `out`."""
+        out.append(self.show(notation))
+
+    def _canonical_hash(self):
+        """Compute the structural hash. The default hashes the linear form."""
+        return hash(self.show(SHOW_LINEAR))
+
+    @property
+    def canonical_hash(self):
+        """Structural hash of this DRS. The order of referents in a universe and the order of conditions does
+        not change the hash. The order of relation arguments does.
+
+        Remarks:
+            The result is cached.
+        """
+        if not Properties.drs_cache:
+            return self._canonical_hash()
+        cache = self._get_cache()
+        v = cache.get('hash')
+        if v is None:
+            v = self._canonical_hash()
+            cache['hash'] = v
+        elif Properties.drs_cache_verify and v != self._canonical_hash():
+            raise AssertionError('stale DRS cache for hash')
+        return v
+
     @property
     def isempty(self):
         return False
@@ -92,52 +300,65 @@ class AbstractDRS(Showable):
 
     @property
     def accessible_universe(self):
-        """Returns the universe of referents accessible to this DRS."""
-        u = set()
-        g = self
-        while g is not None:
-            u = u.union(g.referents)
-            g = g.accessible_drs
-        return sorted(u)
+        """Returns the universe of referents accessible to this DRS.
+
+        Remarks:
+            The result is cached until the outer-most accessible DRS changes.
+        """
+        if not Properties.drs_cache:
+            return self._traverse('accessible_universe')
+        # Accessible links are set once so the chain only changes at the outer end, when the global DRS is
+        # composed into a new DRS or is released.
+        g = self.global_drs
+        cache = self._get_cache()
+        v = cache.get('accessible_universe')
+        if v is None or v[0]() is not g:
+            v = (weakref.ref(g), self._traverse('accessible_universe'))
+            cache['accessible_universe'] = v
+        elif Properties.drs_cache_verify:
+            x = self._traverse('accessible_universe')
+            if set(x) != set(v[1]):
+                raise AssertionError('stale DRS cache for accessible_universe: cached=%s, actual=%s' % (v[1], x))
+        return [x for x in v[1]]
 
     @property
     def freerefs(self):
         """Returns the list of all free DRSRef's in this DRS.
 
         Remarks:
-            Same as sorted(set(get_freerefs(self)))
+            Same as sorted(set(get_freerefs(self))). The result is cached.
         """
-        return sorted(set(self.get_freerefs(self)))
+        return self._get_cached('freerefs')
 
     @property
     def variables(self):
         """Returns the list of all bound DRSRef's in this DRS.
 
         Remarks:
-            Same as sorted(set(get_variables(None)))
+            Same as sorted(set(get_variables(None))). The result is cached.
         """
-        return sorted(set(self.get_variables(None)))
+        return self._get_cached('variables')
 
     @property
     def constants(self):
         """Returns the list of all constant DRSRef's in this DRS.
 
         Remarks:
-            Same as sorted(set(get_constants(None)))
+            Same as sorted(set(get_constants(None))). The result is cached.
         """
-        return sorted(set(self.get_constants(None)))
+        return self._get_cached('constants')
 
     @property
     def universes(self):
         """Returns the list of DRSRef's from all universes in this DRS.
 
         Remarks:
-            Same as sorted(set(get_universes(None)))
+            Same as sorted(set(get_universes(None))). The result is cached.
 
         See Also:
             AbstractDRS.universe property.
         """
-        return sorted(set(self.get_universes(None)))
+        return self._get_cached('universes')
 
     ## @remarks Original haskell code in <a href="https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/Structure.hs">/Data/DRS/Structure.hs:isResolvedDRS</a>
     ## and <a href="https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/PDRS/Structure.hs">/Data/PDRS/Structure.hs:isResolvedPDRS</a>.
@@ -364,6 +585,18 @@ class AbstractDRS(Showable):
         """
         raise NotImplementedError
 
+    def map_refs(self, vm):
+        """Rename all referents, bound and free, in this DRS on the basis of the map `vm`. Unlike alpha
+        conversion no binding analysis is done so the new names must not capture existing referents.
+
+        Args:
+            vm: A dictionary mapping DRSRef's to DRSRef's. Referents not in the map are not renamed.
+
+        Returns:
+            A DRS instance.
+        """
+        raise NotImplementedError
+
     def substitute(self, rs, ps=None):
         """Applies substitution to the free variables in this DRS on the basis of the conversion list `rs` for
         DRSRef's.
@@ -484,10 +717,11 @@ class DRS(AbstractDRS):
                and compare_lists_eq(self._conds, other._conds)
 
     def __hash__(self):
-        refs = set(self.universe)
-        refs.union(self.freerefs)
-        conds = set(self._conds)
-        return hash(conds) ^ hash(refs)
+        return self.canonical_hash
+
+    def _canonical_hash(self):
+        return hash(('DRS', frozenset([r.var.to_string() for r in self._refs]),
+                     frozenset([c.canonical_hash for c in self._conds])))
 
     def _set_accessible(self, d):
         if self._accessible_drs is None:
@@ -560,6 +794,7 @@ class DRS(AbstractDRS):
         if id(rc.ld) == id(self):
             conds = filter(lambda c: c != rc.cond, self._conds)
             self._conds = conds
+            self._invalidate_cache()
         elif self.find_subdrs(self.ld) is not None:
             rc.ld.remove_condition(rc)
 
@@ -571,13 +806,53 @@ class DRS(AbstractDRS):
 
         Returns:
             A tuple of the global DRS, and the found condition or (self,None).
+
+        Remarks:
+            Candidates are found with a lookup on the condition index. See get_condition_index().
         """
-        for ctest in self._conds:
-            rc = ctest.find_condition(c, self)
-            if rc is not None:
-                return rc
+        for ld, ctest in self.get_condition_index().get(c.canonical_hash, []):
+            if ctest == c:
+                rc = ctest.find_condition(c, ld)
+                if rc is not None:
+                    return rc
         return None
 
+    def _build_condition_index(self):
+        # get_condition_index() helper. Conditions are added in the order a recursive search visits them.
+        index = {}
+        stack = [self]
+        while len(stack) != 0:
+            x = stack.pop()
+            if isinstance(x, tuple):
+                # A (local DRS, condition) tuple. Sub-DRS's are searched before the next condition.
+                index.setdefault(x[1].canonical_hash, []).append(x)
+                stack.extend(reversed(x[1]._subdrs()))
+            elif isinstance(x, Merge):
+                stack.append(x._drsB)
+                stack.append(x._drsA)
+            else:
+                stack.extend(reversed([(x, c) for c in x._conds]))
+        return index
+
+    def get_condition_index(self):
+        """Get an index of all conditions in this DRS and its sub-DRS's.
+
+        Returns:
+            A dictionary mapping the canonical hash of a condition to a list of (local DRS, condition) tuples.
+            Callers must not modify it.
+
+        Remarks:
+            The result is cached.
+        """
+        if not Properties.drs_cache:
+            return self._build_condition_index()
+        cache = self._get_cache()
+        v = cache.get('condindex')
+        if v is None:
+            v = self._build_condition_index()
+            cache['condindex'] = v
+        return v
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this DRS and return the found subordinate DRS."""
         if self == d:
@@ -716,6 +991,12 @@ class DRS(AbstractDRS):
         return DRS([rename_var(r, rs) for r in self._refs], \
                    [c._convert(self, gd, rs) for c in self._conds])
 
+    def map_refs(self, vm):
+        """Rename all referents, bound and free, in this DRS on the basis of the map `vm`. See
+        AbstractDRS.map_refs().
+        """
+        return DRS([vm.get(r, r) for r in self._refs], [c._map_refs(vm) for c in self._conds])
+
     def subst_subdrs(self, gd, rs):
         """Applies substitution to this DRS, which is a subordinate DRS of the global DRS `gd`, on the basis of the
         conversion list `rs` for DRSRef's .
@@ -743,11 +1024,10 @@ class DRS(AbstractDRS):
         Raises:
             ie.fol.FOLConversionError
         """
-        if len(self._refs) == 0:
-            return conds_to_mfol(self._conds, world, worlds)
-        # FIXME: remove recursion
-        #return fol.Exists(fol.FOLVar(self._refs[0].var), DRS(self._refs[1:], self._conds).to_mfol(world, worlds))
-        return fol.Exists(self._refs[0].var, DRS(self._refs[1:], self._conds).to_mfol(world, worlds))
+        f = conds_to_mfol(self._conds, world, worlds)
+        for r in reversed(self._refs):
+            f = fol.Exists(r.var, f)
+        return f
 
     # Original haskell code in <a href="https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/Show.hs">/Data/DRS/Show.hs::showUniverse</a>
     def _show_universe(self, d, notation):
@@ -772,27 +1052,61 @@ class DRS(AbstractDRS):
              A unicode string.
         """
         if notation == SHOW_BOX:
-            if len(self._refs) == 0:
-                ul = u' '
-            else:
-                ul = self._show_universe(u'  ', notation)
-            cl = self._show_conditions(notation).rstrip()
-            l = 4 + max(union(map(len, ul.split(u'\n')), map(len, cl.split(u'\n'))))
-            top = self.show_horz_line(l, self.boxTopLeft, self.boxTopRight)
-            mid = self.show_content(l, ul) + u'\n' + self.show_horz_line(l, self.boxMiddleLeft, self.boxMiddleRight)
-            bottom = self.show_content(l, cl) + u'\n' + self.show_horz_line(l, self.boxBottomLeft, self.boxBottomRight)
-            return top + mid + bottom
-        elif notation == SHOW_LINEAR:
-            ul = self._show_universe(',', notation)
-            cl = self._show_conditions(notation)
-            return u'[' + ul + u'| ' + cl + u']'
-        elif notation == SHOW_SET:
-            ul = self._show_universe(',', notation)
-            cl = self._show_conditions(notation)
-            return u'<{' + ul + u'},{' + cl + u'}>'
+            return self._get_cached_show(notation, lambda: u'\n'.join(self._box_lines()))
+        elif notation in [SHOW_LINEAR, SHOW_SET]:
+            return self._get_cached_show(notation, lambda: self._render_show(notation))
         cl = self._show_conditions(notation)
         return u'DRS ' + unicode(self._refs) + u' [' + cl + u']'
 
+    def _render_show(self, notation):
+        # show() helper
+        out = []
+        self._write_show(out, notation)
+        return u''.join(out)
+
+    def _write_show(self, out, notation):
+        """SHOW_LINEAR and SHOW_SET helper. Appends the output to the writer buffer `out`."""
+        s = self._peek_cached_show(notation)
+        if s is not None:
+            out.append(s)
+            return
+        out.append(u'[' if notation == SHOW_LINEAR else u'<{')
+        out.append(self._show_universe(u',', notation))
+        out.append(u'| ' if notation == SHOW_LINEAR else u'},{')
+        for i, c in enumerate(self._conds):
+            if i != 0:
+                out.append(u',')
+            c._write_show(out, notation)
+        out.append(u']' if notation == SHOW_LINEAR else u'}>')
+
+    def _box_lines(self):
+        """SHOW_BOX helper. Returns the output as a list of lines. Callers must not modify the list."""
+        return self._get_cached_show('boxlines', self._render_box_lines)
+
+    def _render_box_lines(self):
+        # _box_lines() helper
+        if len(self._refs) == 0:
+            ul = [u' ']
+        else:
+            ul = self._show_universe(u'  ', SHOW_BOX).split(u'\n')
+        # Join the condition lines, then the same as rstrip() on the joined string
+        cl = [u'']
+        for c in self._conds:
+            lns = c._box_lines()
+            cl[-1] += lns[0]
+            cl.extend(lns[1:])
+        while len(cl) > 1 and len(cl[-1].rstrip()) == 0:
+            cl.pop()
+        cl[-1] = cl[-1].rstrip()
+        l = 4 + max(max(map(len, ul)), max(map(len, cl)))
+        lines = [self.boxTopLeft + (self.boxHorLine * (l - 2)) + self.boxTopRight]
+        lines.extend(self.lines_content(l, ul))
+        lines.append(self.boxMiddleLeft + (self.boxHorLine * (l - 2)) + self.boxMiddleRight)
+        lines.extend(self.lines_content(l, cl))
+        lines.append(self.boxBottomLeft + (self.boxHorLine * (l - 2)) + self.boxBottomRight)
+        lines.append(u'')
+        return lines
+
 
 class Merge(AbstractDRS):
     """A merge between two DRSs"""
@@ -815,6 +1129,12 @@ class Merge(AbstractDRS):
     def __eq__(self, other):
         return type(self) == type(other) and self._drsA == other._drsA and self._drsB == other._drsB
 
+    def __hash__(self):
+        return self.canonical_hash
+
+    def _canonical_hash(self):
+        return hash(('Merge', self._drsA.canonical_hash, self._drsB.canonical_hash))
+
     def __unicode__(self):
         return '%s %s %s' % (safe_utf8_decode(self._drsA), Showable.opMerge, safe_utf8_decode(self._drsB))
 
@@ -867,6 +1187,27 @@ class Merge(AbstractDRS):
         """Returns the universe of a DRS. Alias for universe property."""
         return union(self._drsA.referents, self._drsB.referents)
 
+    @property
+    def variables(self):
+        """Returns the list of all bound DRSRef's in this DRS. Composed from the cached variables of the merged
+        DRS's.
+        """
+        return self._get_cached('variables', lambda: sorted(set(self._drsA.variables).union(self._drsB.variables)))
+
+    @property
+    def constants(self):
+        """Returns the list of all constant DRSRef's in this DRS. Composed from the cached constants of the merged
+        DRS's.
+        """
+        return self._get_cached('constants', lambda: sorted(set(self._drsA.constants).union(self._drsB.constants)))
+
+    @property
+    def universes(self):
+        """Returns the list of DRSRef's from all universes in this DRS. Composed from the cached universes of the
+        merged DRS's.
+        """
+        return self._get_cached('universes', lambda: sorted(set(self._drsA.universes).union(self._drsB.universes)))
+
     def find_condition(self, c):
         """Search for a condition matching `c`.
 
@@ -984,6 +1325,12 @@ class Merge(AbstractDRS):
         """
         return Merge(self._drsA.rename_subdrs(gd, rs), self._drsB.rename_subdrs(gd, rs))
 
+    def map_refs(self, vm):
+        """Rename all referents, bound and free, in this DRS on the basis of the map `vm`. See
+        AbstractDRS.map_refs().
+        """
+        return Merge(self._drsA.map_refs(vm), self._drsB.map_refs(vm))
+
     def subst_subdrs(self, gd, rs):
         """Applies substitution to this DRS, which is a subordinate DRS of the global DRS `gd`, on the basis of the
         conversion list `rs` for DRSRef's .
@@ -997,9 +1344,14 @@ class Merge(AbstractDRS):
         """
         return Merge(self._drsA.subst_subdrs(gd, rs), self._drsB.subst_subdrs(gd, rs))
 
-    def _show_brackets(self, s):
-        # show() helper
-        return self.show_modifier(u'(', 2, self.show_concat(s, self.show_padding(u')\n')))
+    def _box_lines(self):
+        """SHOW_BOX helper. Returns the output as a list of lines. Callers must not modify the list."""
+        return self._get_cached_show('boxlines', self._render_box_lines)
+
+    def _render_box_lines(self):
+        # _box_lines() helper
+        lns = self.lines_concat(self._drsA._box_lines(), self.lines_modifier(self.opMerge, 2, self._drsB._box_lines()))
+        return self.lines_modifier(u'(', 2, self.lines_concat(lns, self.show_padding(u')\n').split(u'\n')))
 
     ## @remarks Original haskell code in <a href="https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/Show.hs">/Data/DRS/Show.hs::showDRSBox</a>
     ##
@@ -1013,10 +1365,9 @@ class Merge(AbstractDRS):
              A unicode string.
         """
         if notation == SHOW_BOX:
-            return self._show_brackets(self.show_concat(self._drsA.show(notation),
-                                            self.show_modifier(self.opMerge, 2, self._drsB.show(notation))))
+            return self._get_cached_show(notation, lambda: u'\n'.join(self._box_lines()))
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return merge(self._drsA, self._drsB).show(notation)
+            return self._get_cached_show(notation, lambda: merge(self._drsA, self._drsB).show(notation))
         return u'Merge (' + self._drsA.show(notation) + ') (' + self._drsB.show(notation) + u')'
 
 
@@ -1047,22 +1398,21 @@ def get_new_drsrefs(ors, ers):
     if len(ors) == 0:
         return []
     result = []
+    # Only membership of ers is required
+    ers = set(ers)
     for i in range(len(ors)):
         r = ors[i]
         if not isinstance(r, AbstractDRSRef):
             raise TypeError('get_new_drsrefs expects a DRS argument')
         rd = r.increase_new()
-        if rd in union(ors[i+1:], ers):
+        if rd in ers or rd in ors[i+1:]:
             ors = [x for x in ors[i:]]  # shallow partial copy
             ors[0] = rd
             # FIXME: remove recursion
             result.extend(get_new_drsrefs(ors, ers))
             return result
         else:
-            # FIXME: check if we can ue append rather then push front
-            y = [rd]
-            y.extend(ers)
-            ers = y
+            ers.add(rd)
             result.append(rd)
     return result
 
@@ -1142,6 +1492,7 @@ class AbstractDRSRef(Showable):
     def set_var(self, var):
         assert not self.isconst
         self._var = var
+        invalidate_drs_caches()
 
 
 class DRSRef(AbstractDRSRef):
@@ -1228,19 +1579,52 @@ class DRSRelation(AbstractDRSRelation):
     def rename(self, name):
         if isinstance(name, (str, unicode)):
             self._name = name
+            invalidate_drs_caches()
         else:
             raise TypeError('DRSRelation expects a string')
 
 
 class AbstractDRSCond(Showable):
     """Abstract DRS Condition"""
-
     def __hash__(self):
+        return self.canonical_hash
+
+    def _canonical_hash(self):
+        """Compute the structural hash. The default hashes the string form."""
         return hash(unicode(self))
 
+    @property
+    def canonical_hash(self):
+        """Structural hash of this condition. Conditions which differ only in the order of referents in a
+        universe, or the order of conditions in a sub-DRS, have the same hash.
+
+        Remarks:
+            Conditions with sub-DRS's combine the cached hashes of the sub-DRS's. The condition itself is not
+            invalidated when a sub-DRS is modified so the result is not cached here.
+        """
+        return self._canonical_hash()
+
+    def _subdrs(self):
+        """Get the sub-DRS's of this condition in search order."""
+        return []
+
     def __repr__(self):
         return unicode(self) if UNICODE_STRINGS else str(self)
 
+    def _box_lines(self):
+        """SHOW_BOX helper. Returns the output as a list of lines. Callers must not modify the list."""
+        return self.show(SHOW_BOX).split(u'\n')
+
+    def _write_show(self, out, notation):
+        """SHOW_LINEAR and SHOW_SET helper. Appends the output to the writer buffer `out`."""
+        out.append(self.show(notation))
+
+    def _render_show(self, notation):
+        # show() helper
+        out = []
+        self._write_show(out, notation)
+        return u''.join(out)
+
     def _set_accessible(self, d):
         raise NotImplementedError
 
@@ -1271,6 +1655,9 @@ class AbstractDRSCond(Showable):
     def _substitute(self, ld, gd, rs):
         raise NotImplementedError
 
+    def _map_refs(self, vm):
+        raise NotImplementedError
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         raise NotImplementedError
@@ -1335,6 +1722,10 @@ class AbstractDRSCond(Showable):
 
 class Rel(AbstractDRSCond):
     """A relation defined on a set of referents."""
+    # The cached hash is valid while _hash_generation == _DRSCacheState.generation
+    _hash = None
+    _hash_generation = -1
+
     def __init__(self, drsRel, drsRefs):
         """Constructor.
 
@@ -1351,7 +1742,8 @@ class Rel(AbstractDRSCond):
         if not isinstance(drsRel, AbstractDRSRelation):
             raise TypeError('Rel expects DRSRelation')
         self._rel = drsRel
-        self._refs = drsRefs
+        # A list so equality is elementwise
+        self._refs = drsRefs if isinstance(drsRefs, list) else list(drsRefs)
 
     def __str__(self):
         return b'%s(%s)' % (str(self._rel), ','.join([str(x) for x in self._refs]))
@@ -1360,10 +1752,30 @@ class Rel(AbstractDRSCond):
         return u'%s(%s)' % (unicode(self._rel), ','.join([unicode(x) for x in self._refs]))
 
     def __ne__(self, other):
-        return type(self) != type(other) or self._rel != other._rel or not compare_lists_eq(self._refs, other._refs)
+        return type(self) != type(other) or self._rel != other._rel or self._refs != other._refs
 
     def __eq__(self, other):
-        return type(self) == type(other) and self._rel == other._rel and compare_lists_eq(self._refs, other._refs)
+        # Argument order is significant, e.g. _ARG0(e,x) and _ARG0(x,e)
+        return type(self) == type(other) and self._rel == other._rel and self._refs == other._refs
+
+    def _canonical_hash(self):
+        return hash(('Rel', self._rel.to_string(), tuple([r.var.to_string() for r in self._refs])))
+
+    @property
+    def canonical_hash(self):
+        """Structural hash of this relation. The order of arguments changes the hash.
+
+        Remarks:
+            The result is cached until a referent or relation is renamed in place.
+        """
+        if not Properties.drs_cache:
+            return self._canonical_hash()
+        if self._hash_generation != _DRSCacheState.generation:
+            self._hash = self._canonical_hash()
+            self._hash_generation = _DRSCacheState.generation
+        elif Properties.drs_cache_verify and self._hash != self._canonical_hash():
+            raise AssertionError('stale DRS cache for hash')
+        return self._hash
 
     def _set_accessible(self, d):
         return True
@@ -1389,6 +1801,9 @@ class Rel(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return Rel(self._rel, [rename_var(r,rs) if not r.has_bound(ld, gd) else r for r in self._refs])
 
+    def _map_refs(self, vm):
+        return Rel(self._rel, [vm.get(r, r) for r in self._refs])
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         rs = union(rs, self._refs)
@@ -1474,12 +1889,18 @@ class Rel(AbstractDRSCond):
         v.extend([x.var for x in self._refs])
         return fol.Rel(self._rel.to_string(), v)
 
+    def _box_lines(self):
+        return [unicode(self._rel) + u'(' + ','.join([x.var.show(SHOW_BOX) for x in self._refs]) + u')', u'']
+
+    def _write_show(self, out, notation):
+        out.extend([unicode(self._rel), u'(', ','.join([x.var.show(notation) for x in self._refs]), u')'])
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
             return unicode(self._rel) + u'(' + ','.join([x.var.show(notation) for x in self._refs]) + u')\n'
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return unicode(self._rel) + u'(' + ','.join([x.var.show(notation) for x in self._refs]) + u')'
+            return self._render_show(notation)
         return u'Rel (' + unicode(self._rel) + u') (' + ','.join([x.var.show(notation) for x in self._refs]) + u')'
 
 
@@ -1534,6 +1955,9 @@ class Neg(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return type(self)(self._drs.subst_subdrs(gd, rs))
 
+    def _map_refs(self, vm):
+        return type(self)(self._drs.map_refs(vm))
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         cd1, rs1 = self._drs.purify_refs(gd, rs)
@@ -1600,6 +2024,12 @@ class Neg(AbstractDRSCond):
     def clone(self):
         return Neg(self._drs.clone())
 
+    def _canonical_hash(self):
+        return hash(('Neg', self._drs.canonical_hash))
+
+    def _subdrs(self):
+        return [self._drs]
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this condition and return the found subordinate DRS."""
         return self._drs.find_subdrs(d)
@@ -1614,12 +2044,19 @@ class Neg(AbstractDRSCond):
         """Helper for DRS function of same name."""
         return fol.Neg(self._drs.to_mfol(world, worlds))
 
+    def _box_lines(self):
+        return self.lines_modifier(self.opNeg, 2, self._drs._box_lines())
+
+    def _write_show(self, out, notation):
+        out.append(self.opNeg)
+        self._drs._write_show(out, notation)
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
-            return self.show_modifier(self.opNeg, 2, self._drs.show(notation))
+            return u'\n'.join(self._box_lines())
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return self.opNeg + self._drs.show(notation)
+            return self._render_show(notation)
         return u'Neg (' + self._drs.show(notation) + u')'
 
 
@@ -1680,6 +2117,9 @@ class Imp(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return type(self)(self._drsA.subst_subdrs(gd, rs), self._drsB.subst_subdrs(gd, rs))
 
+    def _map_refs(self, vm):
+        return type(self)(self._drsA.map_refs(vm), self._drsB.map_refs(vm))
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         orsd = intersect(self._drsA.universe, rs)
@@ -1762,6 +2202,12 @@ class Imp(AbstractDRSCond):
     def clone(self):
         return Imp(self._drsA.clone(), self._drsB.clone())
 
+    def _canonical_hash(self):
+        return hash(('Imp', self._drsA.canonical_hash, self._drsB.canonical_hash))
+
+    def _subdrs(self):
+        return [self._drsA, self._drsB]
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this condition and return the found subordinate DRS."""
         return self._drsA.find_subdrs(d) or self._drsB.find_subdrs(d)
@@ -1783,13 +2229,20 @@ class Imp(AbstractDRSCond):
             f = fol.ForAll(r.var, f)
         return f
 
+    def _box_lines(self):
+        return self.lines_concat(self._drsA._box_lines(), self.lines_modifier(self.opImp, 2, self._drsB._box_lines()))
+
+    def _write_show(self, out, notation):
+        self._drsA._write_show(out, notation)
+        out.append(u' ' + self.opImp + u' ')
+        self._drsB._write_show(out, notation)
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
-            return self.show_concat(self._drsA.show(notation), \
-                                    self.show_modifier(self.opImp, 2, self._drsB.show(notation)))
+            return u'\n'.join(self._box_lines())
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return self._drsA.show(notation) + u' ' + self.opImp + u' ' + self._drsB.show(notation)
+            return self._render_show(notation)
         return u'Imp (' + self._drsA.show(notation) + u') (' + self._drsB.show(notation) + u')'
 
 
@@ -1849,6 +2302,9 @@ class Or(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return type(self)(self._drsA.subst_subdrs(gd, rs), self._drsB.subst_subdrs(gd, rs))
 
+    def _map_refs(self, vm):
+        return type(self)(self._drsA.map_refs(vm), self._drsB.map_refs(vm))
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         orsd = intersect(self._drsA.universe, rs)
@@ -1931,6 +2387,12 @@ class Or(AbstractDRSCond):
         u = self._drsA.get_constants(u)
         return self._drsB.get_constants(u)
 
+    def _canonical_hash(self):
+        return hash(('Or', self._drsA.canonical_hash, self._drsB.canonical_hash))
+
+    def _subdrs(self):
+        return [self._drsA, self._drsB]
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this condition and return the found subordinate DRS."""
         return self._drsA.find_subdrs(d) or self._drsB.find_subdrs(d)
@@ -1945,13 +2407,20 @@ class Or(AbstractDRSCond):
         """Helper for DRS function of same name."""
         return fol.Or(self._drsA.to_mfol(world, worlds), self._drsB.to_mfol(world, worlds))
 
+    def _box_lines(self):
+        return self.lines_concat(self._drsA._box_lines(), self.lines_modifier(self.opOr, 2, self._drsB._box_lines()))
+
+    def _write_show(self, out, notation):
+        self._drsA._write_show(out, notation)
+        out.append(u' ' + self.opOr + u' ')
+        self._drsB._write_show(out, notation)
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
-            return self.show_concat(self._drsA.show(notation), \
-                                    self.show_modifier(self.opOr, 2, self._drsB.show(notation)))
+            return u'\n'.join(self._box_lines())
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return self._drsA.show(notation) + u' ' + self.opOr + u' ' + self._drsB.show(notation)
+            return self._render_show(notation)
         return u'Or (' + self._drsA.show(notation) + u') (' + self._drsB.show(notation) + u')'
 
 
@@ -2008,6 +2477,9 @@ class Prop(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return type(self)(rename_var(self._ref,rs) if not self._ref.has_bound(ld, gd) else self._ref, self._drs.subst_subdrs(gd, rs))
 
+    def _map_refs(self, vm):
+        return type(self)(vm.get(self._ref, self._ref), self._drs.map_refs(vm))
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         # FIXME: does this really need to be added to front of list
@@ -2091,6 +2563,12 @@ class Prop(AbstractDRSCond):
     def clone(self):
         return Prop(self._ref, self._drs.clone())
 
+    def _canonical_hash(self):
+        return hash(('Prop', self._ref.var.to_string(), self._drs.canonical_hash))
+
+    def _subdrs(self):
+        return [self._drs]
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this condition and return the found subordinate DRS."""
         return self._drs.find_subdrs(d)
@@ -2105,12 +2583,19 @@ class Prop(AbstractDRSCond):
         """Helper for DRS function of same name."""
         return fol.And(fol.Acc([world, self._ref.var]), self._drs.to_mfol(world, worlds))
 
+    def _box_lines(self):
+        return self.lines_modifier(self._ref.var.show(SHOW_BOX) + u':', 2, self._drs._box_lines())
+
+    def _write_show(self, out, notation):
+        out.append(self._ref.var.show(notation) + u': ')
+        self._drs._write_show(out, notation)
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
-            return self.show_modifier(self._ref.var.show(notation) + u':', 2, self._drs.show(notation))
+            return u'\n'.join(self._box_lines())
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return self._ref.var.show(notation) + u': ' + self._drs.show(notation)
+            return self._render_show(notation)
         return u'Prop (' + self._ref.var.show(notation) + u') (' + self._drs.show(notation) + u')'
 
 
@@ -2164,6 +2649,9 @@ class Diamond(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return type(self)(self._drs.subst_subdrs(gd, rs))
 
+    def _map_refs(self, vm):
+        return type(self)(self._drs.map_refs(vm))
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         cd1, rs1 = self._drs.purify_refs(gd, rs)
@@ -2230,6 +2718,12 @@ class Diamond(AbstractDRSCond):
     def clone(self):
         return Diamond(self._drs.clone())
 
+    def _canonical_hash(self):
+        return hash(('Diamond', self._drs.canonical_hash))
+
+    def _subdrs(self):
+        return [self._drs]
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this condition and return the found subordinate DRS."""
         return self._drs.find_subdrs(d)
@@ -2246,12 +2740,19 @@ class Diamond(AbstractDRSCond):
         worlds.append(v)
         return fol.Exists(v, fol.And(fol.Acc([world,v]),self._drs.to_mfol(v, worlds)))
 
+    def _box_lines(self):
+        return self.lines_modifier(self.opDiamond, 2, self._drs._box_lines())
+
+    def _write_show(self, out, notation):
+        out.append(self.opDiamond)
+        self._drs._write_show(out, notation)
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
-            return self.show_modifier(self.opDiamond, 2, self._drs.show(notation))
+            return u'\n'.join(self._box_lines())
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return self.opDiamond + self._drs.show(notation)
+            return self._render_show(notation)
         return u'Diamond (' + self._drs.show(notation) + u')'
 
 
@@ -2305,6 +2806,9 @@ class Box(AbstractDRSCond):
     def _substitute(self, ld, gd, rs):
         return type(self)(self._drs.subst_subdrs(gd, rs))
 
+    def _map_refs(self, vm):
+        return type(self)(self._drs.map_refs(vm))
+
     # Original haskell code in https://github.com/hbrouwer/pdrt-sandbox/tree/master/src/Data/DRS/LambdaCalculus.hs#purifyRefs:purify
     def _purify_refs(self, gd, rs, pv=None):
         cd1, rs1 = self._drs.purify_refs(gd, rs)
@@ -2371,6 +2875,12 @@ class Box(AbstractDRSCond):
     def clone(self):
         return Box(self._drs.clone())
 
+    def _canonical_hash(self):
+        return hash(('Box', self._drs.canonical_hash))
+
+    def _subdrs(self):
+        return [self._drs]
+
     def find_subdrs(self, d):
         """Test whether d is a direct or indirect subordinate DRS of this condition and return the found subordinate DRS."""
         return self._drs.find_subdrs(d)
@@ -2387,10 +2897,17 @@ class Box(AbstractDRSCond):
         worlds.append(v)
         return fol.ForAll(v, fol.Imp(fol.Acc([world,v]),self._drs.to_mfol(v, worlds)))
 
+    def _box_lines(self):
+        return self.lines_modifier(self.opBox, 2, self._drs._box_lines())
+
+    def _write_show(self, out, notation):
+        out.append(self.opBox)
+        self._drs._write_show(out, notation)
+
     def show(self, notation):
         """Helper for DRS function of same name."""
         if notation == SHOW_BOX:
-            return self.show_modifier(self.opBox, 2, self._drs.show(notation))
+            return u'\n'.join(self._box_lines())
         elif notation in [SHOW_LINEAR, SHOW_SET]:
-            return self.opBox + self._drs.show(notation)
+            return self._render_show(notation)
         return u'Box (' + self._drs.show(notation) + u')'
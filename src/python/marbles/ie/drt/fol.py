@@ -101,7 +101,7 @@ class ForAll(FOLForm):
         return u'\u2200%s%s' % (self._var, self._fol)
 
     def to_smt(self):
-        return sc.ForAll(sc.Symbol(self._var.to_string()), self.to_smt())
+        return sc.ForAll(sc.Symbol(self._var.to_string()), self._fol.to_smt())
 
 
 class And(FOLForm):
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""Batch export of DRS's to SMT-LIB2."""
+
+from __future__ import unicode_literals, print_function
+import re
+
+import fol
+from marbles import future_string, safe_utf8_encode
+
+try:
+    import z3
+except ImportError:
+    z3 = None
+
+
+# Simple symbols in SMT-LIB2, anything else must be quoted with |...|
+_SIMPLE_SYMBOL = re.compile(r'^[A-Za-z~!@$%^&*_+=<>.?/-][0-9A-Za-z~!@$%^&*_+=<>.?/-]*$')
+# Reserved words and core theory symbols. Quoting does not help here because |and| and `and` are the
+# same symbol, so declared symbols must avoid these names.
+_RESERVED = frozenset([
+    '!', '_', 'as', 'let', 'exists', 'forall', 'match', 'par', 'BINARY', 'DECIMAL', 'HEXADECIMAL', 'NUMERAL',
+    'STRING', 'Bool', 'true', 'false', 'not', 'and', 'or', 'xor', '=>', '=', 'distinct', 'ite'
+])
+
+
+def quote_symbol(name):
+    """Convert a name to an SMT-LIB2 symbol.
+
+    Args:
+        name: A unicode string.
+
+    Returns:
+        The name if it is a simple symbol, else the name quoted with vertical bars.
+    """
+    if _SIMPLE_SYMBOL.match(name):
+        return name
+    return '|%s|' % name.replace('|', '').replace('\\', '')
+
+
+class _Unbind(object):
+    """Marks the end of a quantifier scope during traversal."""
+    __slots__ = ['vars']
+
+    def __init__(self, vars):
+        self.vars = vars
+
+
+class _Pending(object):
+    """Declarations made while converting one formula. Merged into the exporter if the conversion succeeds."""
+    __slots__ = ['used', 'preds', 'consts', 'decls']
+
+    def __init__(self):
+        self.used = set()
+        self.preds = {}
+        self.consts = {}
+        self.decls = []
+
+
+class SmtExporter(object):
+    """Convert batches of DRS's to SMT-LIB2 text, or z3 expressions when z3 is installed.
+
+    All formulas share one uninterpreted sort for worlds and individuals. Predicates, the accessibility
+    relation and free variables, including the world variable, are declared once per exporter so the
+    declarations are shared by every DRS in the batch. Formulas are traversed iteratively so deeply nested
+    DRS's do not hit the recursion limit, and nested conjunctions, disjunctions and quantifiers are
+    flattened.
+
+    Remarks:
+        Free variables with the same name are the same constant in all formulas. Set check_sat to test
+        each DRS on its own.
+    """
+
+    def __init__(self, outfile=None, sort='Entity', logic='UF', named=False, check_sat=False):
+        """Constructor.
+
+        Args:
+            outfile: Optional binary file-like object. If set, declarations and assertions are written as
+                each DRS is added.
+            sort: The name of the sort used for worlds and individuals.
+            logic: The SMT-LIB2 logic. If None no set-logic command is written.
+            named: If True name each assertion so it can be found in an unsat core.
+            check_sat: If True wrap each assertion with push/pop and a check-sat command.
+        """
+        self.outfile = outfile
+        self.logic = logic
+        self.named = named
+        self.check_sat = check_sat
+        self._used = set()
+        self._preds = {}
+        self._consts = {}
+        self._decls = []
+        self._written = 0
+        self._header_written = False
+        self._z3decls = None
+        self._z3sort = None
+        self.sort = self._new_symbol(sort)
+        self.asserted = 0
+        self.failed = 0
+
+    def _new_symbol(self, name, new=None):
+        name = name.replace('|', '').replace('\\', '') or '_'
+        used = set() if new is None else new.used
+        sym = name
+        k = 0
+        while sym in self._used or sym in used or sym in _RESERVED:
+            k += 1
+            sym = '%s/%d' % (name, k)
+        if new is None:
+            self._used.add(sym)
+        else:
+            used.add(sym)
+        return sym
+
+    def _pred(self, name, arity, new):
+        key = (name, arity)
+        sym = self._preds.get(key) or new.preds.get(key)
+        if sym is None:
+            sym = self._new_symbol('Acc' if name is None else name, new)
+            new.preds[key] = sym
+            new.decls.append((sym, arity))
+        return sym
+
+    def _var(self, v, bound, new):
+        name = v.to_string()
+        if bound.get(name, 0) != 0:
+            return quote_symbol(name)
+        sym = self._consts.get(name) or new.consts.get(name)
+        if sym is None:
+            sym = self._new_symbol(name, new)
+            new.consts[name] = sym
+            new.decls.append((sym, -1))
+        return quote_symbol(sym)
+
+    def _atom(self, sym, vars, bound, new):
+        if len(vars) == 0:
+            return quote_symbol(sym)
+        return '(%s %s)' % (quote_symbol(sym), ' '.join([self._var(v, bound, new) for v in vars]))
+
+    def _declaration(self, sym, arity):
+        if arity < 0:
+            return '(declare-const %s %s)' % (quote_symbol(sym), quote_symbol(self.sort))
+        return '(declare-fun %s (%s) Bool)' % (quote_symbol(sym), ' '.join([quote_symbol(self.sort)] * arity))
+
+    def to_smtlib(self, f):
+        """Convert a formula to an SMT-LIB2 term. Symbols not seen before are added to the declarations
+        if the conversion succeeds.
+
+        Args:
+            f: A marbles.ie.drt.fol.FOLForm instance.
+
+        Returns:
+            A unicode string.
+        """
+        out = []
+        bound = {}
+        new = _Pending()
+        stack = [f]
+        while len(stack) != 0:
+            x = stack.pop()
+            if isinstance(x, future_string):
+                out.append(x)
+                continue
+            cls = type(x)
+            if cls is _Unbind:
+                for name in x.vars:
+                    bound[name] -= 1
+            elif cls is fol.Rel:
+                out.append(self._atom(self._pred(x._pred, len(x._vars), new), x._vars, bound, new))
+            elif cls is fol.Acc:
+                out.append(self._atom(self._pred(None, len(x._vars), new), x._vars, bound, new))
+            elif cls is fol.Top:
+                out.append('true')
+            elif cls is fol.Bottom:
+                out.append('false')
+            elif cls is fol.Neg:
+                out.append('(not ')
+                stack.append(')')
+                stack.append(x._fol)
+            elif cls is fol.Imp:
+                out.append('(=> ')
+                stack.extend([')', x._folB, ' ', x._folA])
+            elif cls is fol.And or cls is fol.Or:
+                # Flatten (A and (B and C)) to (and A B C)
+                operands = []
+                todo = [x]
+                while len(todo) != 0:
+                    y = todo.pop()
+                    if type(y) is cls:
+                        todo.append(y._folB)
+                        todo.append(y._folA)
+                    else:
+                        operands.append(y)
+                out.append('(and' if cls is fol.And else '(or')
+                stack.append(')')
+                for y in reversed(operands):
+                    stack.append(y)
+                    stack.append(' ')
+            elif cls is fol.Exists or cls is fol.ForAll:
+                # Flatten nested quantifiers of the same kind. Variables in a binder must be distinct.
+                names = []
+                y = x
+                while type(y) is cls and y._var.to_string() not in names:
+                    names.append(y._var.to_string())
+                    y = y._fol
+                for name in names:
+                    bound[name] = bound.get(name, 0) + 1
+                out.append('(%s (%s) ' % ('exists' if cls is fol.Exists else 'forall',
+                                          ' '.join(['(%s %s)' % (quote_symbol(n), quote_symbol(self.sort))
+                                                    for n in names])))
+                stack.extend([')', _Unbind(names), y])
+            else:
+                raise fol.FOLConversionError('cannot export %s to SMT-LIB2' % cls.__name__)
+        self._used.update(new.used)
+        self._preds.update(new.preds)
+        self._consts.update(new.consts)
+        self._decls.extend(new.decls)
+        return ''.join(out)
+
+    def header(self):
+        """Get the commands written before the first declaration.
+
+        Returns:
+            A list of unicode strings.
+        """
+        cmds = [] if self.logic is None else ['(set-logic %s)' % self.logic]
+        cmds.append('(declare-sort %s 0)' % quote_symbol(self.sort))
+        return cmds
+
+    def declarations(self):
+        """Get all declarations made so far.
+
+        Returns:
+            A list of unicode strings.
+        """
+        return [self._declaration(sym, arity) for sym, arity in self._decls]
+
+    def _write(self, lines):
+        self.outfile.write(safe_utf8_encode('\n'.join(lines) + '\n'))
+
+    def add(self, d, name=None):
+        """Add a DRS to the batch. If an output file was passed to the constructor new declarations and
+        the assertion are written to it.
+
+        Args:
+            d: A DRS instance or a marbles.ie.drt.fol.FOLForm instance.
+            name: Optional assertion name. Used if the exporter is named.
+
+        Returns:
+            A list of SMT-LIB2 commands, new declarations first.
+
+        Raises:
+            marbles.ie.drt.fol.FOLConversionError
+        """
+        f = d if isinstance(d, fol.FOLForm) else d.to_fol()[0]
+        term = self.to_smtlib(f)
+        if self.named:
+            term = '(! %s :named %s)' % (term, quote_symbol(name or 'drs%d' % self.asserted))
+        cmds = [self._declaration(sym, arity) for sym, arity in self._decls[self._written:]]
+        self._written = len(self._decls)
+        if self.check_sat:
+            cmds.extend(['(push 1)', '(assert %s)' % term, '(check-sat)', '(pop 1)'])
+        else:
+            cmds.append('(assert %s)' % term)
+        self.asserted += 1
+        if self.outfile is not None:
+            if not self._header_written:
+                self._write(self.header())
+                self._header_written = True
+            self._write(cmds)
+        return cmds
+
+    def export(self, drss):
+        """Export a batch of DRS's. DRS's that cannot be converted to FOL are skipped and counted in
+        `failed`.
+
+        Args:
+            drss: An iterable of DRS or marbles.ie.drt.fol.FOLForm instances.
+
+        Returns:
+            The number of assertions added.
+        """
+        count = 0
+        for d in drss:
+            try:
+                self.add(d)
+                count += 1
+            except fol.FOLConversionError:
+                self.failed += 1
+        return count
+
+    def to_z3(self, d):
+        """Convert a DRS to a z3 expression. The z3 declarations are shared across the batch in the same
+        way as the SMT-LIB2 declarations.
+
+        Args:
+            d: A DRS instance or a marbles.ie.drt.fol.FOLForm instance.
+
+        Returns:
+            A z3.BoolRef instance.
+
+        Raises:
+            ImportError: If z3 is not installed.
+            marbles.ie.drt.fol.FOLConversionError
+        """
+        if z3 is None:
+            raise ImportError('z3 is required for SmtExporter.to_z3()')
+        f = d if isinstance(d, fol.FOLForm) else d.to_fol()[0]
+        term = self.to_smtlib(f)
+        if self._z3decls is None:
+            self._z3sort = z3.DeclareSort(self.sort)
+            self._z3decls = {}
+        for sym, arity in self._decls:
+            if sym in self._z3decls:
+                continue
+            if arity < 0:
+                self._z3decls[sym] = z3.Const(sym, self._z3sort)
+            else:
+                self._z3decls[sym] = z3.Function(sym, *([self._z3sort] * arity + [z3.BoolSort()]))
+        return z3.parse_smt2_string('(assert %s)' % term, sorts={self.sort: self._z3sort},
+                                    decls=self._z3decls)[0]
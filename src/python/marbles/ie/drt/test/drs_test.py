@@ -296,3 +296,49 @@ class DrsTest(unittest.TestCase):
         d = a.purify()
         x = dexpr('([r],[A(c), (([z1],[B(r,z1,z,a)]) -> ([z2],[C(r,z1,z2,a)]))])')
         self.assertEquals(x, d)
+
+    def test11_CachedProperties(self):
+        from marbles import Properties
+        verify = Properties.drs_cache_verify
+        Properties.drs_cache_verify = True
+        try:
+            x = DRSRef('x')
+            y = DRSRef('y')
+            d = DRS([x], [Rel(DRSRelation('man'), [x]), Rel(DRSRelation('see'), [x, y])])
+            self.assertListEqual([y], d.freerefs)
+            self.assertEquals(set([x, y]), set(d.variables))
+            # Cache hit, callers get a copy
+            v = d.variables
+            v.append(DRSRef('z'))
+            self.assertEquals(2, len(d.variables))
+            # Rename in place invalidates the cache
+            y.set_var(DRSVar('x'))
+            self.assertListEqual([], d.freerefs)
+            self.assertListEqual([x], d.variables)
+            rc = d.find_condition(Rel(DRSRelation('see'), [x, x]))
+            self.assertIsNotNone(rc)
+            d.remove_condition(rc)
+            self.assertEquals(1, len(d.conditions))
+            m = Merge(d, DRS([DRSRef('z')], [Rel(DRSRelation('happy'), [DRSRef('z')])]))
+            self.assertEquals(set([x, DRSRef('z')]), set(m.variables))
+            self.assertEquals(set([x, DRSRef('z')]), set(m.universes))
+        finally:
+            Properties.drs_cache_verify = verify
+
+    def test12_CacheIsPerInstance(self):
+        x = DRSRef('x')
+        inner = DRS([], [Rel(DRSRelation('man'), [x]), Rel(DRSRelation('happy'), [x])])
+        d = DRS([x], [Neg(inner)])
+        s = d.show(SHOW_LINEAR)
+        h = d.canonical_hash
+        # Constructing and composing other DRS's keeps the cache
+        m = Merge(DRS([DRSRef('y')], [Neg(DRS([], [Rel(DRSRelation('man'), [DRSRef('y')])]))]), DRS([], []))
+        self.assertIs(s, d.show(SHOW_LINEAR))
+        self.assertIsNotNone(m.show(SHOW_LINEAR))
+        self.assertIs(s, d.show(SHOW_LINEAR))
+        # Modifying a sub-DRS invalidates the DRS's it is accessible from
+        inner.remove_condition(ConditionRef(inner, d, inner.conditions[1]))
+        self.assertEquals('[x| ¬[| man(x)]]', d.show(SHOW_LINEAR))
+        self.assertNotEqual(h, d.canonical_hash)
+        self.assertListEqual([x], d.accessible_universe)
+        self.assertListEqual([x], inner.accessible_universe)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals, print_function
+import unittest
+
+from marbles import Properties
+from marbles.ie.drt.common import *
+from marbles.ie.drt.drs import *
+
+
+def rel(name, *args):
+    return Rel(DRSRelation(name), [DRSRef(x) for x in args])
+
+
+class HashTest(unittest.TestCase):
+
+    def tearDown(self):
+        Properties.drs_cache = True
+        Properties.drs_cache_verify = False
+
+    def test1_Canonical(self):
+        d1 = Neg(DRS([DRSRef('x'), DRSRef('y')], [rel('man', 'x'), rel('loves', 'x', 'y')]))
+        d2 = Neg(DRS([DRSRef('y'), DRSRef('x')], [rel('loves', 'x', 'y'), rel('man', 'x')]))
+        self.assertEqual(d1, d2)
+        self.assertEqual(hash(d1), hash(d2))
+        # Relation arguments are ordered
+        self.assertNotEqual(rel('loves', 'x', 'y').canonical_hash, rel('loves', 'y', 'x').canonical_hash)
+        self.assertNotEqual(d1.canonical_hash, Neg(DRS([DRSRef('x')], [rel('man', 'x')])).canonical_hash)
+        self.assertNotEqual(d1.canonical_hash, Box(d1.drs).canonical_hash)
+        # A DRS is now hashable
+        self.assertEqual(1, len(set([d1.drs, d2.drs])))
+
+    def test2_Invalidate(self):
+        Properties.drs_cache_verify = True
+        c = rel('man', 'x')
+        d = DRS([DRSRef('x')], [c])
+        h = d.canonical_hash
+        c.relation.rename('woman')
+        self.assertNotEqual(h, d.canonical_hash)
+        self.assertEqual(d.canonical_hash, DRS([DRSRef('x')], [rel('woman', 'x')]).canonical_hash)
+
+    def test3_FindCondition(self):
+        # "If a farmer owns a donkey, he feeds it."
+        antecedent = DRS([DRSRef('x'), DRSRef('y')], [rel('farmer', 'x'), rel('donkey', 'y'), rel('owns', 'x', 'y')])
+        consequent = DRS([], [Neg(DRS([], [rel('feeds', 'x', 'y')]))])
+        d = DRS([DRSRef('z')], [rel('man', 'z'), Imp(antecedent, consequent), rel('feeds', 'z', 'z')])
+        rc = d.find_condition(rel('owns', 'x', 'y'))
+        self.assertIsNotNone(rc)
+        self.assertEqual(rel('owns', 'x', 'y'), rc.cond)
+        self.assertEqual(antecedent, rc.ld)
+        rc = d.find_condition(rel('feeds', 'x', 'y'))
+        self.assertEqual(DRS([], [rel('feeds', 'x', 'y')]), rc.ld)
+        self.assertEqual(d, d.find_condition(rel('feeds', 'z', 'z')).ld)
+        self.assertIsNone(d.find_condition(rel('feeds', 'x', 'z')))
+        # Removing a condition updates the index
+        d.remove_condition(d.find_condition(rel('man', 'z')))
+        self.assertIsNone(d.find_condition(rel('man', 'z')))
+
+    def test4_ConditionTable(self):
+        table = ConditionTable()
+        s1 = [rel('man', 'x'), rel('loves', 'x', 'y'), rel('man', 'x'), Neg(DRS([], [rel('happy', 'x')]))]
+        s2 = [rel('loves', 'y', 'x'), rel('loves', 'x', 'y'), Neg(DRS([], [rel('happy', 'x')]))]
+        self.assertListEqual([s1[0], s1[1], s1[3]], table.unique(s1))
+        self.assertListEqual([s2[0]], table.unique(s2))
+        self.assertEqual(4, len(table))
+        self.assertIs(s1[1], table.intern(rel('loves', 'x', 'y')))
+        self.assertIn(rel('man', 'x'), table)
+
+    def test5_SwappedArgs(self):
+        # Equality agrees with the hash so argument order is significant
+        a = rel('_ARG0', 'e', 'x')
+        b = rel('_ARG0', 'x', 'e')
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(a.canonical_hash, b.canonical_hash)
+        self.assertEqual(a, Rel(DRSRelation('_ARG0'), (DRSRef('e'), DRSRef('x'))))
+        self.assertListEqual([a, b], ConditionTable().unique([a, b, rel('_ARG0', 'e', 'x')]))
+        d = DRS([DRSRef('e'), DRSRef('x')], [a])
+        self.assertIsNone(d.find_condition(b))
+        self.assertIsNotNone(d.find_condition(rel('_ARG0', 'e', 'x')))
+        self.assertNotEqual(d, DRS([DRSRef('e'), DRSRef('x')], [b]))
+
+
+    def test6_PerInstance(self):
+        Properties.drs_cache_verify = True
+        inner = DRS([], [rel('man', 'x'), rel('happy', 'x')])
+        d = DRS([DRSRef('x')], [Imp(DRS([], [rel('farmer', 'x')]), inner)])
+        index = d.get_condition_index()
+        h = d.canonical_hash
+        # Constructing other DRS's keeps the index and hash
+        DRS([DRSRef('y')], [Neg(DRS([], [rel('man', 'y')]))])
+        self.assertIs(index, d.get_condition_index())
+        self.assertEqual(h, d.canonical_hash)
+        # Modifying a sub-DRS discards them
+        inner.remove_condition(ConditionRef(inner, d, inner.conditions[1]))
+        self.assertNotEqual(h, d.canonical_hash)
+        self.assertIsNone(d.find_condition(rel('happy', 'x')))
+        self.assertIsNotNone(d.find_condition(rel('man', 'x')))
+
+
+if __name__ == '__main__':
+    unittest.main()
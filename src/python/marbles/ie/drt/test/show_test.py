@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals, print_function
+import unittest
+
+from marbles import Properties
+from marbles.ie.drt.common import *
+from marbles.ie.drt.drs import *
+
+
+def make_drs():
+    # "If a farmer owns a donkey, he does not feed it or he believes it is possibly sad."
+    return DRS([],
+               [Imp(
+                   DRS([DRSRef('x'), DRSRef('y')],
+                       [Rel(DRSRelation('farmer'), [DRSRef('x')])
+                       ,Rel(DRSRelation('donkey'), [DRSRef('y')])
+                       ,Rel(DRSRelation('owns'), [DRSRef('x'), DRSRef('y')])]),
+                   DRS([DRSRef('p')],
+                       [Or(DRS([], [Neg(DRS([], [Rel(DRSRelation('feeds'), [DRSRef('x'), DRSRef('y')])]))]),
+                           DRS([], [Rel(DRSRelation('believes'), [DRSRef('x'), DRSRef('p')])
+                                   ,Prop(DRSRef('p'), DRS([], [Diamond(DRS([], [
+                                        Rel(DRSRelation('sad'), [DRSRef('y')])]))]))]))]))])
+
+
+# Output of the original string based renderer for make_drs()
+_BOX = '\n'.join([
+    '┌--------------------------------------------------------------------┐',
+    '|                                                                    |',
+    '├--------------------------------------------------------------------┤',
+    '| ┌-----------┐  ┌------------------------------------------------┐  |',
+    '| | x  y      |  | p                                              |  |',
+    '| ├-----------┤⇒ ├------------------------------------------------┤  |',
+    '| | farmer(x) |  | ┌------------------┐  ┌---------------------┐  |  |',
+    '| | donkey(y) |  | |                  |  |                     |  |  |',
+    '| | owns(x,y) |  | ├------------------┤∨ ├---------------------┤  |  |',
+    '| └-----------┘  | |   ┌------------┐ |  | believes(x,p)       |  |  |',
+    '|   | |   |            | |  |    ┌--------------┐ |  |               |',
+    '|                 | | ¬ ├------------┤ |  |    |              | |  | |',
+    '|                 | |   | feeds(x,y) | |  | p: ├--------------┤ |  | |',
+    '|                 | |   └------------┘ |  |    |   ┌--------┐ | |  | |',
+    '|                 | └------------------┘  |    |   |        | | |  | |',
+    '|                 |   |    | ◇ ├--------┤ | |                      | |',
+    '|                 |                        |    |   | sad(y) | | | | |',
+    '|                 |                        |    |   └--------┘ | | | |',
+    '|                 |                        |    └--------------┘ | | |',
+    '|                 |                        └---------------------┘ | |',
+    '|                 └------------------------------------------------┘ |',
+    '└--------------------------------------------------------------------┘',
+    ''
+])
+_IMP_BOX = '\n'.join([
+    '┌-----------┐  ┌------------------------------------------------┐',
+    '| x  y      |  | p                                              |',
+    '├-----------┤⇒ ├------------------------------------------------┤',
+    '| farmer(x) |  | ┌------------------┐  ┌---------------------┐  |',
+    '| donkey(y) |  | |                  |  |                     |  |',
+    '| owns(x,y) |  | ├------------------┤∨ ├---------------------┤  |',
+    '└-----------┘  | |   ┌------------┐ |  | believes(x,p)       |  |',
+    '  | |   |            | |  |    ┌--------------┐ |  |',
+    '                | | ¬ ├------------┤ |  |    |              | |  |',
+    '                | |   | feeds(x,y) | |  | p: ├--------------┤ |  |',
+    '                | |   └------------┘ |  |    |   ┌--------┐ | |  |',
+    '                | └------------------┘  |    |   |        | | |  |',
+    '                |   |    | ◇ ├--------┤ | |                      |',
+    '                |                        |    |   | sad(y) | | | |',
+    '                |                        |    |   └--------┘ | | |',
+    '                |                        |    └--------------┘ | |',
+    '                |                        └---------------------┘ |',
+    '                └------------------------------------------------┘',
+    '              '
+])
+_LINEAR = '[| [x,y| farmer(x),donkey(y),owns(x,y)] ⇒ [p| [| ¬[| feeds(x,y)]] ∨ ' \
+          '[| believes(x,p),p: [| ◇[| sad(y)]]]]]'
+_SET = '<{},{<{x,y},{farmer(x),donkey(y),owns(x,y)}> ⇒ <{p},{<{},{¬<{},{feeds(x,y)}>}> ∨ ' \
+       '<{},{believes(x,p),p: <{},{◇<{},{sad(y)}>}>}>}>}>'
+
+
+class ShowTest(unittest.TestCase):
+
+    def tearDown(self):
+        Properties.drs_cache = True
+        Properties.drs_cache_verify = False
+
+    def test1_Linear(self):
+        d = make_drs()
+        x = '[| [x,y| farmer(x),donkey(y),owns(x,y)] ⇒ [p| [| ¬[| feeds(x,y)]] ∨ ' \
+            '[| believes(x,p),p: [| ◇[| sad(y)]]]]]'
+        self.assertEqual(x, d.show(SHOW_LINEAR))
+        self.assertEqual(x.replace('[', '<{').replace('| ', '},{').replace(']', '}>'), d.show(SHOW_SET))
+        # Second call is served from the cache
+        self.assertIs(d.show(SHOW_LINEAR), d.show(SHOW_LINEAR))
+
+    def test2_Box(self):
+        Properties.drs_cache = False
+        d = make_drs()
+        expected = [d.show(SHOW_BOX), d.show(SHOW_LINEAR)] + [c.show(SHOW_BOX) for c in d.conditions]
+        Properties.drs_cache = True
+        Properties.drs_cache_verify = True
+        d = make_drs()
+        for i in range(2):
+            actual = [d.show(SHOW_BOX), d.show(SHOW_LINEAR)] + [c.show(SHOW_BOX) for c in d.conditions]
+            self.assertListEqual(expected, actual)
+        self.assertTrue(d.show(SHOW_BOX).startswith('┌'))
+        self.assertTrue(d.show(SHOW_BOX).endswith('┘\n'))
+
+    def test3_Invalidate(self):
+        d = make_drs()
+        s = d.show(SHOW_LINEAR)
+        rc = d.find_condition(Rel(DRSRelation('farmer'), [DRSRef('x')]))
+        self.assertIsNotNone(rc)
+        rc.cond.relation.rename('rancher')
+        self.assertEqual(s.replace('farmer', 'rancher'), d.show(SHOW_LINEAR))
+
+    def test4_Golden(self):
+        for cache in [False, True]:
+            Properties.drs_cache = cache
+            d = make_drs()
+            for i in range(2):
+                self.assertEqual(_BOX, d.show(SHOW_BOX))
+                self.assertEqual(_IMP_BOX, d.conditions[0].show(SHOW_BOX))
+                self.assertEqual(_LINEAR, d.show(SHOW_LINEAR))
+                self.assertEqual(_SET, d.show(SHOW_SET))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals, print_function
+import io
+import unittest
+
+from marbles.ie.drt import fol
+from marbles.ie.drt.common import DRSVar
+from marbles.ie.drt.drs import *
+from marbles.ie.drt.smtexport import SmtExporter, quote_symbol
+
+
+class SmtExporterTest(unittest.TestCase):
+
+    def test1_Batch(self):
+        # "A man is happy."
+        d1 = DRS([DRSRef('x')],
+                 [Rel(DRSRelation('man'), [DRSRef('x')])
+                 ,Rel(DRSRelation('happy'), [DRSRef('x')])])
+        # "If a farmer owns a donkey, he feeds it."
+        d2 = DRS([],
+                 [Imp(
+                     DRS([DRSRef('x'), DRSRef('y')],
+                         [Rel(DRSRelation('farmer'), [DRSRef('x')])
+                         ,Rel(DRSRelation('man'), [DRSRef('y')])
+                         ,Rel(DRSRelation('owns'), [DRSRef('x'), DRSRef('y')])]),
+                     DRS([], [Neg(DRS([], [Rel(DRSRelation('happy'), [DRSRef('y')])]))]))])
+        fd = io.BytesIO()
+        exporter = SmtExporter(fd)
+        self.assertEqual(2, exporter.export([d1, d2]))
+        x = '\n'.join([
+            '(set-logic UF)',
+            '(declare-sort Entity 0)',
+            '(declare-fun man (Entity Entity) Bool)',
+            '(declare-const w Entity)',
+            '(declare-fun happy (Entity Entity) Bool)',
+            '(assert (exists ((x Entity)) (and (man w x) (happy w x))))',
+            # Declarations are shared so only new symbols are declared
+            '(declare-fun farmer (Entity Entity) Bool)',
+            '(declare-fun owns (Entity Entity Entity) Bool)',
+            '(assert (forall ((x Entity) (y Entity)) (=> (and (farmer w x) (man w y) (owns w x y)) '
+            '(not (happy w y)))))',
+            ''])
+        self.assertEqual(x, fd.getvalue().decode('utf-8'))
+        self.assertEqual(0, exporter.failed)
+
+    def test2_Symbols(self):
+        self.assertEqual('owns', quote_symbol('owns'))
+        self.assertEqual("|John's|", quote_symbol("John's"))
+        self.assertEqual('|ab b|', quote_symbol('a|b| b'))
+        exporter = SmtExporter(named=True)
+        w = DRSVar('w')
+        x = DRSVar('x')
+        # Same name with a different arity, a reserved word, and a free variable which shadows a predicate
+        f = fol.And(fol.Rel('and', [w, x]), fol.Or(fol.Rel('and', [w]), fol.Exists(x, fol.Rel('x', [w, x]))))
+        cmds = exporter.add(f, 'a1')
+        self.assertListEqual([
+            '(declare-fun and/1 (Entity Entity) Bool)',
+            '(declare-const w Entity)',
+            '(declare-const x Entity)',
+            '(declare-fun and/2 (Entity) Bool)',
+            '(declare-fun x/1 (Entity Entity) Bool)',
+            '(assert (! (and (and/1 w x) (or (and/2 w) (exists ((x Entity)) (x/1 w x)))) :named a1))'], cmds)
+
+    def test3_Deep(self):
+        # Deeper than the recursion limit
+        f = fol.Top()
+        for i in range(5000):
+            f = fol.Neg(f)
+        cmds = SmtExporter(check_sat=True).add(f)
+        self.assertListEqual(['(push 1)', '(assert %strue%s)' % ('(not ' * 5000, ')' * 5000), '(check-sat)',
+                              '(pop 1)'], cmds)
+
+    def test4_Failed(self):
+        w = DRSVar('w')
+        x = DRSVar('x')
+        fd = io.BytesIO()
+        exporter = SmtExporter(fd, logic=None)
+        # The conversion fails after 'bad' and 'x' are seen
+        bad = fol.And(fol.Rel('bad', [w, x]), fol.FOLForm())
+        good = fol.Rel('good', [w])
+        self.assertEqual(1, exporter.export([bad, good]))
+        self.assertEqual(1, exporter.failed)
+        expected = '\n'.join([
+            '(declare-sort Entity 0)',
+            '(declare-fun good (Entity) Bool)',
+            '(declare-const w Entity)',
+            '(assert (good w))',
+            ''])
+        self.assertEqual(expected, fd.getvalue().decode('utf-8'))
+        # Symbols from the failed conversion are free
+        self.assertListEqual(['(declare-fun bad (Entity Entity) Bool)', '(declare-const x Entity)',
+                              '(assert (bad w x))'], exporter.add(fol.Rel('bad', [w, x])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+from __future__ import unicode_literals, print_function
+import unittest
+import random
+from marbles.ie.drt.utils import union, union_inplace, complement, intersect, remove_dups
+
+
+class UtilsTest(unittest.TestCase):
+
+    def test1_Union(self):
+        self.assertListEqual([1, 2, 3, 4], union([1, 2, 2], [3, 1], [4]))
+        self.assertListEqual([3, 1, 2], remove_dups([3, 1, 3, 2, 1]))
+        a = [1, 2]
+        self.assertListEqual([1, 2, 3, 4], union_inplace(a, [2, 3], [3, 4]))
+        self.assertListEqual([1, 2, 3, 4], a)
+
+    def test2_Complement(self):
+        self.assertListEqual([1, 3], complement([1, 2, 3, 2, 5], [2, 5]))
+        self.assertListEqual([1, 3], complement([1, 2, 3, 2, 5], set([2, 5])))
+        self.assertListEqual([1, 3], complement([1, 2, 2, 3, 5], [2, 5], sorted=True))
+
+    def test3_Intersect(self):
+        # Ordering follows the longer list
+        self.assertListEqual([3, 2, 1], intersect([1, 2, 3], [3, 2, 9, 1, 7]))
+        self.assertListEqual([2, 4], intersect([1, 2, 3, 4], [2, 4, 9], sorted=True))
+
+    def test4_SortedEquivalence(self):
+        rnd = random.Random(17)
+        for i in range(1000):
+            a = sorted([rnd.randint(0, 9) for j in range(rnd.randint(0, 8))])
+            b = sorted([rnd.randint(0, 9) for j in range(rnd.randint(0, 8))])
+            self.assertListEqual(complement(a, b), complement(a, b, sorted=True))
+            self.assertListEqual(intersect(a, b), intersect(a, b, sorted=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 from __future__ import unicode_literals, print_function
 import collections
+import itertools
 
 
 def iterable_type_check(theList, type_info, emptyOK=True):
@@ -14,35 +15,78 @@ def iterable_type_check(theList, type_info, emptyOK=True):
 
 
 def union(a, *args):
-    '''Union two lists.'''
+    '''Union lists. Ordering is maintained and duplicates are removed.'''
+    seen = set()
     y = []
-    y.extend(a)
-    for b in args:
-        y.extend(b)
-    return remove_dups(y)
+    for x in itertools.chain(a, *args):
+        if x not in seen:
+            seen.add(x)
+            y.append(x)
+    return y
 
 
 def union_inplace(a, *args):
+    '''Append elements of args to a if not already in a.'''
+    seen = set(a)
     for b in args:
         for x in b:
-            if x not in a: a.append(x)
+            if x not in seen:
+                seen.add(x)
+                a.append(x)
     return a
 
 
 def complement(a, b, sorted=False):
-    '''Remove b from a.'''
+    '''Remove b from a.
+
+    Args:
+        a: A list.
+        b: The elements to remove.
+        sorted: If True then a and b are sorted lists and a merge is used. The ordering must be consistent
+            with equality.
+    '''
     if sorted:
         # optimize for sorted lists
-        pass
-    return filter(lambda x: x not in b, a)
+        r = []
+        j = 0
+        n = len(b)
+        for x in a:
+            while j < n and b[j] < x:
+                j += 1
+            if j == n or x != b[j]:
+                r.append(x)
+        return r
+    if not isinstance(b, (set, frozenset)):
+        b = set(b)
+    return [x for x in a if x not in b]
 
 
 def intersect(a, b, sorted=False):
-    '''Find common elements.'''
+    '''Find common elements. Ordering follows the longer list.
+
+    Args:
+        a: A list.
+        b: A list.
+        sorted: If True then a and b are sorted lists and a merge is used. The ordering must be consistent
+            with equality.
+    '''
+    if len(a) < len(b):
+        a, b = b, a
     if sorted:
         # optimize for sorted lists
-        pass
-    return filter(lambda x: x in a, b) if len(a)<len(b) else filter(lambda x: x in b, a)
+        r = []
+        j = 0
+        n = len(b)
+        for x in a:
+            while j < n and b[j] < x:
+                j += 1
+            if j == n:
+                break
+            if x == b[j]:
+                r.append(x)
+        return r
+    b = set(b)
+    return [x for x in a if x in b]
 
 
 def partition(predicate, a):
@@ -65,12 +109,12 @@ def rename_var(v, rs):
 
 def remove_dups(orig):
     """Remove duplicates from a list but maintain ordering"""
-    uniq = set(orig)
+    seen = set()
     r = []
     for o in orig:
-        if o in uniq:
+        if o not in seen:
+            seen.add(o)
             r.append(o)
-            uniq.discard(o)
     return r
 
 
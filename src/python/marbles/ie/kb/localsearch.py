@@ -0,0 +1,714 @@
+# -*- coding: utf-8 -*-
+"""Local inverted index over parsed articles.
+
+The index ingests the per sentence lexeme and constituent json produced by marbles.aws.AwsNewsQueueReader.
+Each sentence is a document. Terms are prefixed by a field name:
+
+    stem:   lexeme stems, with positions so phrase queries are possible.
+    nnp:    proper names.
+    vn:     VerbNet classes, from _vn_ predicates in the lexeme DRS.
+    pred:   DRS predicates.
+    wiki:   wikipedia titles attached to a lexeme.
+
+Terms are stored lower case. The index is a directory containing a manifest and a set of immutable segment
+files. An IndexWriter buffers postings in memory and flushes them to a new segment. Small segments are
+merged into larger segments as the index grows, and IndexWriter.compact() merges everything into a single
+segment. Segments are memory mapped by IndexReader.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import array
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+
+from marbles import safe_utf8_encode, safe_utf8_decode
+from marbles.ie.ccg import POS, POS_LIST_PUNCT
+from marbles.ie.core.constants import RT_PROPERNAME
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+# magic, version, base docid, document count, term count, postings size (u32 words),
+# string table size (bytes), document size (bytes)
+_SEGMENT_HEADER = struct.Struct(b'<8s7I')
+_SEGMENT_MAGIC = b'MBLSINDX'
+_SEGMENT_VERSION = 2
+_MANIFEST = 'MANIFEST.json'
+_PREDICATE = re.compile(r'([^\s{},()<>!]+)\(')
+_QUERY_TOKEN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([^\s()"]+))')
+
+
+def _u32array(buf=None):
+    a = array.array(b'I')
+    if a.itemsize != 4:
+        a = array.array(b'L')
+    if buf is not None:
+        a.fromstring(buf)
+        if sys.byteorder != 'little':
+            a.byteswap()
+    return a
+
+
+def _u32bytes(a):
+    if sys.byteorder != 'little':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+
+def get_sentence_terms(sentence):
+    """Extract index terms from a sentence.
+
+    Args:
+        sentence: A dictionary with a 'lexemes' key as produced by AwsNewsQueueReader.
+
+    Returns:
+        A list of (term, position) tuples. The position is the lexeme index.
+    """
+    terms = []
+    for lex in sentence['lexemes']:
+        pos = lex['idx']
+        if lex['stem']:
+            terms.append(('stem:' + lex['stem'].lower(), pos))
+        if 0 != (lex['mask'] & RT_PROPERNAME):
+            terms.append(('nnp:' + lex['word'].lower(), pos))
+        drs = lex.get('drs', 'none')
+        if drs != 'none':
+            for p in _PREDICATE.findall(drs):
+                if p.startswith('_vn_'):
+                    terms.append(('vn:' + p[4:].lower(), pos))
+                else:
+                    terms.append(('pred:' + p.lower(), pos))
+        wiki = lex.get('wiki')
+        if wiki is not None and wiki.get('title'):
+            terms.append(('wiki:' + wiki['title'].lower(), pos))
+    return terms
+
+
+def get_sentence_text(sentence):
+    """Get the text of a sentence from its lexemes."""
+    txt = []
+    for lex in sentence['lexemes']:
+        if len(txt) != 0 and POS.from_cache(lex['pos']) not in POS_LIST_PUNCT:
+            txt.append(' ')
+        txt.append(lex['word'])
+    return ''.join(txt)
+
+
+class Postings(object):
+    """Postings for a term in a single segment."""
+
+    def __init__(self, docids, posoffs, positions):
+        self.docids = docids
+        self.posoffs = posoffs
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.docids)
+
+    def get_positions(self, docid):
+        """Get the positions of the term in a document.
+
+        Returns:
+            A list of positions, empty if the document does not contain the term.
+        """
+        i = bisect.bisect_left(self.docids, docid)
+        if i == len(self.docids) or self.docids[i] != docid:
+            return []
+        return self.positions[self.posoffs[i]:self.posoffs[i+1]]
+
+
+class _Segment(object):
+    """Read-only view of a segment buffer. Terms are found with a binary search on the sorted term table
+    so postings are only unpacked when they are accessed.
+
+    The layout following the header is:
+        term offsets:       u32[nterms+1] into the string table.
+        posting offsets:    u32[nterms+1] into the postings.
+        postings:           u32[], per term [ndocs, docids[ndocs], posoffs[ndocs+1], positions[]].
+        string table:       utf-8 terms.
+        document offsets:   u32[ndocs+1] into the documents.
+        documents:          utf-8 json [hash, paragraph, sentence, text] per document.
+    """
+
+    def __init__(self, buf):
+        self._buf = buf
+        magic, version, self.base, self.ndocs, self.nterms, npost, strsize, docsize = \
+            _SEGMENT_HEADER.unpack_from(buf, 0)
+        if magic != _SEGMENT_MAGIC or version != _SEGMENT_VERSION:
+            raise ValueError('not an index segment')
+        self._term_offs = _SEGMENT_HEADER.size
+        self._post_offs = self._term_offs + 4 * (self.nterms + 1)
+        self._posts = self._post_offs + 4 * (self.nterms + 1)
+        self._strings = self._posts + 4 * npost
+        self._doc_offs = self._strings + strsize
+        self._docs = self._doc_offs + 4 * (self.ndocs + 1)
+        if len(buf) < self._docs + docsize:
+            raise ValueError('index segment is truncated')
+
+    def _term(self, i):
+        start, end = struct.unpack_from(b'<2I', self._buf, self._term_offs + 4 * i)
+        return self._buf[self._strings + start:self._strings + end]
+
+    def _find(self, term):
+        lo = 0
+        hi = self.nterms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.nterms and self._term(lo) == term else -1
+
+    def _postings(self, i):
+        start, end = struct.unpack_from(b'<2I', self._buf, self._post_offs + 4 * i)
+        data = _u32array(self._buf[self._posts + 4 * start:self._posts + 4 * end])
+        n = data[0]
+        return Postings(data[1:n+1], data[n+1:2*n+2], data[2*n+2:])
+
+    def iterterms(self):
+        """Iterate (term, postings) in term order."""
+        for i in xrange(self.nterms):
+            yield self._term(i), self._postings(i)
+
+    def lookup(self, term):
+        """Get the postings of a term.
+
+        Returns:
+            A Postings instance or None if the term is not in the segment.
+        """
+        i = self._find(safe_utf8_encode(term))
+        return None if i < 0 else self._postings(i)
+
+    def get_document(self, i):
+        """Get a document by its index in the segment. Only this document is decoded."""
+        start, end = struct.unpack_from(b'<2I', self._buf, self._doc_offs + 4 * i)
+        return json.loads(safe_utf8_decode(self._buf[self._docs + start:self._docs + end]))
+
+    def iterdocuments(self):
+        """Iterate documents in docid order."""
+        for i in xrange(self.ndocs):
+            yield self.get_document(i)
+
+
+def _write_segment(filename, base, docs, terms):
+    """Write a segment file.
+
+    Args:
+        filename: The output path.
+        base: The docid of the first document.
+        docs: An iterable of documents, each a list [hash, paragraph, sentence, text].
+        terms: An iterable of (utf-8 term, docids, positions) sorted by term, where positions is a list of
+            position lists parallel to docids.
+    """
+    term_offs = _u32array()
+    post_offs = _u32array()
+    posts = _u32array()
+    strings = []
+    strsize = 0
+    term_offs.append(0)
+    post_offs.append(0)
+    for term, docids, positions in terms:
+        strings.append(term)
+        strsize += len(term)
+        term_offs.append(strsize)
+        posts.append(len(docids))
+        posts.extend(docids)
+        off = 0
+        posts.append(0)
+        for p in positions:
+            off += len(p)
+            posts.append(off)
+        for p in positions:
+            posts.extend(p)
+        post_offs.append(len(posts))
+    doc_offs = _u32array()
+    doc_offs.append(0)
+    doctable = []
+    docsize = 0
+    for d in docs:
+        data = safe_utf8_encode(json.dumps(d))
+        doctable.append(data)
+        docsize += len(data)
+        doc_offs.append(docsize)
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as fd:
+        fd.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, _SEGMENT_VERSION, base, len(doctable), len(strings),
+                                      len(posts), strsize, docsize))
+        fd.write(_u32bytes(term_offs))
+        fd.write(_u32bytes(post_offs))
+        fd.write(_u32bytes(posts))
+        fd.write(b''.join(strings))
+        fd.write(_u32bytes(doc_offs))
+        fd.write(b''.join(doctable))
+    os.rename(tmpname, filename)
+
+
+def _open_segment(filename):
+    with open(filename, 'rb') as fd:
+        buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    return _Segment(buf), buf
+
+
+def _read_manifest(path):
+    filename = os.path.join(path, _MANIFEST)
+    if not os.path.exists(filename):
+        return {'version': _SEGMENT_VERSION, 'next_docid': 0, 'next_segment': 0, 'segments': []}
+    with open(filename, 'r') as fd:
+        return json.load(fd)
+
+
+def _write_manifest(path, manifest):
+    filename = os.path.join(path, _MANIFEST)
+    with open(filename + '.tmp', 'w') as fd:
+        json.dump(manifest, fd, indent=2)
+    os.rename(filename + '.tmp', filename)
+
+
+class IndexWriter(object):
+    """Adds parsed articles to a local index."""
+
+    def __init__(self, path, max_buffered_docs=20000, merge_factor=10):
+        """Constructor.
+
+        Args:
+            path: The index directory. Created if it does not exist.
+            max_buffered_docs: Flush to a new segment when this many sentences are buffered.
+            merge_factor: Merge segments when this many segments of similar size exist.
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.path = path
+        self.max_buffered_docs = max_buffered_docs
+        self.merge_factor = max(2, merge_factor)
+        self.manifest = _read_manifest(path)
+        self._docs = []
+        self._postings = {}
+        self._batch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def next_docid(self):
+        return self.manifest['next_docid'] + len(self._docs)
+
+    def add_sentence(self, sentence, mhash=None, paragraph=-1, index=0):
+        """Add a sentence.
+
+        Args:
+            sentence: A dictionary with 'lexemes' and 'constituents' keys as produced by AwsNewsQueueReader.
+            mhash: The article hash.
+            paragraph: The paragraph index. The title is paragraph -1.
+            index: The sentence index within the paragraph.
+
+        Returns:
+            The document id.
+        """
+        docid = self.next_docid
+        self._docs.append([mhash, paragraph, index, get_sentence_text(sentence)])
+        for term, pos in get_sentence_terms(sentence):
+            docs = self._postings.setdefault(term, {})
+            docs.setdefault(docid, []).append(pos)
+        if self._batch is None and len(self._docs) >= self.max_buffered_docs:
+            self.flush()
+        return docid
+
+    def begin(self):
+        """Start a batch of sentences. The batch is not flushed until commit() so it can be discarded by
+        rollback().
+        """
+        self._batch = self.next_docid
+
+    def commit(self):
+        """Complete the current batch."""
+        self._batch = None
+        if len(self._docs) >= self.max_buffered_docs:
+            self.flush()
+
+    def rollback(self):
+        """Discard sentences added since begin()."""
+        if self._batch is None:
+            return
+        del self._docs[self._batch - self.manifest['next_docid']:]
+        for term in self._postings.keys():
+            docs = self._postings[term]
+            for docid in [d for d in docs.iterkeys() if d >= self._batch]:
+                del docs[docid]
+            if len(docs) == 0:
+                del self._postings[term]
+        self._batch = None
+
+    def add_article(self, mhash, result):
+        """Add an article.
+
+        Args:
+            mhash: The article hash.
+            result: The dictionary built by AwsNewsQueueReader.run(), containing 'title' and 'paragraphs'.
+        """
+        if 'lexemes' in result.get('title', {}):
+            self.add_sentence(result['title'], mhash, -1, 0)
+        for i, sentences in enumerate(result.get('paragraphs', [])):
+            for j, s in enumerate(sentences):
+                self.add_sentence(s, mhash, i, j)
+
+    def _new_segment_name(self):
+        n = self.manifest['next_segment']
+        self.manifest['next_segment'] = n + 1
+        return 'seg-%06d.bin' % n
+
+    def flush(self):
+        """Write buffered sentences to a new segment. An open batch is committed."""
+        self._batch = None
+        if len(self._docs) == 0:
+            return
+        name = self._new_segment_name()
+        base = self.manifest['next_docid']
+
+        def iterterms():
+            for term in sorted(self._postings.iterkeys(), key=safe_utf8_encode):
+                docs = self._postings[term]
+                docids = sorted(docs.iterkeys())
+                yield safe_utf8_encode(term), docids, [sorted(docs[d]) for d in docids]
+
+        _write_segment(os.path.join(self.path, name), base, self._docs, iterterms())
+        self.manifest['segments'].append({'name': name, 'base': base, 'ndocs': len(self._docs)})
+        self.manifest['next_docid'] = base + len(self._docs)
+        self._docs = []
+        self._postings = {}
+        _write_manifest(self.path, self.manifest)
+        self.maybe_merge()
+
+    def _level(self, ndocs):
+        level = 0
+        n = self.max_buffered_docs
+        while ndocs > n:
+            n *= self.merge_factor
+            level += 1
+        return level
+
+    def maybe_merge(self):
+        """Merge the most recent segments while there are merge_factor segments at the same level."""
+        segs = self.manifest['segments']
+        while len(segs) >= self.merge_factor:
+            tail = segs[-self.merge_factor:]
+            if len(set([self._level(s['ndocs']) for s in tail])) != 1:
+                break
+            self._merge(len(segs) - self.merge_factor, len(segs))
+            segs = self.manifest['segments']
+
+    def compact(self):
+        """Flush and merge all segments into a single segment."""
+        self.flush()
+        if len(self.manifest['segments']) > 1:
+            self._merge(0, len(self.manifest['segments']))
+
+    def _merge(self, start, end):
+        """Merge the adjacent segments manifest['segments'][start:end]."""
+        entries = self.manifest['segments'][start:end]
+        opened = [_open_segment(os.path.join(self.path, s['name'])) for s in entries]
+        try:
+            segments = [x[0] for x in opened]
+            ndocs = sum([seg.ndocs for seg in segments])
+
+            def iterdocs():
+                for seg in segments:
+                    for d in seg.iterdocuments():
+                        yield d
+
+            def iterterms():
+                # Segments are ordered by base docid so concatenating postings keeps docids sorted.
+                iters = [seg.iterterms() for seg in segments]
+                heads = [next(it, None) for it in iters]
+                while True:
+                    live = [h[0] for h in heads if h is not None]
+                    if len(live) == 0:
+                        break
+                    term = min(live)
+                    docids = []
+                    positions = []
+                    for i, h in enumerate(heads):
+                        if h is not None and h[0] == term:
+                            p = h[1]
+                            docids.extend(p.docids)
+                            positions.extend([p.positions[p.posoffs[k]:p.posoffs[k+1]] for k in range(len(p))])
+                            heads[i] = next(iters[i], None)
+                    yield term, docids, positions
+
+            name = self._new_segment_name()
+            base = entries[0]['base']
+            _write_segment(os.path.join(self.path, name), base, iterdocs(), iterterms())
+        finally:
+            for _, buf in opened:
+                buf.close()
+        self.manifest['segments'][start:end] = [{'name': name, 'base': base, 'ndocs': ndocs}]
+        _write_manifest(self.path, self.manifest)
+        for s in entries:
+            try:
+                os.remove(os.path.join(self.path, s['name']))
+            except OSError as e:
+                # Readers may still have the segment open on some platforms
+                _logger.warning('Cannot remove merged segment %s - %s', s['name'], str(e))
+
+    def close(self):
+        """Flush buffered sentences."""
+        self.flush()
+
+
+class IndexReader(object):
+    """Searches a local index."""
+
+    def __init__(self, path):
+        """Constructor.
+
+        Args:
+            path: The index directory.
+        """
+        self.path = path
+        self.manifest = _read_manifest(path)
+        self._segments = []
+        self._buffers = []
+        for s in self.manifest['segments']:
+            seg, buf = _open_segment(os.path.join(path, s['name']))
+            self._segments.append(seg)
+            self._buffers.append(buf)
+        self._bases = [s.base for s in self._segments]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return sum([s.ndocs for s in self._segments])
+
+    def close(self):
+        for buf in self._buffers:
+            buf.close()
+        self._buffers = []
+        self._segments = []
+
+    def get_document(self, docid):
+        """Get a document.
+
+        Returns:
+            A dictionary with keys hash, paragraph, sentence, and text.
+        """
+        i = bisect.bisect_right(self._bases, docid) - 1
+        if i < 0 or docid >= self._bases[i] + self._segments[i].ndocs:
+            raise KeyError(docid)
+        mhash, paragraph, index, text = self._segments[i].get_document(docid - self._bases[i])
+        return {'hash': mhash, 'paragraph': paragraph, 'sentence': index, 'text': text}
+
+    def lookup(self, term):
+        """Get the postings of a term.
+
+        Returns:
+            A list of Postings instances, one for each segment containing the term.
+        """
+        result = []
+        for seg in self._segments:
+            p = seg.lookup(term.lower())
+            if p is not None:
+                result.append(p)
+        return result
+
+    def get_docids(self, term):
+        """Get the sorted list of documents containing a term."""
+        docids = []
+        for p in self.lookup(term):
+            docids.extend(p.docids)
+        return docids
+
+    def get_phrase_docids(self, terms):
+        """Get the sorted list of documents where terms occur at consecutive positions.
+
+        Args:
+            terms: A list of terms.
+        """
+        if len(terms) == 0:
+            return []
+        postings = [self.lookup(t) for t in terms]
+        if any([len(p) == 0 for p in postings]):
+            return []
+        candidates = None
+        for p in sorted(postings, key=lambda x: sum([len(y) for y in x])):
+            docids = set()
+            for x in p:
+                docids.update(x.docids)
+            candidates = docids if candidates is None else candidates.intersection(docids)
+            if len(candidates) == 0:
+                return []
+        result = []
+        for docid in sorted(candidates):
+            plists = []
+            for p in postings:
+                for x in p:
+                    positions = x.get_positions(docid)
+                    if len(positions) != 0:
+                        plists.append(positions)
+                        break
+            starts = set(plists[0])
+            for k in range(1, len(plists)):
+                starts.intersection_update([x - k for x in plists[k]])
+            if len(starts) != 0:
+                result.append(docid)
+        return result
+
+    def search(self, query):
+        """Run a boolean query.
+
+        The syntax is:
+            field:value     A term. A bare word is a stem.
+            "w1 w2 ..."     A phrase of stems at consecutive positions.
+            a AND b         Both. Juxtaposition also means AND.
+            a OR b          Either.
+            NOT a           Documents without a.
+            ( ... )         Grouping.
+
+        Returns:
+            A sorted list of document ids.
+        """
+        docids, negated = self._evaluate(_QueryParser(query).parse())
+        if not negated:
+            return sorted(docids)
+        # Only a query with no positive clause is evaluated against the whole index
+        result = []
+        for seg in self._segments:
+            result.extend([x for x in xrange(seg.base, seg.base + seg.ndocs) if x not in docids])
+        return result
+
+    def _evaluate(self, node):
+        """Evaluate a query node.
+
+        NOT is never expanded to the complement. A node evaluates to a set of docids and a negated flag,
+        when set the result is all documents except those in the set. AND subtracts negated clauses from
+        the positive clauses and OR subtracts positive clauses from negated clauses.
+
+        Returns:
+            A tuple (docids, negated).
+        """
+        op = node[0]
+        if op == 'term':
+            return set(self.get_docids(node[1])), False
+        elif op == 'phrase':
+            return set(self.get_phrase_docids(node[1])), False
+        elif op == 'not':
+            docids, negated = self._evaluate(node[1])
+            return docids, not negated
+        clauses = [self._evaluate(x) for x in node[1]]
+        positive = [x for x, negated in clauses if not negated]
+        negative = [x for x, negated in clauses if negated]
+        if op == 'or':
+            # a OR NOT b OR NOT c == NOT ((b AND c) - a)
+            result = _union(positive)
+            if len(negative) == 0:
+                return result, False
+            return _intersection(negative).difference(result), True
+        # a AND NOT b AND NOT c == a - (b OR c)
+        result = _union(negative)
+        if len(positive) == 0:
+            return result, True
+        return _intersection(positive).difference(result), False
+
+
+def _union(sets):
+    result = set()
+    for x in sets:
+        result.update(x)
+    return result
+
+
+def _intersection(sets):
+    sets = sorted(sets, key=len)
+    result = set(sets[0])
+    for x in sets[1:]:
+        result.intersection_update(x)
+    return result
+
+
+def _make_term(word):
+    word = word.lower()
+    return word if ':' in word else 'stem:' + word
+
+
+class _QueryParser(object):
+    """Recursive descent parser for IndexReader.search() queries."""
+
+    def __init__(self, query):
+        self.tokens = []
+        for m in _QUERY_TOKEN.finditer(query):
+            if m.group(1):
+                self.tokens.append(('(', None))
+            elif m.group(2):
+                self.tokens.append((')', None))
+            elif m.group(3) is not None:
+                self.tokens.append(('phrase', m.group(3)))
+            elif m.group(4) in ['AND', 'OR', 'NOT']:
+                self.tokens.append((m.group(4), None))
+            elif m.group(4):
+                self.tokens.append(('term', m.group(4)))
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def parse(self):
+        node = self._parse_or()
+        if self.pos != len(self.tokens):
+            raise ValueError('unexpected %s in query' % self._peek())
+        return node
+
+    def _parse_or(self):
+        nodes = [self._parse_and()]
+        while self._peek() == 'OR':
+            self._next()
+            nodes.append(self._parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def _parse_and(self):
+        nodes = [self._parse_unary()]
+        while self._peek() not in [None, 'OR', ')']:
+            if self._peek() == 'AND':
+                self._next()
+            nodes.append(self._parse_unary())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def _parse_unary(self):
+        if self._peek() == 'NOT':
+            self._next()
+            return ('not', self._parse_unary())
+        return self._parse_primary()
+
+    def _parse_primary(self):
+        tok = self._peek()
+        if tok == '(':
+            self._next()
+            node = self._parse_or()
+            if self._peek() != ')':
+                raise ValueError('missing ) in query')
+            self._next()
+            return node
+        elif tok == 'term':
+            return ('term', _make_term(self._next()[1]))
+        elif tok == 'phrase':
+            return ('phrase', [_make_term(w) for w in self._next()[1].split()])
+        raise ValueError('unexpected %s in query' % tok)
@@ -104,6 +104,11 @@ import threading
 import copy
 import itertools
 import StringIO
+import struct
+import array
+import mmap
+import sys
+import multiprocessing
 from marbles import safe_utf8_decode, safe_utf8_encode, PROJDIR
 
 
@@ -117,11 +122,30 @@ ALL_SUGGESTIONS = 2
 
 _CCGBANK_IGNORE = re.compile(r"^'(?:ll|s|ve|nt|m|re|d)(?:\s|$)|-[A-Z]+-?$", re.UNICODE | re.IGNORECASE)
 
+# Compiled dictionary layout. All integers are little endian uint32.
+#   header: magic, version, max_edit_distance, longest_word_length, entry count, posting count, string table size
+#   key offsets [entry count + 1] into the string table, entries are sorted by utf-8 key
+#   frequencies [entry count]
+#   posting offsets [entry count + 1] into the postings
+#   postings [posting count], each an entry index of a suggested correction
+#   string table [string table size]
+_COMPILED_MAGIC = b'SYMSPELL'
+_COMPILED_VERSION = 1
+_COMPILED_HEADER = struct.Struct(b'<8s6I')
+_U32 = struct.Struct(b'<I')
+_U32x2 = struct.Struct(b'<2I')
 
-def dameraulevenshtein(seq1, seq2):
+# Lower case words not attached to apostrophes or hyphens. Capitalized words are treated as names and never corrected.
+_CORRECTABLE_WORD = re.compile(r"(?<![\w'-])[a-z]+(?![\w'-])", re.UNICODE)
+
+# Spellchecker used by multiprocessing workers. Set before the pool is forked.
+_pool_spellchecker = None
+
+
+def dameraulevenshtein(seq1, seq2, max_distance=None):
     """Calculate the Damerau-Levenshtein distance between sequences.
 
-    This method has not been modified from the original.
+    Based on the original with an optional max_distance for early exit.
     Source: http://mwh.geek.nz/2009/04/26/python-damerau-levenshtein-distance/
 
     This distance is the number of additions, deletions, substitutions,
@@ -144,9 +168,16 @@ def dameraulevenshtein(seq1, seq2):
     >>> dameraulevenshtein('abcd', ['b', 'a', 'c', 'd', 'e'])
     2
 
+    If max_distance is set the calculation stops as soon as the distance must
+    exceed max_distance and max_distance+1 is returned.
+    >>> dameraulevenshtein('abcdef', 'uvwxyz', 2)
+    3
+
     Remarks:
         Threadsafe.
     """
+    if max_distance is not None and abs(len(seq1) - len(seq2)) > max_distance:
+        return max_distance + 1
     # codesnippet:D0DE4716-B6E6-4161-9219-2903BF8F547F
     # Conceptually, this is based on a len(seq1) + 1 * len(seq2) + 1 matrix.
     # However, only the current and two previous rows are needed at once,
@@ -167,6 +198,11 @@ def dameraulevenshtein(seq1, seq2):
             if (x > 0 and y > 0 and seq1[x] == seq2[y - 1]
                 and seq1[x-1] == seq2[y] and seq1[x] != seq2[y]):
                 thisrow[y] = min(thisrow[y], twoago[y - 2] + 1)
+        # Cells only depend on the previous two rows so if both exceed the bound so will the result
+        if max_distance is not None and min(thisrow) > max_distance and min(oneago) > max_distance:
+            return max_distance + 1
+    if max_distance is not None and thisrow[len(seq2) - 1] > max_distance:
+        return max_distance + 1
     return thisrow[len(seq2) - 1]
 
 
@@ -180,6 +216,7 @@ class SymSpell(object):
         self.modify_lock = threading.RLock()
         self.silent = True
         self.wnstats = None
+        self.memo = {}
 
     def get_deletes_list(self, w):
         """Given a word, derive strings with up to max_edit_distance characters deleted."""
@@ -206,6 +243,8 @@ class SymSpell(object):
         # frequency of word in corpus)
         w = safe_utf8_decode(w)
         new_real_word_added = False
+        if len(self.memo) != 0:
+            self.memo = {}
         if w in self.dictionary:
             # increment frequency of word in corpus
             entry = (self.dictionary[w][0], self.dictionary[w][1] + 1)
@@ -255,6 +294,7 @@ class SymSpell(object):
             ln = stream.readline().strip().split(b':')
             self.max_edit_distance = int(ln[0])
             self.longest_word_length = int(ln[1])
+            self.memo = {}
             for line in stream:
                 ln = line.strip().split(b':')
                 words = [safe_utf8_decode(x) for x in ln[2:] if len(x) != 0]
@@ -262,6 +302,41 @@ class SymSpell(object):
         finally:
             self.modify_lock.release()
 
+    def save_compiled(self, stream):
+        """Save the dictionary in the compiled format. The compiled format is read by CompiledSymSpell.
+
+        Args:
+            stream: A binary stream or file.
+
+        Remarks:
+            Threadsafe.
+        """
+        self.modify_lock.acquire()
+        try:
+            keys = sorted([safe_utf8_encode(k) for k in self.dictionary.iterkeys()])
+            key2idx = dict([(k, i) for i, k in enumerate(keys)])
+            key_offs = array.array(b'I', [0])
+            freqs = array.array(b'I')
+            post_offs = array.array(b'I', [0])
+            posts = array.array(b'I')
+            for k in keys:
+                v = self.dictionary[safe_utf8_decode(k)]
+                key_offs.append(key_offs[-1] + len(k))
+                freqs.append(v[1])
+                posts.extend([key2idx[safe_utf8_encode(x)] for x in v[0]])
+                post_offs.append(len(posts))
+            header = _COMPILED_HEADER.pack(_COMPILED_MAGIC, _COMPILED_VERSION, self.max_edit_distance,
+                                           self.longest_word_length, len(keys), len(posts), key_offs[-1])
+        finally:
+            self.modify_lock.release()
+
+        stream.write(header)
+        for arr in [key_offs, freqs, post_offs, posts]:
+            if sys.byteorder != 'little':
+                arr.byteswap()
+            stream.write(arr.tostring())
+        stream.write(b''.join(keys))
+
     def build_from_corpus(self, stream, stats=None):
         """Create from a file containing a corpus of words.
 
@@ -409,7 +484,7 @@ class SymSpell(object):
 
                         # calculate edit distance using, for example,
                         # Damerau-Levenshtein distance
-                        item_dist = dameraulevenshtein(sc_item, string)
+                        item_dist = dameraulevenshtein(sc_item, string, self.max_edit_distance)
 
                         # do not add words with greater edit distance if
                         # suggest_mode setting not ALL_SUGGESTIONS
@@ -550,6 +625,85 @@ class SymSpell(object):
         except:
             return None
 
+    def correct_words(self, words):
+        """Get the best correction for a batch of words. Each unique word is corrected once and the
+        result is memoized until the dictionary is modified.
+
+        Args:
+            words: An iterable of words.
+
+        Returns:
+            A dictionary mapping each unique word to its best correction, or None if no correction exists.
+
+        Remarks:
+            Threadsafe.
+        """
+        memo = self.memo
+        result = {}
+        for w in words:
+            w = safe_utf8_decode(w)
+            if w in result:
+                continue
+            suggestion = memo.get(w, False)
+            if suggestion is False:
+                entry = self.dictionary.get(w)
+                if entry is not None and entry[1] > 0:
+                    # Fast path, the word is in the corpus
+                    suggestion = w
+                else:
+                    # best_word() returns [] when the word is too long to have suggestions
+                    suggestion = self.best_word(w) or None
+                memo[w] = suggestion
+            result[w] = suggestion
+        return result
+
+    def correct_text(self, text):
+        """Correct the spelling of lower case words in a text. Capitalized words and words attached to
+        apostrophes or hyphens are left alone.
+
+        Args:
+            text: A sentence or document.
+
+        Returns:
+            The corrected text.
+
+        Remarks:
+            Threadsafe.
+        """
+        text = safe_utf8_decode(text)
+        corrections = self.correct_words(_CORRECTABLE_WORD.findall(text))
+        if all([k == v or v is None for k, v in corrections.iteritems()]):
+            return text
+
+        def replace_word(m):
+            w = corrections[m.group(0)]
+            return w or m.group(0)
+        return _CORRECTABLE_WORD.sub(replace_word, text)
+
+    def correct_texts(self, texts, processes=None, chunksize=16):
+        """Correct the spelling of a batch of texts.
+
+        Args:
+            texts: An iterable of sentences or documents.
+            processes: The number of worker processes. If None or 1 then texts are corrected in this process.
+                Workers are forked so a CompiledSymSpell dictionary is shared through the page cache.
+            chunksize: The number of texts sent to a worker at a time.
+
+        Returns:
+            A list of corrected texts, in the same order as texts.
+        """
+        global _pool_spellchecker
+        if processes is None or processes <= 1:
+            return [self.correct_text(x) for x in texts]
+        _pool_spellchecker = self
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(_correct_text_worker, texts, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+            _pool_spellchecker = None
+
     def correct_document(self, fname, printlist=True):
         # correct an entire document
         with open(fname) as file:
@@ -558,19 +712,23 @@ class SymSpell(object):
             unknown_word_count = 0
             print("Finding misspelled words in your document...")
 
-            for i, line in enumerate(file):
+            lines = []
+            for line in file:
                 # separate by words by non-alphabetical characters
-                doc_words = self.pattern.findall(line.lower())
+                lines.append(self.pattern.findall(line.lower()))
+            corrections = self.correct_words(itertools.chain(*lines))
+
+            for i, doc_words in enumerate(lines):
                 for doc_word in doc_words:
                     doc_word_count += 1
-                    suggestion = self.best_word(doc_word)
+                    suggestion = corrections[safe_utf8_decode(doc_word)]
                     if suggestion is None:
                         if printlist:
                             print("In line %i, the word < %s > was not found (no suggested correction)" % (i, doc_word))
                         unknown_word_count += 1
-                    elif suggestion[0] != doc_word:
+                    elif suggestion != doc_word:
                         if printlist:
-                            print("In line %i, %s: suggested correction is < %s >" % (i, doc_word, suggestion[0]))
+                            print("In line %i, %s: suggested correction is < %s >" % (i, doc_word, suggestion))
                         corrected_word_count += 1
 
         print("-----")
@@ -578,6 +736,121 @@ class SymSpell(object):
         print("total unknown words: %i" % unknown_word_count)
         print("total potential errors found: %i" % corrected_word_count)
 
+def _correct_text_worker(text):
+    return _pool_spellchecker.correct_text(text)
+
+
+class _CompiledDictionary(collections.Mapping):
+    """Read-only mapping over a compiled dictionary buffer. Lookups use a binary search on the sorted
+    key table so nothing is unpacked until it is accessed.
+    """
+    def __init__(self, buf):
+        self._buf = buf
+        magic, version, self.max_edit_distance, self.longest_word_length, self._n, nposts, strsize = \
+            _COMPILED_HEADER.unpack_from(buf, 0)
+        if magic != _COMPILED_MAGIC or version != _COMPILED_VERSION:
+            raise ValueError('not a compiled SymSpell dictionary')
+        self._key_offs = _COMPILED_HEADER.size
+        self._freqs = self._key_offs + 4 * (self._n + 1)
+        self._post_offs = self._freqs + 4 * self._n
+        self._posts = self._post_offs + 4 * (self._n + 1)
+        self._strings = self._posts + 4 * nposts
+        if len(buf) < self._strings + strsize:
+            raise ValueError('compiled SymSpell dictionary is truncated')
+        self._last = (None, -1)
+
+    def _key(self, i):
+        start, end = _U32x2.unpack_from(self._buf, self._key_offs + 4 * i)
+        return self._buf[self._strings + start:self._strings + end]
+
+    def _find(self, key):
+        last = self._last
+        if last[0] == key:
+            return last[1]
+        lo = 0
+        hi = self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        i = lo if lo < self._n and self._key(lo) == key else -1
+        self._last = (key, i)
+        return i
+
+    def _entry(self, i):
+        freq = _U32.unpack_from(self._buf, self._freqs + 4 * i)[0]
+        start, end = _U32x2.unpack_from(self._buf, self._post_offs + 4 * i)
+        if start == end:
+            return [], freq
+        posts = struct.unpack_from(b'<%dI' % (end - start), self._buf, self._posts + 4 * start)
+        return [safe_utf8_decode(self._key(j)) for j in posts], freq
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for i in xrange(self._n):
+            yield safe_utf8_decode(self._key(i))
+
+    def __contains__(self, word):
+        return self._find(safe_utf8_encode(word)) >= 0
+
+    def __getitem__(self, word):
+        i = self._find(safe_utf8_encode(word))
+        if i < 0:
+            raise KeyError(word)
+        return self._entry(i)
+
+
+class CompiledSymSpell(SymSpell):
+    """Read-only SymSpell backed by a compiled dictionary. The compiled file is memory mapped so loading
+    is near instant and the pages are shared between forked workers.
+
+    Remarks:
+        Threadsafe.
+    """
+    def __init__(self, buf):
+        """Constructor.
+
+        Args:
+            buf: A buffer containing a dictionary saved by SymSpell.save_compiled(). Usually a mmap instance.
+        """
+        super(CompiledSymSpell, self).__init__()
+        self._buf = buf
+        self.dictionary = _CompiledDictionary(buf)
+        self.max_edit_distance = self.dictionary.max_edit_distance
+        self.longest_word_length = self.dictionary.longest_word_length
+
+    @classmethod
+    def load(cls, filename):
+        """Memory map a compiled dictionary file.
+
+        Args:
+            filename: The path to a file saved by SymSpell.save_compiled().
+
+        Returns:
+            A CompiledSymSpell instance.
+        """
+        with open(filename, 'rb') as fp:
+            buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buf)
+
+    def close(self):
+        """Release the memory map."""
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = None
+        self.dictionary = {}
+
+    def create_dictionary_entry(self, w):
+        raise TypeError('CompiledSymSpell is read-only')
+
+    def restore(self, stream):
+        raise TypeError('CompiledSymSpell is read-only')
+
+
 ## main
 
 if __name__ == "__main__":
@@ -585,9 +858,13 @@ if __name__ == "__main__":
     import os
     print("Please wait...")
     start_time = time.time()
-    spellcheck = SymSpell()
-    with open(os.path.join(PROJDIR, 'src', 'python', 'marbles', 'ie', 'kb', 'data', 'dictionary-en.dat'), 'r') as fp:
-        spellcheck.restore(fp)
+    datapath = os.path.join(PROJDIR, 'src', 'python', 'marbles', 'ie', 'kb', 'data')
+    if os.path.exists(os.path.join(datapath, 'dictionary-en.bin')):
+        spellcheck = CompiledSymSpell.load(os.path.join(datapath, 'dictionary-en.bin'))
+    else:
+        spellcheck = SymSpell()
+        with open(os.path.join(datapath, 'dictionary-en.dat'), 'r') as fp:
+            spellcheck.restore(fp)
     run_time = time.time() - start_time
     print('-----')
     print('%.2f seconds to restore' % run_time)
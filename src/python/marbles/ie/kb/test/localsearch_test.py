@@ -0,0 +1,118 @@
+from __future__ import unicode_literals, print_function
+import unittest
+import os
+import shutil
+import tempfile
+from marbles.ie.kb.localsearch import IndexWriter, IndexReader
+from marbles.ie.core.constants import RT_PROPERNAME, RT_ENTITY, RT_EVENT
+from marbles.test import dprint
+
+
+def make_lexeme(idx, word, pos, mask=0, drs='none'):
+    return {
+        'word': word,
+        'stem': word.lower(),
+        'pos': pos,
+        'head': idx,
+        'idx': idx,
+        'mask': mask,
+        'refs': [],
+        'drs': drs,
+        'category': 'N'
+    }
+
+
+def make_sentence(words):
+    return {
+        'lexemes': [make_lexeme(i, *w) for i, w in enumerate(words)],
+        'constituents': []
+    }
+
+
+ARTICLE1 = {
+    'title': make_sentence([('John', 'NNP', RT_PROPERNAME, '<{x1},{John(x1)}>'),
+                            ('gives', 'VBZ', RT_EVENT, '<{e1},{_EVENT(e1),give(e1),_vn_give-13.1(e1)}>'),
+                            ('flowers', 'NNS', RT_ENTITY, '<{x2},{flowers(x2)}>')]),
+    'paragraphs': [[make_sentence([('The', 'DT'), ('big', 'JJ'), ('dog', 'NN', RT_ENTITY, '<{x3},{dog(x3)}>'),
+                                   ('barked', 'VBD', RT_EVENT, '<{e2},{_EVENT(e2),bark(e2)}>'), ('.', '.')])]]
+}
+
+ARTICLE2 = {
+    'title': make_sentence([('The', 'DT'), ('dog', 'NN', RT_ENTITY, '<{x1},{dog(x1)}>'),
+                            ('is', 'VBZ'), ('big', 'JJ')]),
+    'paragraphs': [[make_sentence([('Paul', 'NNP', RT_PROPERNAME, '<{x1},{Paul(x1)}>'),
+                                   ('gives', 'VBZ', RT_EVENT, '<{e1},{_EVENT(e1),give(e1),_vn_give-13.1(e1)}>'),
+                                   ('nothing', 'NN', RT_ENTITY, '<{x2},{!<{},{thing(x2)}>}>')])]]
+}
+
+
+class LocalSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def check_queries(self, reader):
+        self.assertEqual(4, len(reader))
+        self.assertListEqual([0, 3], reader.search('vn:give-13.1'))
+        self.assertListEqual([3], reader.search('nnp:paul'))
+        self.assertListEqual([1, 2], reader.search('dog'))
+        self.assertListEqual([1], reader.search('"big dog"'))
+        self.assertListEqual([0, 1, 3], reader.search('pred:_event'))
+        self.assertListEqual([0], reader.search('gives NOT nnp:paul'))
+        self.assertListEqual([0, 2, 3], reader.search('NOT pred:bark'))
+        self.assertListEqual([0, 1, 3], reader.search('(nnp:john OR nnp:paul) OR (dog AND pred:bark)'))
+        self.assertListEqual([3], reader.search('pred:thing AND gives'))
+        self.assertListEqual([0, 1, 2], reader.search('dog OR NOT nnp:paul'))
+        self.assertListEqual([3], reader.search('NOT (dog OR nnp:john)'))
+        self.assertListEqual([0, 3], reader.search('NOT NOT gives'))
+        self.assertListEqual([2], reader.search('NOT gives NOT pred:bark'))
+        self.assertListEqual([0, 1, 2, 3], reader.search('gives OR NOT gives'))
+        doc = reader.get_document(1)
+        dprint(doc)
+        self.assertEqual('The big dog barked.', doc['text'])
+        self.assertEqual('h1', doc['hash'])
+        self.assertEqual(0, doc['paragraph'])
+
+    def test1_SingleSegment(self):
+        with IndexWriter(self.path) as writer:
+            writer.add_article('h1', ARTICLE1)
+            writer.add_article('h2', ARTICLE2)
+        with IndexReader(self.path) as reader:
+            self.check_queries(reader)
+
+    def test2_MergeSegments(self):
+        with IndexWriter(self.path, max_buffered_docs=1, merge_factor=3) as writer:
+            writer.add_article('h1', ARTICLE1)
+            writer.add_article('h2', ARTICLE2)
+            self.assertLess(len(writer.manifest['segments']), 4)
+        with IndexReader(self.path) as reader:
+            self.check_queries(reader)
+        with IndexWriter(self.path) as writer:
+            writer.compact()
+            self.assertEqual(1, len(writer.manifest['segments']))
+        self.assertEqual(2, len(os.listdir(self.path)))
+        with IndexReader(self.path) as reader:
+            self.check_queries(reader)
+
+    def test3_Rollback(self):
+        with IndexWriter(self.path, max_buffered_docs=1) as writer:
+            writer.add_article('h1', ARTICLE1)
+            # A batch is not flushed so it can be discarded
+            writer.begin()
+            writer.add_article('h3', ARTICLE2)
+            writer.add_article('h3', ARTICLE1)
+            self.assertEqual(4, len(writer._docs))
+            writer.rollback()
+            self.assertEqual(0, len(writer._docs))
+            self.assertEqual(0, len(writer._postings))
+            writer.begin()
+            writer.add_article('h2', ARTICLE2)
+            writer.commit()
+        with IndexReader(self.path) as reader:
+            self.check_queries(reader)
+
+
+if __name__ == '__main__':
+    unittest.main()
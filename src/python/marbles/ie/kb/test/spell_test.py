@@ -2,7 +2,7 @@ from __future__ import unicode_literals, print_function
 import unittest
 import os
 import StringIO
-from marbles.ie.kb.spell import SymSpell, BEST_SUGGESTION, NBEST_SUGGESTIONS, ALL_SUGGESTIONS
+from marbles.ie.kb.spell import SymSpell, CompiledSymSpell, BEST_SUGGESTION, NBEST_SUGGESTIONS, ALL_SUGGESTIONS
 from marbles import PROJDIR
 from marbles.test import dprint, DPRINT_ON
 
@@ -79,6 +79,53 @@ class SymSpellTestCase(unittest.TestCase):
         suggestion = spellchecker.get_suggestions('cepted', NBEST_SUGGESTIONS)
         self.assertListEqual(['accepted', 'excepted', 'sceptred'], sorted(suggestion))
 
+    def test4_Compiled(self):
+        spellchecker1 = SymSpell()
+        strm = StringIO.StringIO()
+        strm.write("accepted accept acceptance acceptable\n")
+        strm.write("excepted except exception exceptional sceptered\n")
+        strm.seek(0)
+        spellchecker1.build_from_corpus(strm)
+        fp = StringIO.StringIO()
+        spellchecker1.save_compiled(fp)
+        spellchecker2 = CompiledSymSpell(fp.getvalue())
+
+        self.assertEqual(spellchecker1.longest_word_length, spellchecker2.longest_word_length)
+        self.assertEqual(spellchecker1.max_edit_distance, spellchecker2.max_edit_distance)
+        self.assertEqual(len(spellchecker1.dictionary), len(spellchecker2.dictionary))
+        for k, v in spellchecker1.dictionary.iteritems():
+            self.assertTrue(k in spellchecker2.dictionary)
+            self.assertListEqual(sorted(v[0]), sorted(spellchecker2.dictionary[k][0]))
+            self.assertEqual(v[1], spellchecker2.dictionary[k][1])
+        self.assertFalse('xyzzy' in spellchecker2.dictionary)
+
+        suggestion = spellchecker2.get_suggestions('acept', BEST_SUGGESTION)
+        self.assertEqual('accept', suggestion)
+        suggestion = spellchecker2.get_suggestions('cepted', NBEST_SUGGESTIONS)
+        self.assertListEqual(['accepted', 'excepted'], sorted(suggestion))
+
+    def test5_CorrectText(self):
+        spellchecker = SymSpell()
+        strm = StringIO.StringIO()
+        strm.write("the board accepted an exceptional offer from the bank\n")
+        strm.seek(0)
+        spellchecker.build_from_corpus(strm)
+        corrections = spellchecker.correct_words(['acepted', 'offer', 'acepted', 'xqzt'])
+        self.assertDictEqual({'acepted': 'accepted', 'offer': 'offer', 'xqzt': None}, corrections)
+        self.assertTrue('acepted' in spellchecker.memo)
+        text = spellchecker.correct_text("The bord acepted an exceptionl offer from Bnak's owner.")
+        self.assertEqual("The board accepted an exceptional offer from Bnak's owner.", text)
+        # Words too long to have suggestions are left alone
+        self.assertEqual('see www.averyveryverylongdomainname.com',
+                         spellchecker.correct_text('see www.averyveryverylongdomainname.com'))
+        texts = ["the bord acepted", "an exceptionl offer", "from the bank"]
+        expected = ["the board accepted", "an exceptional offer", "from the bank"]
+        self.assertListEqual(expected, spellchecker.correct_texts(texts))
+        self.assertListEqual(expected, spellchecker.correct_texts(texts, processes=2, chunksize=1))
+        # Memo is invalidated when the dictionary changes
+        spellchecker.create_dictionary_entry('acepted')
+        self.assertDictEqual({}, spellchecker.memo)
+
 
 if __name__ == '__main__':
     unittest.main()
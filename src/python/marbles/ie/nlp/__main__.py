@@ -2,6 +2,8 @@ from . import *
 import sys, json
 from optparse import OptionParser
 from .clause import preprocess
+from .googlenlp.batch import BatchGoogleNLP
+from .runner import ClauseRunner, annotate_documents, read_completed
 
 
 print('Clause Finder supports Google or spaCy NLP')
@@ -14,6 +16,9 @@ parser.add_option('-o', '--json-out', type='string', dest='jsonoutfile', help='S
 parser.add_option('-f', '--file', type='string', dest='infile', help='Process a text file.')
 parser.add_option('-k', '--hack', action='store_true', dest='hack', help='Add hack to fixup incorrect root token.')
 parser.add_option('-c', '--compact', action='store_true', dest='compact', help='compact json output.')
+parser.add_option('-C', '--cache-dir', type='string', dest='cachedir', help='Cache Google NLP responses in this directory.')
+parser.add_option('-J', '--jsonl-out', type='string', dest='jsonloutfile', help='Find clauses in each line of the --file text file in parallel and save as JSON lines. Resumes an interrupted run.')
+parser.add_option('-n', '--processes', type='int', dest='processes', help='Number of processes for --jsonl-out, default is the cpu count.')
 parser.add_option('-p', '--parser', type='string', dest='parser', help='Parsers to invoke (google|spacy), default is google.')
 options, args = parser.parse_args()
 
@@ -26,6 +31,27 @@ if parser != 'google' and options.jsoninfile is not None:
 if parser != 'google' and options.jsonoutfile is not None:
     print('Warning --json-out only available for google parser')
 
+if options.jsonloutfile is not None:
+    if options.infile is None:
+        print('Error: --jsonl-out requires --file')
+        sys.exit(1)
+    print('Processing text file %s' % options.infile)
+    with open(options.infile, 'rt') as fd:
+        lines = fd.readlines()
+    cleanlines = filter(lambda x: len(x) != 0 and x[0] != '#', [x.strip().decode('utf-8') for x in lines])
+    runner = ClauseRunner(parser, processes=options.processes)
+    if parser == 'google':
+        # Documents are annotated in chunks as the runner consumes them. Completed documents are not
+        # annotated again.
+        nlp = BatchGoogleNLP(cache=options.cachedir)
+        documents = annotate_documents(nlp, enumerate(cleanlines), runner.failed,
+                                       completed=read_completed(options.jsonloutfile))
+    else:
+        documents = enumerate(cleanlines)
+    runner.run(documents, options.jsonloutfile)
+    runner.print_report()
+    sys.exit(0)
+
 if parser == 'google':
     i = 1
     if options.jsoninfile is not None:
@@ -43,17 +69,16 @@ if parser == 'google':
 
     if options.infile is not None:
         print('Processing text file %s' % options.infile)
-        nlp = googlenlp.GoogleNLP()
+        nlp = BatchGoogleNLP(cache=options.cachedir)
         with open(options.infile, 'rt') as fd:
             lines = fd.readlines()
         cleanlines = filter(lambda x: len(x) != 0 and x[0] != '#', [x.strip() for x in lines])
         if options.hack:
             changeCount = 0
             nounCount = 0
+            results = nlp.parse_many(cleanlines)
             for i in range(len(cleanlines)):
-                ln = cleanlines[i]
-                result = nlp.parse(ln)
-                doc = googlenlp.Doc(result)
+                doc = googlenlp.Doc(results[i])
                 prep, changed, nroot = preprocess(doc)
                 if changed:
                     changeCount += 1
@@ -79,7 +104,7 @@ if parser == 'google':
             i += 1
 
     elif len(args) != 0:
-        nlp = googlenlp.GoogleNLP()
+        nlp = BatchGoogleNLP(cache=options.cachedir)
 
     if args is not None and len(args) != 0:
         print('Processing command line text')
@@ -267,34 +267,51 @@ class ClauseFinder(object):
     def __init__(self, doc):
         '''Constructor.
 
+        Args:
+             doc: A google.Doc or spacy.Doc
+        '''
+        self._nlp = None
+        self._is_google = False
+        self._doc = None
+        self._capacity = 0
+        self._dispatcher = None
+        self._excludeList = None
+        self._stk = None
+        self._state = None
+        self._coordList = None
+        self.reset(doc)
+
+    def reset(self, doc):
+        '''Rebind the clause finder to a new document. Lookup tables are only reallocated if the
+        document is larger than any previous document, and the dispatcher is only rebuilt if the
+        parser changes, so a single instance can process a corpus.
+
         Args:
              doc: A google.Doc or spacy.Doc
         '''
         if isinstance(doc, googlenlp.Doc):
-            self._nlp = googlenlp
-            self._is_google = True
+            nlp = googlenlp
         else:
-            self._is_google = False
             global DELAY_SPACY_IMPORT
             if DELAY_SPACY_IMPORT:
                 import spacynlp
             if isinstance(doc, spacynlp.Doc):
-                self._nlp = spacynlp
+                nlp = spacynlp
             else:
                 raise TypeError
         self._doc = doc
-        self._map = VectorMap(len(doc))
-        self._advMap = VectorMap(len(doc))
-        self._conjAMap = VectorMap(len(doc))
-        self._conjOMap = VectorMap(len(doc))
-        self._conjVMap = VectorMap(len(doc))
-        self._conjVAMap = VectorMap(len(doc))
-        self._dispatcher = None
-        self._excludeList = None
-        self._stk = None
-        self._state = None
-        self._coordList = None
-        self.build_dispatcher()
+        if len(doc) > self._capacity or self._capacity == 0:
+            self._capacity = max(len(doc), 2 * self._capacity, 1)
+            self._map = VectorMap(self._capacity)
+            self._advMap = VectorMap(self._capacity)
+            self._conjAMap = VectorMap(self._capacity)
+            self._conjOMap = VectorMap(self._capacity)
+            self._conjVMap = VectorMap(self._capacity)
+            self._conjVAMap = VectorMap(self._capacity)
+        if nlp is not self._nlp:
+            self._nlp = nlp
+            self._is_google = nlp is googlenlp
+            self.build_dispatcher()
 
     def _process_as_obj(self, O, V=None):
         if V is None: V = self.get_governor_verb(O)
@@ -159,15 +159,19 @@ class SubtreeSpan(IndexSpan):
                     nofollow = [x.i for x in nofollow]
             else:
                 nofollow = []
-            tok = doc[idx]
-            if stk is None:
-                stk = filter(lambda x: x not in nofollow, [x.i for x in tok.children])
-            indexes.extend(stk)
-            while len(stk) != 0:
-                tok = doc[stk.pop()]
-                adj = filter(lambda x: x not in nofollow, [x.i for x in tok.children])
-                stk.extend(adj)
-                indexes.extend(adj)
+            if stk is None and len(nofollow) == 0 and hasattr(doc, 'get_subtree_indexes'):
+                # Compiled documents have precomputed subtree intervals
+                indexes = doc.get_subtree_indexes(idx)
+            else:
+                tok = doc[idx]
+                if stk is None:
+                    stk = filter(lambda x: x not in nofollow, [x.i for x in tok.children])
+                indexes.extend(stk)
+                while len(stk) != 0:
+                    tok = doc[stk.pop()]
+                    adj = filter(lambda x: x not in nofollow, [x.i for x in tok.children])
+                    stk.extend(adj)
+                    indexes.extend(adj)
             if removePunct:
                 indexes = filter(lambda x: not doc[x].is_punct, indexes)
             indexes.sort()
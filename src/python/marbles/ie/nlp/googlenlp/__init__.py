@@ -2,6 +2,7 @@
 
 from . import dep
 from . import pos
+import numpy as np
 from googleapiclient import discovery
 from googleapiclient.errors import HttpError
 from oauth2client.client import GoogleCredentials
@@ -35,6 +36,10 @@ GOOGLE_TYPE_NAMES = {
 TYPEOF_MAP = build_typeof_map(sys.modules[__name__])
 TYPEOF_MAP.insert_new(dep.VMOD, TYPEOF_APPOS)
 
+# Tag lookup from the compiled id arrays
+_DEP_BY_ID = dict([(x.i, x) for x in dep.TAG.itervalues()])
+_POS_BY_ID = dict([(x.i, x) for x in pos.TAG.itervalues()])
+
 
 def get_type_name(tag):
     '''Get a google type string from the grammatical relation.
@@ -51,17 +56,13 @@ def get_type_name(tag):
 
 
 class Token(object):
-    '''A token in the dependency tree. The class has a similar interface to spacy.Token
+    '''A token in the dependency tree. The class has a similar interface to spacy.Token. A token
+    is a view onto the compiled arrays of a Doc.
     '''
+    __slots__ = ('_doc', '_idx')
 
     def __init__(self, doc, offset):
         self._doc = doc
-        self._gtok = doc._tokens[offset]
-        self._lemma = None  # self._gtok['lemma']
-        self._text = None   # self._gtok['text']['content']
-        self._dep = None    # dep.TAG[ self._gtok['dependencyEdge']['label'] ]
-        self._pos = None    # pos.TAG[ self._gtok['partOfSpeech']['tag'] ]
-        self._adj = self._gtok['adj']
         self._idx = offset
 
     def __repr__(self):
@@ -86,13 +87,11 @@ class Token(object):
         return other._idx >= self._idx
 
     def __hash__(self):
-        return (self._idx << 5) ^ (self.idx >> 27) ^ self._doc._hash
+        return (self._idx << 5) ^ (self._idx >> 27) ^ self._doc._hash
 
     @property
     def lemma(self):
-        if self._lemma is None:
-            self._lemma = self._gtok['lemma']
-        return self._lemma
+        return self._doc._lemma[self._idx]
 
     @property
     def orth(self):
@@ -104,15 +103,11 @@ class Token(object):
 
     @property
     def dep(self):
-        if self._dep is None:
-            self._dep = dep.TAG[self._gtok['dependencyEdge']['label']]
-        return self._dep
+        return _DEP_BY_ID[int(self._doc._dep[self._idx])]
 
     @property
     def pos(self):
-        if self._pos is None:
-            self._pos = pos.TAG[self._gtok['partOfSpeech']['tag']]
-        return self._pos
+        return _POS_BY_ID[int(self._doc._pos[self._idx])]
 
     @property
     def shape(self):
@@ -128,11 +123,11 @@ class Token(object):
 
     @property
     def is_punct(self):
-        return self._pos == pos.PUNCT
+        return self._doc._pos[self._idx] == pos.PUNCT.i
 
     @property
     def like_num(self):
-        return self._pos == pos.NUM
+        return self._doc._pos[self._idx] == pos.NUM.i
 
     @property
     def is_space(self):
@@ -142,30 +137,38 @@ class Token(object):
     def i(self):
         return self._idx
 
+    @property
+    def idx(self):
+        '''Character offset of the token in the document.'''
+        return int(self._doc._offset[self._idx])
+
     @property
     def doc(self):
         return self._doc
 
     @property
     def text(self):
-        if self._text is None:
-            self._text = self._gtok['text']['content']
-        return self._text
+        return self._doc._text[self._idx]
 
     @property
     def head(self):
-        return Token(self._doc, self._gtok['dependencyEdge']['headTokenIndex'])
+        return self._doc[self._doc._head[self._idx]]
 
     @property
     def children(self):
-        for i in self._adj:
-            yield Token(self._doc, i)
+        doc = self._doc
+        for i in doc._adj[doc._adj_ptr[self._idx]:doc._adj_ptr[self._idx+1]]:
+            yield doc[i]
 
     @property
     def subtree(self):
-        span = SubtreeSpan(self._doc, self._idx)
-        for i in span._indexes:
-            yield Token(self._doc, i)
+        doc = self._doc
+        for i in doc.get_subtree_indexes(self._idx):
+            yield doc[i]
+
+    def is_ancestor(self, other):
+        '''Test if this token is an ancestor of other, or other itself.'''
+        return self._doc.is_ancestor(self._idx, other.i)
 
 
 class Span(object):
@@ -211,7 +214,12 @@ class Span(object):
 
 
 class Doc(object):
-    '''Google NLP Document. The class has a similar interface to spacy.Doc'''
+    '''Google NLP Document. The class has a similar interface to spacy.Doc
+
+    The raw result is compiled into arrays on construction: head index, dependency label id,
+    part-of-speech id and offset per token, the children as compressed sparse rows, and preorder
+    intervals so subtree and ancestor queries do not walk the tree.
+    '''
 
     def __init__(self, nlpResult):
         '''Construct a document form a Google NLP result.
@@ -219,52 +227,103 @@ class Doc(object):
         Args:
             nlpResult: The result of a GoogleNLP.parse() call.
         '''
-        self._sentences = nlpResult['sentences']
-        self._tokens = nlpResult['tokens']
-        self._trees = [None] * len(self._sentences)
+        sentences = nlpResult['sentences']
+        tokens = nlpResult['tokens']
+        n = len(tokens)
+        self._text = [tok['text']['content'] for tok in tokens]
+        self._lemma = [tok['lemma'] for tok in tokens]
+        self._head = np.array([tok['dependencyEdge']['headTokenIndex'] for tok in tokens], dtype=np.int32)
+        self._dep = np.array([dep.TAG[tok['dependencyEdge']['label']].i for tok in tokens], dtype=np.int16)
+        self._pos = np.array([pos.TAG[tok['partOfSpeech']['tag']].i for tok in tokens], dtype=np.int16)
+        self._offset = np.array([tok['text']['beginOffset'] for tok in tokens], dtype=np.int32)
         self._hash = 0
+        for txt in self._text:
+            self._hash ^= hash(txt)
+
+        # Sentence roots
+        self._trees = [None] * len(sentences)
+        isroot = self._dep == dep.ROOT.i
+        offsets = self._offset.tolist()
+        labels = isroot.tolist()
         g = -1
-        for tok in self._tokens:
-            tok['adj'] = []
-            self._hash ^= hash(tok['text']['content'])
-        i = 0
         limit = -1
-        for tok in self._tokens:
-            if tok['text']['beginOffset'] >= limit:
+        for i in range(n):
+            if offsets[i] >= limit:
                 g += 1
-                limit = self._sentences[g]['text']['beginOffset'] + len(self._sentences[g]['text']['content'])
-            if tok['dependencyEdge']['label'] == dep.ROOT.text:
-                self._trees[g] = tok
-            else:
-                self._tokens[tok['dependencyEdge']['headTokenIndex']]['adj'].append(i)
-            i += 1
+                limit = sentences[g]['text']['beginOffset'] + len(sentences[g]['text']['content'])
+            if labels[i]:
+                self._trees[g] = i
+
+        # Children as CSR, in token order
+        child = np.flatnonzero(~isroot)
+        parent = self._head[child]
+        order = np.argsort(parent, kind='mergesort')
+        self._adj = child[order].astype(np.int32)
+        self._adj_ptr = np.zeros(n + 1, dtype=np.int32)
+        self._adj_ptr[1:] = np.cumsum(np.bincount(parent, minlength=n))
+
+        # Preorder intervals, subtree of i is _preorder[_tin[i]:_tout[i]]
+        tin = [-1] * n
+        tout = [-1] * n
+        preorder = []
+        adj = self._adj.tolist()
+        ptr = self._adj_ptr.tolist()
+        for r in np.flatnonzero(isroot).tolist() + range(n):
+            if tin[r] >= 0:
+                continue
+            stk = [(r, ptr[r])]
+            tin[r] = len(preorder)
+            preorder.append(r)
+            while len(stk) != 0:
+                u, k = stk[-1]
+                if k < ptr[u+1]:
+                    stk[-1] = (u, k + 1)
+                    v = adj[k]
+                    if tin[v] < 0:
+                        tin[v] = len(preorder)
+                        preorder.append(v)
+                        stk.append((v, ptr[v]))
+                else:
+                    tout[u] = len(preorder)
+                    stk.pop()
+        self._tin = np.array(tin, dtype=np.int32)
+        self._tout = np.array(tout, dtype=np.int32)
+        self._preorder = np.array(preorder, dtype=np.int32)
+        self._toks = [Token(self, i) for i in range(n)]
 
     def __getitem__(self, slice_i_j):
         if isinstance(slice_i_j, slice):
-            return IndexSpan(self, range(slice_i_j))
-        return Token(self, slice_i_j)
+            return IndexSpan(self, range(*slice_i_j.indices(len(self))))
+        return self._toks[slice_i_j]
 
     def __iter__(self):
-        for i in range(len(self._tokens)):
-            yield Token(self, i)
+        return iter(self._toks)
 
     def __len__(self):
-        return len(self._tokens)
+        return len(self._toks)
+
+    def get_subtree_indexes(self, idx):
+        '''Get the sorted token indexes of the subtree rooted at idx.'''
+        return np.sort(self._preorder[self._tin[idx]:self._tout[idx]]).tolist()
+
+    def is_ancestor(self, u, v):
+        '''Test if token u is an ancestor of token v, or v itself.'''
+        return self._tin[u] <= self._tin[v] < self._tout[u]
 
     @property
     def text(self):
-        span = IndexSpan(self, range(len(self._tokens)))
+        span = IndexSpan(self, range(len(self)))
         return span.text
 
     @property
     def text_with_ws(self):
-        span = IndexSpan(self, range(len(self._tokens)))
+        span = IndexSpan(self, range(len(self)))
         return span.text_with_ws
 
     @property
     def sents(self):
         for t in self._trees:
-            yield SubtreeSpan(self, t['dependencyEdge']['headTokenIndex'])
+            yield SubtreeSpan(self, t)
 
 
 def getGoogleNlpService():
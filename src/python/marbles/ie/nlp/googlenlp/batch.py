@@ -0,0 +1,241 @@
+# Batched Google NLP client with an on-disk annotation cache
+
+from __future__ import unicode_literals, print_function
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent import futures
+
+from . import getGoogleNlpService, getGoogleNlpRequestBody
+
+
+_logger = logging.getLogger(__name__)
+
+
+class AnnotationCache(object):
+    '''Content addressed cache of raw Google NLP annotation results. Entries are keyed by the
+    hash of the request body so a change of text or features is a cache miss.
+    '''
+
+    def __init__(self, path):
+        '''Constructor.
+
+        Args:
+            path: The cache directory. It is created if it does not exist.
+        '''
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    @staticmethod
+    def get_key(body):
+        '''Get the cache key of a request body.'''
+        return hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _get_filename(self, key):
+        return os.path.join(self.path, key[0:2], key + '.json')
+
+    def __contains__(self, key):
+        return os.path.exists(self._get_filename(key))
+
+    def get(self, key):
+        '''Get a cached result.
+
+        Returns:
+            The Google NLP result or None if the key is not in the cache.
+        '''
+        try:
+            with open(self._get_filename(key), 'rt') as fd:
+                return json.load(fd)
+        except (IOError, OSError):
+            return None
+
+    def put(self, key, result):
+        '''Save a result. The write is atomic so concurrent readers never see a partial file.'''
+        filename = self._get_filename(key)
+        dirname = os.path.dirname(filename)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Created by another thread
+                pass
+        fd, tmpname = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wt') as fp:
+            json.dump(result, fp)
+        os.rename(tmpname, filename)
+
+
+class RateLimiter(object):
+    '''Token bucket rate limiter shared between threads.'''
+
+    def __init__(self, rate, burst=None):
+        '''Constructor.
+
+        Args:
+            rate: Requests per second.
+            burst: Maximum number of requests in a burst. Defaults to rate.
+        '''
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self._tokens = self.capacity
+        self._stamp = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        '''Block until n requests are allowed.'''
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= min(n, self.capacity):
+                    # Large requests borrow from the future
+                    self._tokens -= n
+                    return
+                delay = (min(n, self.capacity) - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class BatchGoogleNLP(object):
+    '''Google NLP client which annotates many documents at once. Documents are grouped into
+    batch HTTP requests, the batches run concurrently, and raw results are cached on disk. The
+    service is only built on a cache miss so cached corpora can be processed offline.
+    '''
+
+    def __init__(self, cache=None, batch_size=20, max_workers=4, rate=10.0, retries=3, service_factory=None):
+        '''Constructor.
+
+        Args:
+            cache: Optional AnnotationCache instance or cache directory.
+            batch_size: Maximum number of documents per batch request.
+            max_workers: Number of concurrent batch requests.
+            rate: Maximum number of documents annotated per second.
+            retries: Number of retries for failed requests.
+            service_factory: Function returning a Google NLP service. Defaults to getGoogleNlpService.
+                The function is called once per worker thread because the service is not thread safe.
+        '''
+        if cache is not None and not isinstance(cache, AnnotationCache):
+            cache = AnnotationCache(cache)
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.retries = retries
+        self.limiter = RateLimiter(rate)
+        self._service_factory = service_factory or getGoogleNlpService
+        self._local = threading.local()
+        self.stats = {'cached': 0, 'requested': 0, 'failed': 0}
+        self._lock = threading.Lock()
+
+    def _get_service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._service_factory()
+            self._local.service = service
+        return service
+
+    def _annotate(self, batch):
+        # batch is a list of (key, body) tuples, returns a dictionary of key:result or key:exception
+        service = self._get_service()
+        results = {}
+        self.limiter.acquire(len(batch))
+        if len(batch) > 1:
+            def callback(request_id, response, exception):
+                results[request_id] = response if exception is None else exception
+
+            breq = service.new_batch_http_request(callback=callback)
+            for key, body in batch:
+                breq.add(service.documents().annotateText(body=body), request_id=key)
+            try:
+                breq.execute()
+            except Exception as e:
+                _logger.warning('batch annotateText failed, retrying documents individually - %s', str(e))
+
+        # Retry failures and missing responses one document at a time
+        for key, body in batch:
+            if key in results and not isinstance(results[key], Exception):
+                continue
+            if len(batch) > 1:
+                self.limiter.acquire(1)
+            try:
+                results[key] = service.documents().annotateText(body=body).execute(num_retries=self.retries)
+            except Exception as e:
+                results[key] = e
+
+        for key, result in results.iteritems():
+            if not isinstance(result, Exception) and self.cache is not None:
+                self.cache.put(key, result)
+        return results
+
+    def parse_many(self, texts):
+        '''Parse many texts and return the results as per Google NLP API spec.
+
+        Args:
+            texts: A sequence of texts to parse.
+
+        Returns:
+            A list of Google NLP results in the same order as texts.
+
+        Raises:
+            The first request error. Successful results are still cached.
+        '''
+        keys = []
+        pending = {}
+        results = {}
+        for text in texts:
+            body = getGoogleNlpRequestBody(text)
+            key = AnnotationCache.get_key(body)
+            keys.append(key)
+            if key in results or key in pending:
+                continue
+            result = self.cache.get(key) if self.cache is not None else None
+            if result is not None:
+                results[key] = result
+            else:
+                pending[key] = body
+
+        with self._lock:
+            self.stats['cached'] += len(results)
+            self.stats['requested'] += len(pending)
+
+        if len(pending) != 0:
+            items = pending.items()
+            batches = [items[i:i+self.batch_size] for i in range(0, len(items), self.batch_size)]
+            if len(batches) == 1:
+                results.update(self._annotate(batches[0]))
+            else:
+                executor = futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches)))
+                try:
+                    for r in executor.map(self._annotate, batches):
+                        results.update(r)
+                finally:
+                    executor.shutdown(wait=True)
+
+        errors = [x for x in results.itervalues() if isinstance(x, Exception)]
+        if len(errors) != 0:
+            with self._lock:
+                self.stats['failed'] += len(errors)
+            raise errors[0]
+        # Doc() modifies the result so duplicate texts get their own copy
+        seen = set()
+        output = []
+        for key in keys:
+            output.append(results[key] if key not in seen else json.loads(json.dumps(results[key])))
+            seen.add(key)
+        return output
+
+    def parse(self, text):
+        '''Parse text and return result as per Google NLP API spec. The result can be used to
+        construct a Doc instance.
+
+        Args:
+            text: The text to parse.
+
+        Returns:
+            A Google NLP result.
+        '''
+        return self.parse_many([text])[0]
@@ -0,0 +1,254 @@
+# Corpus level clause finder
+
+from __future__ import unicode_literals, print_function
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import timeit
+
+import googlenlp
+from clause import ClauseFinder
+from common import DELAY_SPACY_IMPORT
+
+if not DELAY_SPACY_IMPORT:
+    import spacynlp
+
+
+_logger = logging.getLogger(__name__)
+
+# Clause finder used by multiprocessing workers. Reused for every document a worker processes.
+_finder = None
+
+
+def get_span_indexes(span):
+    '''Get the token indexes of a span. Synthetic spans have no indexes.'''
+    return list(getattr(span, '_indexes', []))
+
+
+def clause_to_json(clause, sentence):
+    '''Convert a Clause to a json serializable dictionary.
+
+    Args:
+        clause: A Clause instance.
+        sentence: The sentence index within the document.
+    '''
+    return {
+        'sentence': sentence,
+        'type': clause.type,
+        'text': clause.text,
+        'subject': get_span_indexes(clause.subject),
+        'verb': get_span_indexes(clause.root),
+        'objects': [get_span_indexes(x) for x in clause.objects]
+    }
+
+
+def make_document(parser, payload):
+    '''Create a document.
+
+    Args:
+        parser: 'google' or 'spacy'.
+        payload: A Google NLP result for google, or the text for spacy.
+
+    Returns:
+        A googlenlp.Doc or spacy.Doc.
+    '''
+    if parser == 'google':
+        return googlenlp.Doc(payload)
+    elif parser == 'spacy':
+        if DELAY_SPACY_IMPORT:
+            import spacynlp
+        return spacynlp.parse(payload)
+    raise ValueError('unknown parser %s' % parser)
+
+
+def find_document_clauses(doc, finder=None):
+    '''Find the clauses in all sentences of a document.
+
+    Args:
+        doc: A googlenlp.Doc or spacy.Doc.
+        finder: Optional ClauseFinder to reuse.
+
+    Returns:
+        A list of dictionaries as returned by clause_to_json().
+    '''
+    if finder is None:
+        finder = ClauseFinder(doc)
+    else:
+        finder.reset(doc)
+    result = []
+    for k, sent in enumerate(doc.sents):
+        result.extend([clause_to_json(c, k) for c in finder.find_clauses(sent)])
+    return result
+
+
+def _run_document(item):
+    # Worker entry point. Returns (docid, clauses, error).
+    global _finder
+    parser, docid, payload = item
+    try:
+        doc = make_document(parser, payload)
+        if _finder is None:
+            _finder = ClauseFinder(doc)
+        return docid, find_document_clauses(doc, _finder), None
+    except Exception as e:
+        # A failed document must not leave the reused finder in a bad state
+        _finder = None
+        return docid, None, _error_string(e)
+
+
+def _error_string(e):
+    return '%s: %s' % (type(e).__name__, str(e))
+
+
+def annotate_documents(nlp, documents, failed, chunksize=100, completed=None):
+    '''Annotate text documents with Google NLP in bounded chunks, so annotation overlaps clause finding
+    and only one chunk of results is held in memory.
+
+    Args:
+        nlp: A googlenlp.batch.BatchGoogleNLP instance.
+        documents: An iterable of (docid, text) tuples.
+        failed: A list. Documents which cannot be annotated are appended as (docid, error), the same
+            as ClauseRunner.failed.
+        chunksize: Number of texts passed to nlp.parse_many() at a time.
+        completed: Optional set of document ids which are not annotated. These are yielded with a
+            None payload so ClauseRunner.run() can count them as skipped.
+
+    Yields:
+        A tuple (docid, Google NLP result) for ClauseRunner.run().
+    '''
+    completed = completed or set()
+    documents = iter(documents)
+    while True:
+        chunk = list(itertools.islice(documents, max(1, chunksize)))
+        if len(chunk) == 0:
+            break
+        pending = [x for x in chunk if x[0] not in completed]
+        try:
+            results = dict(zip([x[0] for x in pending], nlp.parse_many([x[1] for x in pending])))
+        except Exception:
+            # parse_many() raises the first error, successful results are cached. Retry one document at
+            # a time to find the failed documents.
+            results = {}
+            for docid, text in pending:
+                try:
+                    results[docid] = nlp.parse_many([text])[0]
+                except Exception as e:
+                    _logger.warning('document %s annotation failed - %s', docid, str(e))
+                    failed.append((docid, _error_string(e)))
+        for docid, _ in chunk:
+            if docid in completed:
+                yield docid, None
+            elif docid in results:
+                yield docid, results[docid]
+
+
+def read_completed(outfile):
+    '''Read the document ids in a clause output file. A partial last line, left by an interrupted
+    run, is truncated so the file can be appended.
+
+    Args:
+        outfile: The JSON lines output file.
+
+    Returns:
+        A set of document ids.
+    '''
+    completed = set()
+    if not os.path.exists(outfile):
+        return completed
+    good = 0
+    with open(outfile, 'rb') as fd:
+        for line in fd:
+            try:
+                completed.add(json.loads(line)['id'])
+            except (ValueError, KeyError):
+                break
+            good += len(line)
+    if good != os.path.getsize(outfile):
+        _logger.warning('truncating partial output in %s at byte %d', outfile, good)
+        with open(outfile, 'r+b') as fd:
+            fd.truncate(good)
+    return completed
+
+
+class ClauseRunner(object):
+    '''Find clauses in a corpus. Documents are distributed over a process pool, each worker
+    reuses one ClauseFinder, and results are streamed to a JSON lines file with one line per
+    document.
+    '''
+
+    def __init__(self, parser='google', processes=None, chunksize=4):
+        '''Constructor.
+
+        Args:
+            parser: 'google' or 'spacy'. Google documents are Google NLP results, spacy documents are text.
+            processes: Number of worker processes. Default is the cpu count. If 1 run in this process.
+            chunksize: Number of documents sent to a worker at a time.
+        '''
+        if parser not in ['google', 'spacy']:
+            raise ValueError('unknown parser %s' % parser)
+        self.parser = parser
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = max(1, chunksize)
+        self.documents = 0
+        self.clauses = 0
+        self.skipped = 0
+        self.failed = []
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        '''Clauses per second.'''
+        return 0.0 if self.elapsed == 0.0 else self.clauses / self.elapsed
+
+    def _iter_items(self, documents, completed):
+        for docid, payload in documents:
+            if docid in completed:
+                self.skipped += 1
+                continue
+            yield self.parser, docid, payload
+
+    def run(self, documents, outfile, resume=True, report_every=1000):
+        '''Find clauses and write them to outfile.
+
+        Args:
+            documents: An iterable of (docid, payload) tuples. Document ids must be json serializable.
+            outfile: The JSON lines output file.
+            resume: If True skip documents already in outfile, else overwrite outfile.
+            report_every: Log throughput after this many documents.
+        '''
+        completed = read_completed(outfile) if resume else set()
+        start = timeit.default_timer() - self.elapsed
+        items = self._iter_items(documents, completed)
+        pool = None
+        if self.processes == 1:
+            results = itertools.imap(_run_document, items)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            results = pool.imap_unordered(_run_document, items, self.chunksize)
+        try:
+            with open(outfile, 'ab' if resume else 'wb') as fd:
+                for docid, clauses, error in results:
+                    if error is not None:
+                        _logger.warning('document %s failed - %s', docid, error)
+                        self.failed.append((docid, error))
+                        continue
+                    line = json.dumps({'id': docid, 'clauses': clauses}, ensure_ascii=True)
+                    fd.write(line.encode('utf-8') + b'\n')
+                    self.documents += 1
+                    self.clauses += len(clauses)
+                    if self.documents % report_every == 0:
+                        fd.flush()
+                        self.elapsed = timeit.default_timer() - start
+                        _logger.info('%d documents, %d clauses, %.1f clauses/second', self.documents,
+                                     self.clauses, self.throughput)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            self.elapsed = timeit.default_timer() - start
+
+    def print_report(self):
+        print('%d documents, %d skipped, %d failed' % (self.documents, self.skipped, len(self.failed)))
+        print('%d clauses in %.2f seconds, %.1f clauses/second' % (self.clauses, self.elapsed, self.throughput))
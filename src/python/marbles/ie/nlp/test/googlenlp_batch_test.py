@@ -0,0 +1,109 @@
+from __future__ import unicode_literals, print_function
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from marbles.ie.nlp import googlenlp
+from marbles.ie.nlp.googlenlp.batch import BatchGoogleNLP, AnnotationCache
+
+
+JSONFILE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'google_testdata.json')
+
+
+class RecordedRequest(object):
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self, num_retries=0):
+        return self.service.respond(self.body)
+
+
+class RecordedBatch(object):
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            text = request.body['document']['content']
+            if text in self.service.fail_once:
+                self.service.fail_once.remove(text)
+                self.callback(request_id, None, IOError('rate limit exceeded'))
+            else:
+                self.callback(request_id, request.execute(), None)
+
+
+class RecordedService(object):
+    '''Replays Google NLP responses recorded in google_testdata.json.'''
+
+    def __init__(self, recordings, fail_once=None):
+        self.recordings = recordings
+        self.fail_once = set(fail_once or [])
+        self.batches = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def documents(self):
+        return self
+
+    def annotateText(self, body):
+        return RecordedRequest(self, body)
+
+    def new_batch_http_request(self, callback):
+        return RecordedBatch(self, callback)
+
+    def respond(self, body):
+        with self.lock:
+            self.calls += 1
+        return self.recordings[body['document']['content']]
+
+
+class BatchGoogleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with open(JSONFILE_NAME, 'rt') as fd:
+            problems = json.load(fd)
+        self.recordings = dict([(p['sentence'], p['google']) for p in problems])
+        self.texts = self.recordings.keys()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test1_BatchAndCache(self):
+        service = RecordedService(self.recordings, fail_once=self.texts[:2])
+        nlp = BatchGoogleNLP(cache=self.path, batch_size=4, max_workers=3, rate=1000,
+                             service_factory=lambda: service)
+        results = nlp.parse_many(self.texts + self.texts[:1])
+        self.assertEqual(len(self.texts) + 1, len(results))
+        self.assertTrue(all([x <= 4 for x in service.batches]))
+        self.assertEqual(sum(service.batches), len(self.texts))
+        # Two failed documents were retried individually
+        self.assertEqual(len(self.texts) - 2 + 2, service.calls)
+        for text, result in zip(self.texts, results):
+            doc = googlenlp.Doc(result)
+            self.assertEqual(googlenlp.Doc(self.recordings[text]).text, doc.text)
+        self.assertIsNot(results[0], results[-1])
+
+        # Rebuild offline from the cache
+        def offline():
+            raise RuntimeError('service not available')
+
+        nlp = BatchGoogleNLP(cache=AnnotationCache(self.path), service_factory=offline)
+        results = nlp.parse_many(self.texts)
+        self.assertEqual(len(self.texts), nlp.stats['cached'])
+        self.assertEqual(0, nlp.stats['requested'])
+        self.assertEqual(googlenlp.Doc(self.recordings[self.texts[3]]).text, googlenlp.Doc(results[3]).text)
+
+
+if __name__ == '__main__':
+    unittest.main()
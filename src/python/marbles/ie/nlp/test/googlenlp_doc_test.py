@@ -0,0 +1,51 @@
+from __future__ import unicode_literals, print_function
+import json
+import os
+import unittest
+
+from marbles.ie.nlp import googlenlp
+
+
+JSONFILE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'google_testdata.json')
+
+
+class GoogleDocTest(unittest.TestCase):
+    """Test the compiled googlenlp.Doc against the raw Google NLP json."""
+
+    def setUp(self):
+        with open(JSONFILE_NAME, 'rt') as fd:
+            self.problems = json.load(fd)
+
+    def test1_Compiled(self):
+        for p in self.problems:
+            result = p['google']
+            doc = googlenlp.Doc(result)
+            self.assertEqual(len(result['tokens']), len(doc))
+            for t, gtok in zip(doc, result['tokens']):
+                self.assertEqual(gtok['text']['content'], t.text)
+                self.assertEqual(gtok['lemma'], t.lemma)
+                self.assertEqual(gtok['dependencyEdge']['label'], t.dep.text)
+                self.assertEqual(gtok['partOfSpeech']['tag'], t.pos.text)
+                self.assertEqual(gtok['dependencyEdge']['headTokenIndex'], t.head.i)
+                self.assertEqual(gtok['partOfSpeech']['tag'] == 'PUNCT', t.is_punct)
+                # Tokens are views and are not created per access
+                self.assertIs(t, doc[t.i])
+
+    def test2_Subtree(self):
+        for p in self.problems:
+            doc = googlenlp.Doc(p['google'])
+            for t in doc:
+                # Walk the children
+                expected = [t.i]
+                stk = [t]
+                while len(stk) != 0:
+                    for c in stk.pop().children:
+                        expected.append(c.i)
+                        stk.append(c)
+                self.assertListEqual(sorted(expected), [x.i for x in t.subtree])
+                for j in range(len(doc)):
+                    self.assertEqual(j in expected, t.is_ancestor(doc[j]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+from __future__ import unicode_literals, print_function
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from marbles.ie.nlp import googlenlp
+from marbles.ie.nlp.clause import ClauseFinder
+from marbles.ie.nlp.runner import ClauseRunner, annotate_documents, find_document_clauses
+
+
+JSONFILE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'google_testdata.json')
+
+
+class MockedNLP(object):
+    '''Returns stored results for texts. Raises for the text 'bad' like BatchGoogleNLP.parse_many().'''
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def parse_many(self, texts):
+        self.calls.append(len(texts))
+        if 'bad' in texts:
+            raise IOError('request failed')
+        return [self.results[t] for t in texts]
+
+
+class ClauseRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.outfile = os.path.join(self.path, 'clauses.jsonl')
+        with open(JSONFILE_NAME, 'rt') as fd:
+            problems = json.load(fd)
+        self.documents = [(i, p['google']) for i, p in enumerate(problems)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def read_output(self):
+        with open(self.outfile, 'rt') as fd:
+            return dict([(x['id'], x['clauses']) for x in map(json.loads, fd.readlines())])
+
+    def test1_Reuse(self):
+        # A reused finder must give the same result as a finder per document
+        finder = None
+        for _, result in self.documents + list(reversed(self.documents)):
+            doc = googlenlp.Doc(result)
+            expected = find_document_clauses(doc)
+            if finder is None:
+                finder = ClauseFinder(doc)
+            self.assertListEqual(expected, find_document_clauses(doc, finder))
+
+    def test2_ParallelResume(self):
+        expected = dict([(i, find_document_clauses(googlenlp.Doc(r))) for i, r in self.documents])
+        runner = ClauseRunner('google', processes=2)
+        runner.run(self.documents[0:10], self.outfile)
+        self.assertEqual(10, runner.documents)
+        # Simulate an interrupted write
+        with open(self.outfile, 'ab') as fd:
+            fd.write(b'{"id": 10, "clau')
+
+        runner = ClauseRunner('google', processes=2)
+        runner.run(self.documents, self.outfile)
+        self.assertEqual(10, runner.skipped)
+        self.assertEqual(len(self.documents) - 10, runner.documents)
+        self.assertEqual(0, len(runner.failed))
+        actual = self.read_output()
+        self.assertEqual(len(self.documents), len(actual))
+        for i, clauses in expected.iteritems():
+            self.assertListEqual(clauses, actual[i])
+        self.assertEqual(sum([len(x) for x in expected.itervalues()]) - runner.clauses,
+                         sum([len(actual[i]) for i in range(10)]))
+
+    def test3_AnnotateChunks(self):
+        texts = dict([('text%d' % i, r) for i, r in self.documents])
+        nlp = MockedNLP(texts)
+        lines = ['text%d' % i for i, _ in self.documents]
+        lines.insert(3, 'bad')
+        failed = []
+        documents = annotate_documents(nlp, enumerate(lines), failed, chunksize=4, completed=set([0]))
+        # Nothing is annotated until the runner asks for a document
+        self.assertListEqual([], nlp.calls)
+        self.assertEqual((0, None), next(documents))
+        self.assertEqual(3, nlp.calls[0])
+        runner = ClauseRunner('google', processes=1)
+        runner.failed = failed
+        runner.run(documents, self.outfile)
+        self.assertTrue(all([n <= 4 for n in nlp.calls]))
+        self.assertListEqual([3], [x[0] for x in runner.failed])
+        self.assertEqual(len(lines) - 2, runner.documents)
+        actual = self.read_output()
+        self.assertEqual(len(lines) - 2, len(actual))
+        self.assertListEqual(find_document_clauses(googlenlp.Doc(self.documents[-1][1])), actual[len(lines) - 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
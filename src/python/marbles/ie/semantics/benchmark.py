@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the composition rules used by Ccg2Drs."""
+
+from __future__ import unicode_literals, print_function
+
+import gc
+import logging
+import timeit
+
+from marbles import future_string
+from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation
+from marbles.ie.ccg.utils import pt_to_utf8
+from marbles.ie.core.constants import CO_FAST_RENAME, CO_NO_VERBNET, CO_NO_WIKI_SEARCH
+from marbles.ie.semantics.ccg import Ccg2Drs
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+
+def _traced_bytes():
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _gc_objects():
+    # Incremented when a container object is allocated and decremented when one is released. A collection
+    # resets the count so the collector must be disabled while measuring.
+    return gc.get_count()[0]
+
+
+class RuleStats(object):
+    """Accumulated cost of a composition rule."""
+
+    def __init__(self, count=0, elapsed=0.0, alloc=0):
+        self.count = count
+        self.elapsed = elapsed
+        self.alloc = alloc
+
+    @property
+    def mean(self):
+        """Mean time per dispatch in seconds."""
+        return 0.0 if self.count == 0 else self.elapsed / self.count
+
+    def get_json(self):
+        return {
+            'count': self.count,
+            'elapsed': self.elapsed,
+            'mean': self.mean,
+            'alloc': self.alloc
+        }
+
+    @classmethod
+    def from_json(cls, d):
+        return RuleStats(d['count'], d['elapsed'], d['alloc'])
+
+
+class _ProfilingCcg2Drs(Ccg2Drs):
+    """Ccg2Drs with timed rule dispatch."""
+
+    def __init__(self, stats, options=0, alloc_counter=None):
+        super(_ProfilingCcg2Drs, self).__init__(options)
+        self.stats = stats
+        self.alloc_counter = alloc_counter
+
+    def _dispatch(self, op, stk):
+        stats = self.stats.get(op.rule.rulename)
+        if stats is None:
+            stats = RuleStats()
+            self.stats[op.rule.rulename] = stats
+        alloc = self.alloc_counter() if self.alloc_counter else 0
+        start = timeit.default_timer()
+        super(_ProfilingCcg2Drs, self)._dispatch(op, stk)
+        stats.elapsed += timeit.default_timer() - start
+        stats.count += 1
+        if self.alloc_counter:
+            stats.alloc += self.alloc_counter() - alloc
+
+
+class ComposeBenchmark(object):
+    """Replay the execution queues of ccgbank derivations through Ccg2Drs._dispatch and accumulate the
+    count, time, and net allocations, per rule.
+    """
+
+    def __init__(self, options=CO_FAST_RENAME | CO_NO_VERBNET | CO_NO_WIKI_SEARCH, trace_alloc=False):
+        """Constructor.
+
+        Args:
+            options: Compose options passed to Ccg2Drs.
+            trace_alloc: If True track net allocations per rule. Bytes are tracked with tracemalloc when it
+                is available (python 3.4 or later). Otherwise the number of container objects is tracked with
+                the garbage collector counts, and the collector is disabled while each derivation is composed.
+                See alloc_unit.
+        """
+        self.options = options
+        self.trace_alloc = trace_alloc
+        self.alloc_unit = None
+        self._alloc_counter = None
+        self.stats = {}
+        self.derivations = 0
+        self.elapsed = 0.0
+        self.failed = []
+        self.slowest = []
+        if trace_alloc:
+            if tracemalloc is not None:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                self.alloc_unit = 'bytes'
+                self._alloc_counter = _traced_bytes
+            else:
+                self.alloc_unit = 'objects'
+                self._alloc_counter = _gc_objects
+
+    def run_derivation(self, ccgbank, uid=None):
+        """Run a single derivation.
+
+        Args:
+            ccgbank: A ccgbank derivation string.
+            uid: An optional identifier for the derivation. Used to report failures and slow derivations.
+
+        Returns:
+            True on success.
+        """
+        uid = uid or ccgbank
+        try:
+            pt = parse_ccg_derivation(ccgbank)
+            if future_string != unicode:
+                pt = pt_to_utf8(pt)
+            ccg = _ProfilingCcg2Drs(self.stats, self.options, self._alloc_counter)
+            ccg.build_execution_sequence(pt)
+        except Exception as e:
+            _logger.exception(e)
+            self.failed.append(uid)
+            return False
+
+        gcenabled = self.alloc_unit == 'objects' and gc.isenabled()
+        if gcenabled:
+            gc.disable()
+        start = timeit.default_timer()
+        try:
+            ccg.create_drs()
+        except Exception as e:
+            _logger.exception(e)
+            self.failed.append(uid)
+            return False
+        finally:
+            if gcenabled:
+                gc.enable()
+        elapsed = timeit.default_timer() - start
+        self.elapsed += elapsed
+        self.derivations += 1
+        self.slowest.append((elapsed, uid))
+        if len(self.slowest) > 20:
+            self.slowest = sorted(self.slowest, reverse=True)[0:10]
+        return True
+
+    def run(self, derivations, limit=None):
+        """Run a sequence of derivations.
+
+        Args:
+            derivations: An iterable of (uid, ccgbank) tuples.
+            limit: Optional maximum number of derivations to run.
+        """
+        for uid, ccgbank in derivations:
+            if limit is not None and self.derivations >= limit:
+                break
+            self.run_derivation(ccgbank, uid)
+
+    def get_slowest(self, n=10):
+        """Get the slowest derivations.
+
+        Returns:
+            A list of (elapsed, uid) tuples.
+        """
+        return sorted(self.slowest, reverse=True)[0:n]
+
+    def get_json(self, label=None):
+        """Get the results as a json serializable dictionary.
+
+        Args:
+            label: Optional label, for example the commit id.
+        """
+        dispatched = sum([x.elapsed for x in self.stats.itervalues()])
+        return {
+            'label': label,
+            'derivations': self.derivations,
+            'failed': len(self.failed),
+            'elapsed': self.elapsed,
+            'alloc_unit': self.alloc_unit,
+            'lexical': self.elapsed - dispatched,
+            'rules': dict([(k, v.get_json()) for k, v in self.stats.iteritems()]),
+            'slowest': [{'uid': uid, 'elapsed': t} for t, uid in self.get_slowest()]
+        }
+
+    def print_report(self, stream=None):
+        """Print a table of per rule costs, most expensive first."""
+        scale = 1024.0 if self.alloc_unit == 'bytes' else 1.0
+        lines = ['%-10s %10s %12s %12s %12s' % ('rule', 'count', 'total(ms)', 'mean(us)',
+                                                'alloc(obj)' if self.alloc_unit == 'objects' else 'alloc(kB)')]
+        for k, v in sorted(self.stats.iteritems(), key=lambda x: -x[1].elapsed):
+            lines.append('%-10s %10d %12.2f %12.2f %12.1f' % (k, v.count, 1000.0 * v.elapsed, 1000000.0 * v.mean,
+                                                              v.alloc / scale))
+        lines.append('%d derivations, %d failed, %.2f seconds in create_drs' % (self.derivations, len(self.failed),
+                                                                                 self.elapsed))
+        for t, uid in self.get_slowest():
+            lines.append('  %8.2f ms %s' % (1000.0 * t, uid))
+        text = '\n'.join(lines)
+        if stream is None:
+            print(text)
+        else:
+            stream.write(text)
+            stream.write('\n')
+
+
+def compare_benchmarks(base, current):
+    """Compare two benchmark results returned from ComposeBenchmark.get_json().
+
+    Args:
+        base: The baseline result.
+        current: The result to compare against the baseline.
+
+    Returns:
+        A list of (rule, base-mean, current-mean, ratio) tuples sorted by decreasing ratio. The ratio is
+        current-mean/base-mean so values greater than one are regressions.
+    """
+    result = []
+    for k, v in current['rules'].iteritems():
+        if k not in base['rules']:
+            continue
+        b = RuleStats.from_json(base['rules'][k])
+        c = RuleStats.from_json(v)
+        if b.mean == 0.0:
+            continue
+        result.append((k, b.mean, c.mean, c.mean / b.mean))
+    return sorted(result, key=lambda x: -x[3])
@@ -15,10 +15,11 @@ from marbles.ie.ccg.model import MODEL, UCONJ, UnaryRule
 from marbles.ie.ccg.utils import pt_to_utf8
 from marbles.ie.core import constituent_types as ct
 from marbles.ie.core.constants import *
+from marbles.ie.core.headindex import HeadIndex
 from marbles.ie.core.sentence import Sentence, Span, Constituent
 from marbles.ie.core.exception import UnaryRuleError
 from marbles.ie.drt.common import DRSVar
-from marbles.ie.drt.drs import DRS, DRSRef, Rel, DRSRelation
+from marbles.ie.drt.drs import DRS, DRSRef, Rel, DRSRelation, ConditionTable
 from marbles.ie.drt.utils import remove_dups
 from marbles.ie.semantics.compose import ProductionList, FunctorProduction, DrsProduction, identity_functor
 from marbles.ie.semantics.lexeme import Lexeme
@@ -161,13 +162,36 @@ _UNDEFINED_UNARY = set()
 
 
 def save_undefined_unary_rules(path):
-    """Save missing unary rules to a file."""
+    """Save missing unary rules to a file. Rules are sorted so the output does not depend on the order
+    in which they were found.
+    """
     global _UNDEFINED_UNARY
     if len(_UNDEFINED_UNARY) == 0:
         return
     with open(path, 'w') as fp:
-        for rule in _UNDEFINED_UNARY:
-            fp.write('%s %s\n' % rule)
+        for rule in sorted(['%s %s\n' % rule for rule in _UNDEFINED_UNARY]):
+            fp.write(rule)
+
+
+def get_undefined_unary_rules():
+    """Get the missing unary rules found so far.
+
+    Returns:
+        A set of (result-category, argument-category) signature tuples.
+    """
+    global _UNDEFINED_UNARY
+    return set([(r.signature, a.signature) for r, a in _UNDEFINED_UNARY])
+
+
+def add_undefined_unary_rules(rules):
+    """Add missing unary rules found elsewhere, for example in a worker process.
+
+    Args:
+        rules: An iterable of (result-category, argument-category) signature tuples.
+    """
+    global _UNDEFINED_UNARY
+    for r, a in rules:
+        _UNDEFINED_UNARY.add((Category.from_cache(r), Category.from_cache(a)))
 
 
 ## @ingroup gfn
@@ -1198,6 +1222,9 @@ class Ccg2Drs(Sentence):
 
     def create_drs(self):
         """Create a DRS from the execution queue. Must call build_execution_sequence() first."""
+        # Heads are final once the execution sequence is built
+        self.build_head_index()
+
         # First create all productions up front
         prods = [None] * len(self.lexemes)
         for i in range(len(self.lexemes)):
@@ -1467,23 +1494,22 @@ class Ccg2Drs(Sentence):
             idxs_to_del = set(to_remove.get_indexes())
 
             # Find the sentence head
-            sentence_head = 0
-            while self.lexemes[sentence_head].head != sentence_head:
-                sentence_head = self.lexemes[sentence_head].head
+            rebuild = self.head_index is not None
+            hindex = self.head_index if rebuild else HeadIndex([lex.head for lex in self.lexemes])
+            sentence_head = hindex.get_root(0)
 
             # Only allow deletion if it has a single child, otherwise we get multiple sentence heads
             if sentence_head in idxs_to_del and len(filter(lambda lex: lex.head == sentence_head, self.lexemes)) != 2:
                 idxs_to_del.remove(sentence_head)
 
-            # Reparent heads marked for deletion
+            # Reparent heads marked for deletion to the nearest ancestor which is kept
+            nearest = hindex.get_nearest_ancestors(set(range(len(self.lexemes))).difference(idxs_to_del))
             for lex in itertools.ifilter(lambda x: x.idx not in idxs_to_del, self.lexemes):
-                lasthead = -1
-                while lex.head in idxs_to_del and lex.head != lasthead:
-                    lasthead = lex.head
-                    lex.head = self.lexemes[lex.head].head
                 if lex.head in idxs_to_del:
-                    # New head for sentence
-                    lex.head = lex.idx
+                    # No ancestor means a new head for sentence
+                    lex.head = nearest[lex.idx] if nearest[lex.idx] >= 0 else lex.idx
+            # Heads have changed
+            self.invalidate_head_index()
 
             idxmap = map(lambda x: -1 if x in idxs_to_del else counter(), range(len(self.lexemes)))
             for c in self.constituents:
@@ -1505,9 +1531,21 @@ class Ccg2Drs(Sentence):
                                        filter(lambda x: idxmap[x] >= 0, self.final_prod.span.get_indexes())))
                 self.final_prod.span = pspan
 
+            if rebuild:
+                self.build_head_index()
             self.map_heads_to_constituents()
 
-    def get_drs(self, nodups=False):
+    def get_drs(self, nodups=False, table=None):
+        """Get the sentence DRS.
+
+        Args:
+            nodups: If True remove duplicate referents and conditions.
+            table: Optional ConditionTable shared by the sentences of a document. Conditions already in the
+                table are removed and the remaining conditions are added. Implies nodups.
+
+        Returns:
+            A DRS instance.
+        """
         refs = []
         conds = []
         for w in self.lexemes:
@@ -1515,22 +1553,13 @@ class Ccg2Drs(Sentence):
                 refs.extend(w.drs.universe)
                 conds.extend(w.drs.conditions)
         conds.extend(self.drs_extra)
-        if not nodups:
+        if not nodups and table is None:
             return DRS(refs, conds)
-        cs = set(conds)
-        rs = set(refs)
         # Remove dups but keep ordering. Ordering is not necessary but makes it easier to read.
-        nrefs = []
-        nconds = []
-        for r in refs:
-            if r in rs:
-                rs.remove(r)
-                nrefs.append(r)
-        for c in conds:
-            if c in cs:
-                cs.remove(c)
-                nconds.append(c)
-        return DRS(nrefs, nconds)
+        # Conditions use the cached structural hash so each is a single lookup.
+        if table is None:
+            table = ConditionTable()
+        return DRS(remove_dups(refs), table.unique(conds))
 
     def final_rename(self):
         """Rename to ensure:
@@ -2008,6 +2037,7 @@ def process_ccg_pt(pt, options=0, browser=None):
 
     See Also:
         marbles.ie.drt.parse.parse_ccg_derivation()
+        marbles.ie.semantics.discourse.DiscourseBuilder to combine sentences into a document DRS.
     """
     ccg = Ccg2Drs(options | CO_FAST_RENAME)
     if future_string != unicode:
@@ -2048,23 +2078,17 @@ class TestSentence(Sentence):
 
 
 ## @ingroup gfn
-def extract_lexicon_from_pt(pt, dictionary=None, uid=None):
-    """Extract the lexicon and templates from a CCG parse tree.
+def iter_lexicon_from_pt(pt):
+    """Iterate the lexicon entries of a CCG parse tree.
 
     Args:
         pt: The parse tree returned from marbles.ie.drt.parse.parse_ccg_derivation().
-        dictionary: An optional dictionary of a existing lexicon.
-        uid: A unique identifier string for the sentence.
-    Returns:
-        A dictionary of functor instances.
-    """
 
+    Yields:
+        A tuple of the dictionary index (0-26), the stem, and the usage string, in parse tree order.
+    """
     if future_string != unicode:
         pt = pt_to_utf8(pt)
-    if dictionary is None:
-        dictionary = map(lambda x: {}, [None]*27)
-    if uid is None:
-        uid = ''
 
     stk = [pt]
     while len(stk) != 0:
@@ -2099,10 +2123,29 @@ def extract_lexicon_from_pt(pt, dictionary=None, uid=None):
             rel = DRSRelation(lexeme.stem)
             c = filter(lambda x: isinstance(x, Rel) and x.relation == rel, lexeme.drs.conditions)
             if len(c) == 1:
-                c = future_string(c[0]) + ': ' + template.predarg_category.signature
-                di = dictionary[idx].setdefault(lexeme.stem, {})
-                si = di.setdefault(c, set())
-                si.add(uid)
+                yield idx, lexeme.stem, future_string(c[0]) + ': ' + template.predarg_category.signature
+
+
+## @ingroup gfn
+def extract_lexicon_from_pt(pt, dictionary=None, uid=None):
+    """Extract the lexicon and templates from a CCG parse tree.
+
+    Args:
+        pt: The parse tree returned from marbles.ie.drt.parse.parse_ccg_derivation().
+        dictionary: An optional dictionary of a existing lexicon.
+        uid: A unique identifier string for the sentence.
+    Returns:
+        A dictionary of functor instances.
+    """
+    if dictionary is None:
+        dictionary = map(lambda x: {}, [None]*27)
+    if uid is None:
+        uid = ''
+
+    for idx, stem, c in iter_lexicon_from_pt(pt):
+        di = dictionary[idx].setdefault(stem, {})
+        si = di.setdefault(c, set())
+        si.add(uid)
 
     return dictionary
 
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Incremental document DRS construction from sentence DRS's."""
+
+from __future__ import unicode_literals, print_function
+
+import bisect
+
+from marbles.ie.core.constants import RT_EVENT
+from marbles.ie.drt.common import DRSVar
+from marbles.ie.drt.drs import DRS, DRSRef, ConditionTable
+
+
+def _mask_bits(mask):
+    """Split a type mask into single bit masks."""
+    bits = []
+    while mask:
+        b = mask & -mask
+        bits.append(b)
+        mask ^= b
+    return bits
+
+
+class DiscourseBuilder(object):
+    """Appends sentence DRS's to a growing document DRS.
+
+    Each sentence is processed independently so variable numbering restarts at every sentence. Rather than
+    alpha convert each sentence against the whole document, the variables of a sentence are shifted past
+    the largest index used so far. Constants are not renamed so a proper name is the same referent in all
+    sentences.
+
+    Referents in the top level universe of a sentence remain accessible to later sentences. These are indexed
+    by the bits of their type mask (RT_HUMAN, RT_MALE, etc.). Each bit maps to a sorted list of positions so
+    anaphora candidates are found by intersecting these lists instead of rescanning the discourse.
+
+    Remarks:
+        Referents are numbered by position in the document, starting at zero, in the order they were added.
+    """
+
+    def __init__(self, nodups=True):
+        """Constructor.
+
+        Args:
+            nodups: If True duplicate conditions are removed across the whole document.
+        """
+        self.nodups = nodups
+        self.table = ConditionTable() if nodups else None
+        self.universe = []
+        self.conditions = []
+        # List of (first position, variable offset) for each sentence
+        self.sentences = []
+        self._limit = -1
+        self._entries = []
+        self._positions = {}
+        self._index = {0: []}
+        self._drs = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_drs(self, d, masks=None):
+        """Append a sentence DRS to the document.
+
+        Args:
+            d: A DRS instance. The sentence is not modified.
+            masks: Optional dictionary mapping referents in the universe of `d` to their RT_? type mask.
+
+        Returns:
+            The sentence DRS with variables shifted into the document namespace.
+        """
+        vx = [r for r in d.variables if not r.isconst]
+        shift = 0
+        if len(vx) != 0:
+            shift = max(0, self._limit + 1 - min([r.var.idx for r in vx]))
+            self._limit = max(self._limit, shift + max([r.var.idx for r in vx]))
+        if shift != 0:
+            vm = dict([(r, DRSRef(DRSVar(r.var.name, r.var.idx + shift))) for r in vx])
+            sd = d.map_refs(vm)
+        else:
+            vm = {}
+            sd = d
+
+        self.sentences.append((len(self._entries), shift))
+        sentence = len(self.sentences) - 1
+        masks = masks or {}
+        for r in d.universe:
+            # The map values are the referents used in sd
+            nr = vm.get(r, r)
+            if nr.var.to_string() not in self._positions:
+                self._add_entry(nr, masks.get(r, 0), sentence)
+                self.universe.append(nr)
+        if self.table is not None:
+            self.conditions.extend(self.table.unique(sd.conditions))
+        else:
+            self.conditions.extend(sd.conditions)
+        self._drs = None
+        return sd
+
+    def add_sentence(self, ccg):
+        """Append a sentence to the document.
+
+        Args:
+            ccg: A marbles.ie.semantics.ccg.Ccg2Drs instance, typically the result of process_ccg_pt().
+
+        Returns:
+            The sentence DRS with variables shifted into the document namespace.
+        """
+        d = ccg.get_drs(nodups=self.nodups)
+        # Map variables to type, same as Ccg2Drs.final_rename()
+        masks = {}
+        for lx in ccg.lexemes:
+            if lx.drs and len(lx.drs.universe) != 0:
+                masks[lx.refs[0]] = masks.get(lx.refs[0], 0) | lx.mask
+        return self.add_drs(d, masks)
+
+    def _add_entry(self, ref, mask, sentence):
+        pos = len(self._entries)
+        self._entries.append((ref, mask, sentence))
+        self._positions[ref.var.to_string()] = pos
+        # Positions are appended in increasing order so each list is sorted
+        self._index[0].append(pos)
+        for b in _mask_bits(mask):
+            self._index.setdefault(b, []).append(pos)
+
+    def get_drs(self):
+        """Get the document DRS.
+
+        Returns:
+            A DRS instance.
+        """
+        if self._drs is None:
+            self._drs = DRS(list(self.universe), list(self.conditions))
+        return self._drs
+
+    def get_position(self, ref):
+        """Get the document position of an accessible referent.
+
+        Args:
+            ref: A DRSRef instance in the document namespace.
+
+        Returns:
+            The position or -1 if the referent is not accessible.
+        """
+        return self._positions.get(ref.var.to_string(), -1)
+
+    def get_mask(self, ref):
+        """Get the type mask of an accessible referent.
+
+        Args:
+            ref: A DRSRef instance in the document namespace.
+
+        Returns:
+            The RT_? mask or 0 if the referent is not accessible.
+        """
+        pos = self.get_position(ref)
+        return 0 if pos < 0 else self._entries[pos][1]
+
+    def get_sentence_refs(self, sentence):
+        """Get the accessible referents introduced by a sentence.
+
+        Args:
+            sentence: The sentence index.
+
+        Returns:
+            A list of DRSRef instances.
+        """
+        start = self.sentences[sentence][0]
+        end = self.sentences[sentence+1][0] if sentence+1 < len(self.sentences) else len(self._entries)
+        return [self._entries[i][0] for i in range(start, end)]
+
+    def find_candidates(self, mask, exclude=RT_EVENT, before=None, limit=None):
+        """Find accessible referents with all bits of `mask` set, most recent first.
+
+        The position lists of the bits in `mask` are intersected by leapfrogging: each step binary searches a
+        list for the largest position not after the current one. A step costs O(log n) and each step either
+        finds a candidate or skips a range of positions missing from some list. Candidates with an excluded
+        bit are skipped one at a time so `exclude` should be a rare property.
+
+        Args:
+            mask: The RT_? bits a candidate must have. If 0 all referents match.
+            exclude: The RT_? bits a candidate must not have.
+            before: Optional position or DRSRef. Only referents added before it are returned.
+            limit: Optional maximum number of candidates.
+
+        Returns:
+            A list of DRSRef instances.
+        """
+        if before is None:
+            end = len(self._entries)
+        elif isinstance(before, DRSRef):
+            end = self.get_position(before)
+            if end < 0:
+                end = len(self._entries)
+        else:
+            end = before
+
+        # Shortest list first so it drives the search
+        lists = sorted([self._index.get(b, []) for b in _mask_bits(mask)] or [self._index[0]], key=len)
+        result = []
+        pos = end - 1
+        while pos >= 0 and (limit is None or len(result) < limit):
+            # Find the largest position <= pos present in every list
+            matched = 0
+            k = 0
+            while matched < len(lists):
+                lst = lists[k]
+                i = bisect.bisect_right(lst, pos) - 1
+                if i < 0:
+                    return result
+                if lst[i] == pos:
+                    matched += 1
+                else:
+                    pos = lst[i]
+                    matched = 1
+                k = (k + 1) % len(lists)
+            ref, m, _ = self._entries[pos]
+            if 0 == (m & exclude):
+                result.append(ref)
+            pos -= 1
+        return result
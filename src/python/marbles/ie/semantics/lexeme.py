@@ -441,7 +441,7 @@ class Lexeme(AbstractLexeme):
         d.set_lambda_refs(map(lambda x: nvrs[x.var.to_string()], sample[2]))
         # refs[0] is always the final_ref (atom)
         self.refs = d.lambda_refs
-        xtra = filter(lambda x: x not in self.refs, nvrs.itervalues())
+        xtra = complement(nvrs.values(), self.refs)
         self.refs.extend(xtra)
         return d
 
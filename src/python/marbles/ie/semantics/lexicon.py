@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""Compact indexed lexicon for the output of extract_lexicon_from_pt().
+
+The lexicon maps a stem to its usages, and each usage to the set of sentence ids it was seen in. On disk it
+is stored as:
+    - a sorted stem table,
+    - per stem, a range of usages sorted by usage string,
+    - a sorted sentence id table, and
+    - per usage, delta encoded varint postings of sentence id indexes.
+
+All tables are addressed by offset so a CompactLexicon can be memory mapped and queried by stem without
+loading the file.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import array
+import heapq
+import mmap
+import os
+import struct
+import sys
+
+from marbles import safe_utf8_encode, safe_utf8_decode
+
+# magic, version, stem count, usage count, uid count, usage string bytes, postings bytes, stem string
+# bytes, uid string bytes
+_LEXICON_HEADER = struct.Struct(b'<8s8I')
+_LEXICON_MAGIC = b'MBLLEXCN'
+_LEXICON_VERSION = 1
+_U32x2 = struct.Struct(b'<2I')
+
+
+def _u32array():
+    a = array.array(b'I')
+    return a if a.itemsize == 4 else array.array(b'L')
+
+
+def _u32bytes(a):
+    if sys.byteorder != 'little':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+
+def encode_postings(ids, out):
+    """Append delta encoded varints to a bytearray.
+
+    Args:
+        ids: A sorted sequence of non-negative integers.
+        out: The bytearray.
+    """
+    last = 0
+    for i in ids:
+        d = i - last
+        last = i
+        while d >= 0x80:
+            out.append((d & 0x7F) | 0x80)
+            d >>= 7
+        out.append(d)
+
+
+def decode_postings(buf, start, end):
+    """Decode delta encoded varints.
+
+    Returns:
+        A list of integers.
+    """
+    result = []
+    last = 0
+    d = 0
+    shift = 0
+    for b in bytearray(buf[start:end]):
+        d |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            last += d
+            result.append(last)
+            d = 0
+            shift = 0
+    return result
+
+
+def iter_dictionary(dictionary):
+    """Iterate a dictionary returned from extract_lexicon_from_pt() in stem order.
+
+    Yields:
+        A tuple of the utf-8 stem and a dictionary of utf-8 usage strings to sets of uid strings.
+    """
+    stems = {}
+    for d in dictionary:
+        if d is None:
+            continue
+        for stem, usages in d.iteritems():
+            stems[safe_utf8_encode(stem)] = usages
+    for stem in sorted(stems.iterkeys()):
+        yield stem, dict([(safe_utf8_encode(k), v) for k, v in stems[stem].iteritems()])
+
+
+def _write_lexicon(filename, entries, uids):
+    """Write a compact lexicon.
+
+    Args:
+        filename: The output path.
+        entries: An iterable of (utf-8 stem, {utf-8 usage: set(uid)}) sorted by stem.
+        uids: The sorted list of all utf-8 uid strings.
+    """
+    uidmap = dict([(u, i) for i, u in enumerate(uids)])
+    stem_offs = _u32array()
+    stem_strs = []
+    stem_size = 0
+    usage_ranges = _u32array()
+    usage_offs = _u32array()
+    usage_strs = []
+    usage_size = 0
+    post_offs = _u32array()
+    postings = bytearray()
+    stem_offs.append(0)
+    usage_ranges.append(0)
+    usage_offs.append(0)
+    post_offs.append(0)
+    for stem, usages in entries:
+        stem_strs.append(stem)
+        stem_size += len(stem)
+        stem_offs.append(stem_size)
+        for usage in sorted(usages.iterkeys()):
+            usage_strs.append(usage)
+            usage_size += len(usage)
+            usage_offs.append(usage_size)
+            encode_postings(sorted([uidmap[safe_utf8_encode(u)] for u in usages[usage]]), postings)
+            post_offs.append(len(postings))
+        usage_ranges.append(len(usage_strs))
+
+    uid_offs = _u32array()
+    uid_offs.append(0)
+    uid_size = 0
+    for u in uids:
+        uid_size += len(u)
+        uid_offs.append(uid_size)
+
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as fd:
+        fd.write(_LEXICON_HEADER.pack(_LEXICON_MAGIC, _LEXICON_VERSION, len(stem_strs), len(usage_strs), len(uids),
+                                      usage_size, len(postings), stem_size, uid_size))
+        fd.write(_u32bytes(stem_offs))
+        fd.write(_u32bytes(usage_ranges))
+        fd.write(_u32bytes(usage_offs))
+        fd.write(_u32bytes(post_offs))
+        fd.write(_u32bytes(uid_offs))
+        fd.write(b''.join(stem_strs))
+        fd.write(b''.join(usage_strs))
+        fd.write(b''.join(uids))
+        fd.write(bytes(postings))
+    os.rename(tmpname, filename)
+
+
+def save_lexicon(dictionary, filename):
+    """Save a dictionary returned from extract_lexicon_from_pt() as a compact lexicon.
+
+    Args:
+        dictionary: The list of 27 dictionaries.
+        filename: The output path.
+    """
+    uids = set()
+    for d in dictionary:
+        if d is None:
+            continue
+        for usages in d.itervalues():
+            for v in usages.itervalues():
+                uids.update([safe_utf8_encode(u) for u in v])
+    _write_lexicon(filename, iter_dictionary(dictionary), sorted(uids))
+
+
+def merge_lexicons(filename, sources):
+    """Merge lexicons into a new compact lexicon. Use this to add a new corpus to an existing lexicon
+    without loading the existing lexicon into memory.
+
+    Args:
+        filename: The output path. Must not be the path of one of the sources.
+        sources: A list of CompactLexicon instances or dictionaries returned from extract_lexicon_from_pt().
+    """
+    uids = set()
+    iters = []
+    for src in sources:
+        if isinstance(src, CompactLexicon):
+            uids.update(src.iteruids(encoded=True))
+            iters.append(src.iteritems(encoded=True))
+        else:
+            for d in src:
+                if d is None:
+                    continue
+                for usages in d.itervalues():
+                    for v in usages.itervalues():
+                        uids.update([safe_utf8_encode(u) for u in v])
+            iters.append(iter_dictionary(src))
+
+    def merged():
+        stem = None
+        usages = None
+        for s, u in heapq.merge(*iters):
+            if s != stem:
+                if stem is not None:
+                    yield stem, usages
+                stem = s
+                usages = {}
+            for k, v in u.iteritems():
+                usages.setdefault(k, set()).update(v)
+        if stem is not None:
+            yield stem, usages
+
+    _write_lexicon(filename, merged(), sorted(uids))
+
+
+class CompactLexicon(object):
+    """Read-only view of a compact lexicon buffer. Stems are found with a binary search on the sorted stem
+    table and postings are only decoded when a stem is accessed.
+    """
+
+    def __init__(self, buf):
+        """Constructor.
+
+        Args:
+            buf: A buffer containing a lexicon written by save_lexicon() or merge_lexicons().
+        """
+        self._buf = buf
+        self._mmfile = None
+        magic, version, self._nstems, self._nusages, self._nuids, usage_size, post_size, stem_size, uid_size = \
+            _LEXICON_HEADER.unpack_from(buf, 0)
+        if magic != _LEXICON_MAGIC or version != _LEXICON_VERSION:
+            raise ValueError('not a compact lexicon')
+        self._stem_offs = _LEXICON_HEADER.size
+        self._usage_ranges = self._stem_offs + 4 * (self._nstems + 1)
+        self._usage_offs = self._usage_ranges + 4 * (self._nstems + 1)
+        self._post_offs = self._usage_offs + 4 * (self._nusages + 1)
+        self._uid_offs = self._post_offs + 4 * (self._nusages + 1)
+        self._stems = self._uid_offs + 4 * (self._nuids + 1)
+        self._usages = self._stems + stem_size
+        self._uids = self._usages + usage_size
+        self._posts = self._uids + uid_size
+        if len(buf) < self._posts + post_size:
+            raise ValueError('compact lexicon is truncated')
+
+    @classmethod
+    def load(cls, filename):
+        """Memory map a compact lexicon file.
+
+        Returns:
+            A CompactLexicon instance. Call close() when done.
+        """
+        with open(filename, 'rb') as fd:
+            buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        lexicon = CompactLexicon(buf)
+        lexicon._mmfile = buf
+        return lexicon
+
+    def close(self):
+        if self._mmfile is not None:
+            self._mmfile.close()
+            self._mmfile = None
+        self._buf = None
+
+    def _string(self, table, strings, i):
+        start, end = _U32x2.unpack_from(self._buf, table + 4 * i)
+        return self._buf[strings + start:strings + end]
+
+    def _stem(self, i):
+        return self._string(self._stem_offs, self._stems, i)
+
+    def _find(self, stem):
+        lo = 0
+        hi = self._nstems
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._stem(mid) < stem:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self._nstems and self._stem(lo) == stem else -1
+
+    def _entry(self, i, encoded=False):
+        conv = (lambda x: x) if encoded else safe_utf8_decode
+        start, end = _U32x2.unpack_from(self._buf, self._usage_ranges + 4 * i)
+        usages = {}
+        for j in xrange(start, end):
+            pstart, pend = _U32x2.unpack_from(self._buf, self._post_offs + 4 * j)
+            ids = decode_postings(self._buf, self._posts + pstart, self._posts + pend)
+            usage = self._string(self._usage_offs, self._usages, j)
+            usages[conv(usage)] = set([conv(self._string(self._uid_offs, self._uids, k)) for k in ids])
+        return usages
+
+    def __len__(self):
+        return self._nstems
+
+    def __iter__(self):
+        for i in xrange(self._nstems):
+            yield safe_utf8_decode(self._stem(i))
+
+    def __contains__(self, stem):
+        return self._find(safe_utf8_encode(stem)) >= 0
+
+    def __getitem__(self, stem):
+        i = self._find(safe_utf8_encode(stem))
+        if i < 0:
+            raise KeyError(stem)
+        return self._entry(i)
+
+    def get(self, stem, default=None):
+        """Get the usages of a stem.
+
+        Returns:
+            A dictionary of usage strings to sets of sentence ids, as built by extract_lexicon_from_pt(),
+            or `default` if the stem is not in the lexicon.
+        """
+        i = self._find(safe_utf8_encode(stem))
+        return default if i < 0 else self._entry(i)
+
+    def iteritems(self, encoded=False):
+        """Iterate (stem, usages) in stem order."""
+        for i in xrange(self._nstems):
+            stem = self._stem(i)
+            yield (stem if encoded else safe_utf8_decode(stem)), self._entry(i, encoded)
+
+    def iteruids(self, encoded=False):
+        """Iterate the sentence ids in sorted order."""
+        for i in xrange(self._nuids):
+            uid = self._string(self._uid_offs, self._uids, i)
+            yield uid if encoded else safe_utf8_decode(uid)
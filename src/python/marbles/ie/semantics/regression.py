@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""Parallel regression checks over ccgbank derivations with result caching."""
+
+from __future__ import unicode_literals, print_function
+
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import timeit
+
+from marbles import safe_utf8_encode, future_string
+from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation, get_rule, CAT_EMPTY, \
+    RL_TCL_UNARY, RL_TCR_UNARY, RL_TC_ATOM, RL_TC_CONJ, RL_LPASS, RL_RPASS, RL_TYPE_RAISE
+from marbles.ie.ccg.utils import pt_to_utf8
+from marbles.ie.core.constants import CO_NO_VERBNET, CO_NO_WIKI_SEARCH
+from marbles.ie.drt.common import SHOW_LINEAR
+from marbles.ie.semantics.ccg import Ccg2Drs, ExecOp, process_ccg_pt
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+_NORULE_CHECK = [RL_TCL_UNARY, RL_TCR_UNARY, RL_TC_ATOM, RL_TC_CONJ, RL_LPASS, RL_RPASS, RL_TYPE_RAISE]
+
+
+def check_rules(ccgbank):
+    """Check rule selection is unambiguous and each rule produces the result category.
+
+    Returns:
+        The rule names in execution order.
+
+    Raises:
+        ValueError if a rule is ambiguous or does not unify with the result.
+    """
+    ccg = Ccg2Drs()
+    pt = parse_ccg_derivation(ccgbank)
+    ccg.build_execution_sequence(pt)
+    rules = []
+    for op in ccg.exeque:
+        if not isinstance(op, ExecOp):
+            continue
+        left = op.sub_ops[0].category
+        result = op.category
+        right = op.sub_ops[1].category if len(op.sub_ops) == 2 else CAT_EMPTY
+        exclude = []
+        rule = get_rule(left, right, result, exclude)
+        limit = 5
+        while rule is not None and limit > 0:
+            rule = get_rule(left, right, result, exclude)
+            limit -= 1
+        if len(exclude) > 1:
+            raise ValueError('ambiguous rule: %s <- %s <{%s}> %s' % (result, left, exclude, right))
+        if op.rule is not None and op.rule not in _NORULE_CHECK:
+            actual = op.rule.apply_rule_to_category(left.remove_wildcards(), right.remove_wildcards())
+            if not actual.can_unify(result.remove_wildcards()):
+                raise ValueError('%s <!> %s, %s <- %s %s %s' % (actual, result, actual, left, op.rule, right))
+        rules.append(op.rule.rulename if op.rule is not None else 'none')
+    return ' '.join(rules)
+
+
+def check_compose(ccgbank):
+    """Compose a derivation.
+
+    Returns:
+        The linear DRS and the constituents.
+    """
+    pt = parse_ccg_derivation(ccgbank)
+    if future_string != unicode:
+        pt = pt_to_utf8(pt)
+    ccg = process_ccg_pt(pt, CO_NO_VERBNET | CO_NO_WIKI_SEARCH)
+    lines = [ccg.get_drs().show(SHOW_LINEAR)]
+    lines.extend(['%s(%s)' % (c.vntype.signature, c.span.text) for c in ccg.constituents])
+    return '\n'.join(lines)
+
+
+CHECKS = {
+    'rules': check_rules,
+    'compose': check_compose,
+}
+
+
+def get_code_version(root=None):
+    """Get a hash of the python sources. Cached results are invalidated when this changes.
+
+    Args:
+        root: The source folder. Default is the marbles.ie package.
+    """
+    root = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    h = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted([d for d in dirnames if d != 'test'])
+        for fname in sorted(filenames):
+            if fname.endswith('.py'):
+                path = os.path.join(dirpath, fname)
+                h.update(safe_utf8_encode(os.path.relpath(path, root)))
+                with open(path, 'rb') as fd:
+                    h.update(fd.read())
+    return h.hexdigest()[0:12]
+
+
+def get_derivation_key(ccgbank):
+    """Get the cache key of a derivation."""
+    return hashlib.sha1(safe_utf8_encode(ccgbank.strip())).hexdigest()
+
+
+class RegressionResult(object):
+    """The result of a check on a single derivation."""
+
+    def __init__(self, uid, key, passed, elapsed=0.0, digest=None, error=None):
+        self.uid = uid
+        self.key = key
+        self.passed = passed
+        self.elapsed = elapsed
+        self.digest = digest
+        self.error = error
+
+    def get_json(self):
+        return {
+            'uid': self.uid,
+            'passed': self.passed,
+            'elapsed': self.elapsed,
+            'digest': self.digest,
+            'error': self.error
+        }
+
+    @classmethod
+    def from_json(cls, key, d):
+        return RegressionResult(d['uid'], key, d['passed'], d['elapsed'], d['digest'], d['error'])
+
+
+class ResultCache(object):
+    """Results keyed by derivation hash for a single check and code version. Stored as a json file named
+    check-version.json in the cache folder.
+    """
+
+    def __init__(self, path, check, version):
+        self.path = path
+        self.check = check
+        self.version = version
+        self.filename = os.path.join(path, '%s-%s.json' % (check, version))
+        self.results = {}
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as fd:
+                d = json.load(fd)
+            self.results = dict([(k, RegressionResult.from_json(k, v)) for k, v in d.iteritems()])
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def put(self, result):
+        self.results[result.key] = result
+
+    def save(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        with open(self.filename + '.tmp', 'w') as fd:
+            json.dump(dict([(k, v.get_json()) for k, v in self.results.iteritems()]), fd)
+        os.rename(self.filename + '.tmp', self.filename)
+
+    @classmethod
+    def list_versions(cls, path, check):
+        """List cached versions for a check, most recent first."""
+        if not os.path.exists(path):
+            return []
+        prefix = check + '-'
+        files = [x for x in os.listdir(path) if x.startswith(prefix) and x.endswith('.json')]
+        files = sorted(files, key=lambda x: -os.path.getmtime(os.path.join(path, x)))
+        return [x[len(prefix):-5] for x in files]
+
+
+def _run_shard(args):
+    """Run a check over a shard of derivations. Executed in a worker process."""
+    check, shard = args
+    fn = CHECKS[check]
+    results = []
+    for uid, key, ccgbank in shard:
+        start = timeit.default_timer()
+        try:
+            output = fn(ccgbank)
+            result = RegressionResult(uid, key, True, digest=hashlib.sha1(safe_utf8_encode(output)).hexdigest())
+        except Exception as e:
+            result = RegressionResult(uid, key, False, error='%s: %s' % (type(e).__name__, e))
+        result.elapsed = timeit.default_timer() - start
+        results.append(result.get_json())
+        results[-1]['key'] = key
+    return results
+
+
+class RegressionHarness(object):
+    """Shard derivations across processes, cache results keyed by (derivation hash, code version), and
+    rerun only changed or failed derivations.
+    """
+
+    def __init__(self, check='compose', cache_dir=None, processes=None, shard_size=50, version=None):
+        """Constructor.
+
+        Args:
+            check: The name of a check in CHECKS.
+            cache_dir: The cache folder. If None results are not cached.
+            processes: Number of worker processes. Default is the cpu count. If 1 run in this process.
+            shard_size: Number of derivations per work item.
+            version: The code version. Default is get_code_version().
+        """
+        if check not in CHECKS:
+            raise ValueError('unknown check %s' % check)
+        self.check = check
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shard_size = max(1, shard_size)
+        self.version = version or get_code_version()
+        self.cache = ResultCache(cache_dir, check, self.version) if cache_dir is not None else None
+        self.results = []
+        self.cached = 0
+        self.elapsed = 0.0
+
+    def _iter_shards(self, derivations, limit):
+        shard = []
+        count = 0
+        for uid, ccgbank in derivations:
+            if limit is not None and count >= limit:
+                break
+            count += 1
+            key = get_derivation_key(ccgbank)
+            if self.cache is not None:
+                cached = self.cache.get(key)
+                if cached is not None and cached.passed:
+                    cached.uid = uid
+                    self.results.append(cached)
+                    self.cached += 1
+                    continue
+            shard.append((uid, key, ccgbank))
+            if len(shard) >= self.shard_size:
+                yield self.check, shard
+                shard = []
+        if len(shard) != 0:
+            yield self.check, shard
+
+    def run(self, derivations, limit=None, save_every=20):
+        """Run the check.
+
+        Args:
+            derivations: An iterable of (uid, ccgbank) tuples.
+            limit: Optional maximum number of derivations.
+            save_every: Save the cache after this many shards complete.
+        """
+        start = timeit.default_timer()
+        shards = self._iter_shards(derivations, limit)
+        pool = None
+        if self.processes == 1:
+            completed = itertools.imap(_run_shard, shards)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            completed = pool.imap_unordered(_run_shard, shards)
+        try:
+            for n, results in enumerate(completed):
+                for d in results:
+                    result = RegressionResult.from_json(d['key'], d)
+                    self.results.append(result)
+                    if self.cache is not None:
+                        self.cache.put(result)
+                if self.cache is not None and (n + 1) % save_every == 0:
+                    self.cache.save()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            if self.cache is not None:
+                self.cache.save()
+        self.elapsed += timeit.default_timer() - start
+
+    @property
+    def failed(self):
+        return [x for x in self.results if not x.passed]
+
+    @property
+    def executed(self):
+        return len(self.results) - self.cached
+
+    def get_slowest(self, n=10):
+        """Get the slowest derivations. Cached results report the time taken when they were run.
+
+        Returns:
+            A list of RegressionResult instances.
+        """
+        return sorted(self.results, key=lambda x: -x.elapsed)[0:n]
+
+    def get_json(self):
+        return {
+            'check': self.check,
+            'version': self.version,
+            'derivations': len(self.results),
+            'cached': self.cached,
+            'executed': self.executed,
+            'failed': [x.get_json() for x in self.failed],
+            'elapsed': self.elapsed,
+            'throughput': 0.0 if self.elapsed == 0.0 else self.executed / self.elapsed,
+            'slowest': [x.get_json() for x in self.get_slowest()]
+        }
+
+    def print_report(self, stream=None):
+        """Print throughput, failures and the slowest derivations."""
+        lines = ['%s check, version %s' % (self.check, self.version),
+                 '%d derivations, %d cached, %d executed, %d failed' % (len(self.results), self.cached,
+                                                                         self.executed, len(self.failed)),
+                 '%.2f seconds, %.1f derivations/second' % (self.elapsed, self.get_json()['throughput'])]
+        if len(self.failed) != 0:
+            lines.append('failed:')
+            for x in self.failed:
+                lines.append('  %s %s' % (x.uid, x.error))
+        lines.append('slowest:')
+        for x in self.get_slowest():
+            lines.append('  %8.2f ms %s' % (1000.0 * x.elapsed, x.uid))
+        text = '\n'.join(lines)
+        if stream is None:
+            print(text)
+        else:
+            stream.write(text)
+            stream.write('\n')
+
+
+def compare_results(base, current):
+    """Compare two result caches for the same check.
+
+    Args:
+        base: The baseline ResultCache.
+        current: The ResultCache to compare against the baseline.
+
+    Returns:
+        A list of (uid, change) tuples where change is one of 'failed' (passed in the baseline), 'fixed'
+        (failed in the baseline), or 'changed' (passed in both but the output differs).
+    """
+    changes = []
+    for key, c in current.results.iteritems():
+        b = base.get(key)
+        if b is None:
+            continue
+        if b.passed and not c.passed:
+            changes.append((c.uid, 'failed'))
+        elif not b.passed and c.passed:
+            changes.append((c.uid, 'fixed'))
+        elif b.passed and b.digest != c.digest:
+            changes.append((c.uid, 'changed'))
+    return sorted(changes)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import unittest
+import StringIO
+
+from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation
+from marbles.ie.core.batch import SentenceBatch
+from marbles.ie.core.constants import *
+from marbles.ie.semantics.ccg import process_ccg_pt
+from marbles.test import dprint
+
+
+class SentenceBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        txt1 = r'''(<T S[dcl] 1 2> (<T NP 0 2> (<L NP/N DT DT The NP/N>) (<L N NN NN boy N>) ) (<T S[dcl]\NP 0 2>
+        (<L (S[dcl]\NP)/(S[to]\NP) VBZ VBZ wants (S[dcl]\NP)/(S[to]\NP)>) (<T S[to]\NP 0 2>
+        (<L (S[to]\NP)/(S[b]\NP) TO TO to (S[to]\NP)/(S[b]\NP)>) (<T S[b]\NP 0 2>
+        (<L (S[b]\NP)/NP VB VB believe (S[b]\NP)/NP>) (<T NP 0 2> (<L NP/N DT DT the NP/N>)
+        (<L N NN NN girl N>) ) ) ) ) )'''
+        txt2 = r'''(<T S[dcl] 1 2> (<T NP 0 1> (<L N NNP NNP John N>) ) (<T S[dcl]\NP 0 2>
+        (<L (S[dcl]\NP)/NP VBD VBD saw (S[dcl]\NP)/NP>) (<T NP 0 1> (<L N NNP NNP Paul N>) ) ) )'''
+        self.sentences = [process_ccg_pt(parse_ccg_derivation(x), CO_NO_VERBNET|CO_NO_WIKI_SEARCH)
+                          for x in [txt1, txt2]]
+
+    def test1_RoundTrip(self):
+        batch = SentenceBatch.from_sentences(self.sentences)
+        self.assertEqual(2, len(batch))
+        self.assertEqual(sum([len(x) for x in self.sentences]), batch.lexeme_count)
+        for expected, actual in zip(self.sentences, batch):
+            dprint(actual.text)
+            self.assertEqual(expected.text, actual.text)
+            self.assertEqual(len(expected.constituents), len(actual.constituents))
+            for lx, ly in zip(expected, actual):
+                self.assertEqual(lx.idx, ly.idx)
+                self.assertEqual(lx.head, ly.head)
+                self.assertEqual(lx.mask, ly.mask)
+                self.assertEqual(lx.stem, ly.stem)
+                self.assertEqual(lx.pos, ly.pos)
+                self.assertEqual(lx.category, ly.category)
+                self.assertEqual([r.var.to_string() for r in lx.refs], ly.refs)
+            for cx, cy in zip(expected.constituents, actual.constituents):
+                self.assertIs(cx.vntype, cy.vntype)
+                self.assertEqual(cx.span.get_indexes(), cy.span.get_indexes())
+                self.assertEqual(cx.chead, cy.chead)
+
+    def test2_Queries(self):
+        batch = SentenceBatch.from_sentences(self.sentences)
+        required = RT_ENTITY | RT_PROPERNAME
+        gidx = batch.get_mask_index(required, RT_EVENT)
+        expected = []
+        for i, sent in enumerate(self.sentences):
+            start, _ = batch.get_lexeme_range(i)
+            expected.extend([start + j for j in sent.get_span().subspan(required, RT_EVENT).get_indexes()])
+        self.assertListEqual(expected, gidx.tolist())
+        self.assertListEqual([0, 1], sorted(set(batch.get_sentence_index(gidx).tolist())))
+
+        for i, sent in enumerate(self.sentences):
+            start, _ = batch.get_lexeme_range(i)
+            for c in sent.constituents:
+                g = [start + j for j in c.span.get_indexes()]
+                for strict in [False, True]:
+                    hds = [x - start for x in batch.get_head_index(g, strict).tolist()]
+                    self.assertListEqual(c.span.get_head_span(strict).get_indexes(), hds)
+
+        depth = batch.get_depth()
+        self.assertEqual(len(self.sentences), int((depth == 0).sum()))
+        hist = batch.get_pos_histogram()
+        self.assertEqual(2, hist['NNP'])
+        self.assertEqual(2, hist['DT'])
+
+    def test3_SaveLoad(self):
+        batch = SentenceBatch.from_sentences(self.sentences)
+        strm = StringIO.StringIO()
+        batch.save(strm)
+        strm.seek(0)
+        loaded = SentenceBatch.load(strm)
+        self.assertEqual(len(batch), len(loaded))
+        for x, y in zip(batch, loaded):
+            self.assertEqual(x.text, y.text)
+            self.assertEqual([lx.refs for lx in x], [ly.refs for ly in y])
+        self.assertEqual(batch.get_category_histogram(), loaded.get_category_histogram())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import gc
+import unittest
+import json
+import StringIO
+
+from marbles.ie.semantics.benchmark import ComposeBenchmark, compare_benchmarks
+from marbles.test import dprint
+
+
+class ComposeBenchmarkTest(unittest.TestCase):
+
+    def test1_Run(self):
+        txt = r'''(<T S[dcl] 1 2> (<T NP 0 2> (<L NP/N DT DT The NP/N>) (<L N NN NN boy N>) ) (<T S[dcl]\NP 0 2>
+        (<L (S[dcl]\NP)/(S[to]\NP) VBZ VBZ wants (S[dcl]\NP)/(S[to]\NP)>) (<T S[to]\NP 0 2>
+        (<L (S[to]\NP)/(S[b]\NP) TO TO to (S[to]\NP)/(S[b]\NP)>) (<T S[b]\NP 0 2>
+        (<L (S[b]\NP)/NP VB VB believe (S[b]\NP)/NP>) (<T NP 0 2> (<L NP/N DT DT the NP/N>)
+        (<L N NN NN girl N>) ) ) ) ) )'''
+        bench = ComposeBenchmark()
+        bench.run([('boy-girl-1', txt), ('boy-girl-2', txt)])
+        self.assertEqual(2, bench.derivations)
+        self.assertEqual(0, len(bench.failed))
+        # Each derivation has 6 binary rules
+        self.assertEqual(12, sum([x.count for x in bench.stats.itervalues()]))
+        result = bench.get_json('test')
+        strm = StringIO.StringIO()
+        bench.print_report(strm)
+        dprint(strm.getvalue())
+        result = json.loads(json.dumps(result))
+        self.assertEqual(2, result['derivations'])
+        cmp = compare_benchmarks(result, result)
+        self.assertEqual(len(bench.stats), len(cmp))
+        for rule, b, c, r in cmp:
+            self.assertEqual(1.0, r)
+
+    def test2_TraceAlloc(self):
+        txt = r'''(<T S[dcl] 1 2> (<L NP NNP NNP John NP>) (<T S[dcl]\NP 0 2> (<L (S[dcl]\NP)/NP VBZ VBZ likes (S[dcl]\NP)/NP>)
+        (<L NP NNP NNP Mary NP>) ) )'''
+        bench = ComposeBenchmark(trace_alloc=True)
+        bench.run([('john-mary', txt)])
+        self.assertEqual(1, bench.derivations)
+        # Python 2 has no tracemalloc and falls back to garbage collector counts
+        self.assertIn(bench.alloc_unit, ['bytes', 'objects'])
+        self.assertEqual(bench.alloc_unit, bench.get_json()['alloc_unit'])
+        self.assertNotEqual(0, sum([x.alloc for x in bench.stats.itervalues()]))
+        self.assertTrue(gc.isenabled())
+
+
+if __name__ == '__main__':
+    unittest.main()
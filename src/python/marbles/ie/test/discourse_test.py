@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals, print_function
+import unittest
+
+from marbles.ie.core.constants import *
+from marbles.ie.drt.common import SHOW_LINEAR
+from marbles.ie.drt.drs import *
+from marbles.ie.semantics.discourse import DiscourseBuilder
+
+
+def rel(name, *args):
+    return Rel(DRSRelation(name), [DRSRef(x) for x in args])
+
+
+class DiscourseTest(unittest.TestCase):
+
+    def test1_Shift(self):
+        # "John owns a donkey. He does not feed it. Mary feeds it."
+        s1 = DRS([DRSRef('X1'), DRSRef('X2'), DRSRef('E3')],
+                 [rel('John', 'X1'), rel('donkey', 'X2'), rel('owns', 'E3'), rel('_ARG0', 'E3', 'X1'),
+                  rel('_ARG1', 'E3', 'X2')])
+        s2 = DRS([DRSRef('X1'), DRSRef('X2')],
+                 [rel('he', 'X1'), rel('it', 'X2'), Neg(DRS([DRSRef('E3')], [rel('feed', 'E3'),
+                                                                            rel('_ARG0', 'E3', 'X1')]))])
+        s2_text = s2.show(SHOW_LINEAR)
+        s3 = DRS([DRSRef('X1'), DRSRef('X2'), DRSRef('E3')],
+                 [rel('Mary', 'X1'), rel('it', 'X2'), rel('feeds', 'E3'), rel('_ARG0', 'E3', 'X1')])
+        builder = DiscourseBuilder()
+        builder.add_drs(s1, {DRSRef('X1'): RT_PROPERNAME|RT_HUMAN|RT_MALE, DRSRef('X2'): RT_ENTITY,
+                             DRSRef('E3'): RT_EVENT})
+        builder.add_drs(s2, {DRSRef('X1'): RT_ANAPHORA|RT_HUMAN|RT_MALE, DRSRef('X2'): RT_ANAPHORA})
+        builder.add_drs(s3, {DRSRef('X1'): RT_PROPERNAME|RT_HUMAN|RT_FEMALE, DRSRef('X2'): RT_ANAPHORA,
+                             DRSRef('E3'): RT_EVENT})
+        # Sentences are not modified
+        self.assertEqual(s2_text, s2.show(SHOW_LINEAR))
+        self.assertListEqual([(0, 0), (3, 3), (5, 6)], builder.sentences)
+        d = builder.get_drs()
+        self.assertListEqual(['X1', 'X2', 'E3', 'X4', 'X5', 'X7', 'X8', 'E9'],
+                             [r.var.to_string() for r in d.universe])
+        # DRS.variables is not ordered
+        self.assertSetEqual(set(['X4', 'X5', 'E6', 'X7', 'X8', 'E9']),
+                            set([r.var.to_string() for r in d.variables if r not in s1.variables]))
+        self.assertIsNotNone(d.find_condition(Neg(DRS([DRSRef('E6')], [rel('feed', 'E6'),
+                                                                       rel('_ARG0', 'E6', 'X4')]))))
+        self.assertIsNotNone(d.find_condition(rel('_ARG0', 'E9', 'X7')))
+        # The event in the negation is not accessible
+        self.assertEqual(-1, builder.get_position(DRSRef('E6')))
+        self.assertListEqual([DRSRef('X4'), DRSRef('X5')], builder.get_sentence_refs(1))
+
+    def test2_Candidates(self):
+        builder = DiscourseBuilder()
+        masks = [RT_PROPERNAME|RT_HUMAN|RT_MALE, RT_ENTITY, RT_PROPERNAME|RT_HUMAN|RT_FEMALE,
+                 RT_ENTITY|RT_PLURAL, RT_EVENT]
+        for i in range(100):
+            d = DRS([DRSRef('X1'), DRSRef('X2')], [rel('a', 'X1'), rel('b', 'X2')])
+            builder.add_drs(d, {DRSRef('X1'): masks[i % 5], DRSRef('X2'): masks[(i+1) % 5]})
+        self.assertEqual(200, len(builder))
+        he = builder.find_candidates(RT_HUMAN|RT_MALE, before=DRSRef('X101'), limit=3)
+        self.assertListEqual([DRSRef('X100'), DRSRef('X91'), DRSRef('X90')], he)
+        self.assertTrue(all([builder.get_mask(r) & RT_MALE for r in he]))
+        self.assertListEqual([DRSRef('X200'), DRSRef('X199')], builder.find_candidates(0, exclude=0, limit=2))
+        # Events are excluded by default
+        self.assertListEqual([], builder.find_candidates(RT_EVENT))
+        self.assertEqual(40, len(builder.find_candidates(RT_EVENT, exclude=0)))
+        self.assertListEqual([DRSRef('X7'), DRSRef('X6')], builder.find_candidates(RT_PLURAL, before=10))
+        # Intersection agrees with a scan
+        for mask in [RT_HUMAN, RT_HUMAN|RT_FEMALE, RT_ENTITY|RT_PLURAL, RT_PROPERNAME|RT_ENTITY]:
+            expected = [r for r, m, _ in reversed(builder._entries) if (m & mask) == mask and 0 == (m & RT_EVENT)]
+            self.assertListEqual(expected, builder.find_candidates(mask))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals, print_function
+
+import random
+import unittest
+
+from marbles.ie.core.headindex import HeadIndex
+
+
+def random_heads(n, ntrees, rnd):
+    # Lexemes [0, ntrees) are roots, the rest attach to a random lexeme already in a tree.
+    order = range(n)
+    rnd.shuffle(order)
+    heads = [0] * n
+    for k in range(n):
+        i = order[k]
+        heads[i] = i if k < ntrees else order[rnd.randrange(k)]
+    return heads
+
+
+def ancestors(heads, i):
+    result = [i]
+    while heads[i] != i:
+        i = heads[i]
+        result.append(i)
+    return result
+
+
+def brute_head_span(heads, indexes):
+    indexes = set(indexes)
+    return sorted([i for i in indexes if not any([x in indexes for x in ancestors(heads, i)[1:]])])
+
+
+class HeadIndexTest(unittest.TestCase):
+
+    def test1_Queries(self):
+        rnd = random.Random(41)
+        for n, ntrees in [(1, 1), (2, 1), (17, 1), (40, 3), (64, 1)]:
+            heads = random_heads(n, ntrees, rnd)
+            hi = HeadIndex(heads)
+            self.assertEqual(ntrees, len(hi.roots))
+            for u in range(n):
+                self.assertEqual(ancestors(heads, u)[-1], hi.get_root(u))
+                self.assertListEqual(sorted([v for v in range(n) if u in ancestors(heads, v)]),
+                                     sorted(hi.get_subtree(u)))
+                for v in range(n):
+                    self.assertEqual(u in ancestors(heads, v), hi.is_ancestor(u, v))
+                    au = ancestors(heads, u)
+                    av = set(ancestors(heads, v))
+                    common = [x for x in au if x in av]
+                    self.assertEqual(common[0] if len(common) != 0 else -1, hi.get_lowest_common_head(u, v))
+            for _ in range(20):
+                indexes = rnd.sample(range(n), rnd.randint(1, n))
+                self.assertListEqual(brute_head_span(heads, indexes), hi.get_head_indexes(indexes))
+                marked = set(rnd.sample(range(n), rnd.randint(0, n)))
+                expected = [([x for x in ancestors(heads, i)[1:] if x in marked] + [-1])[0] for i in range(n)]
+                self.assertListEqual(expected, hi.get_nearest_ancestors(marked))
+
+    def test2_Cycle(self):
+        # Malformed trees must not loop forever
+        hi = HeadIndex([1, 2, 0, 2])
+        self.assertListEqual([0], hi.roots)
+        self.assertListEqual([0], hi.get_head_indexes([0, 1, 2, 3]))
+        self.assertEqual(0, hi.get_root(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
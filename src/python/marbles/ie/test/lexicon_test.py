@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from marbles.ie.semantics.lexicon import CompactLexicon, save_lexicon, merge_lexicons, encode_postings, \
+    decode_postings
+
+
+def make_dictionary(entries):
+    dictionary = map(lambda x: {}, [None]*27)
+    for stem, usage, uid in entries:
+        idx = ord(stem[0].upper()) - 0x40
+        dictionary[idx].setdefault(stem, {}).setdefault(usage, set()).add(uid)
+    return dictionary
+
+
+class CompactLexiconTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test1_Postings(self):
+        ids = [0, 1, 5, 127, 128, 300, 70000, 2**31]
+        buf = bytearray()
+        encode_postings(ids, buf)
+        self.assertListEqual(ids, decode_postings(bytes(buf), 0, len(buf)))
+
+    def test2_SaveLoad(self):
+        d = make_dictionary([
+            ('give', 'give(X1,X2): (S[dcl]\\NP_1)/NP_2', '00-0001'),
+            ('give', 'give(X1,X2): (S[dcl]\\NP_1)/NP_2', '00-0007'),
+            ('give', 'give(X1): S[dcl]\\NP_1', '01-0003'),
+            ('café', 'café(X1): N/N_1', '00-0002'),
+            ('big', 'big(X1): N/N_1', '00-0002'),
+        ])
+        fname = os.path.join(self.path, 'lexicon.bin')
+        save_lexicon(d, fname)
+        lexicon = CompactLexicon.load(fname)
+        try:
+            self.assertEqual(3, len(lexicon))
+            self.assertListEqual(['big', 'café', 'give'], list(lexicon))
+            self.assertTrue('café' in lexicon)
+            self.assertFalse('take' in lexicon)
+            self.assertIsNone(lexicon.get('take'))
+            self.assertEqual(d[ord('G') - 0x40]['give'], lexicon['give'])
+            self.assertEqual(d[ord('C') - 0x40]['café'], lexicon['café'])
+            self.assertListEqual(['00-0001', '00-0002', '00-0007', '01-0003'], list(lexicon.iteruids()))
+        finally:
+            lexicon.close()
+
+    def test3_Merge(self):
+        d1 = make_dictionary([
+            ('give', 'give(X1,X2): (S[dcl]\\NP_1)/NP_2', '00-0001'),
+            ('big', 'big(X1): N/N_1', '00-0002'),
+        ])
+        d2 = make_dictionary([
+            ('give', 'give(X1,X2): (S[dcl]\\NP_1)/NP_2', '02-0001'),
+            ('give', 'give(X1): S[dcl]\\NP_1', '02-0003'),
+            ('tall', 'tall(X1): N/N_1', '02-0004'),
+        ])
+        f1 = os.path.join(self.path, 'lexicon1.bin')
+        f2 = os.path.join(self.path, 'lexicon2.bin')
+        save_lexicon(d1, f1)
+        lexicon1 = CompactLexicon.load(f1)
+        merge_lexicons(f2, [lexicon1, d2])
+        lexicon1.close()
+        lexicon2 = CompactLexicon.load(f2)
+        try:
+            self.assertListEqual(['big', 'give', 'tall'], list(lexicon2))
+            self.assertEqual({
+                'give(X1,X2): (S[dcl]\\NP_1)/NP_2': set(['00-0001', '02-0001']),
+                'give(X1): S[dcl]\\NP_1': set(['02-0003'])
+            }, lexicon2['give'])
+            self.assertEqual(set(['02-0004']), lexicon2['tall']['tall(X1): N/N_1'])
+        finally:
+            lexicon2.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from marbles.ie.utils.mapreduce import map_ordered, clear_checkpoints, get_checkpoint_path
+
+
+def square(x):
+    return [x, x * x]
+
+
+class MapReduceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test1_Ordered(self):
+        items = range(20)
+        serial = list(map_ordered(square, items, processes=1))
+        parallel = list(map_ordered(square, items, processes=3))
+        self.assertListEqual(serial, parallel)
+        self.assertListEqual([(x, [x, x * x]) for x in items], parallel)
+
+    def test2_Resume(self):
+        items = ['a', 'b', 'c']
+        self.assertListEqual([('a', ['a', 'aa'])], list(map_ordered(lambda x: [x, x + x], items[0:1], 1, self.path)))
+        self.assertTrue(os.path.exists(get_checkpoint_path(self.path, 'a')))
+        # The checkpoint for 'a' is used rather than calling the map function.
+        result = list(map_ordered(lambda x: [x, x * 3], items, 1, self.path))
+        self.assertListEqual([('a', ['a', 'aa']), ('b', ['b', 'bbb']), ('c', ['c', 'ccc'])], result)
+        clear_checkpoints(self.path)
+        self.assertEqual(0, len(os.listdir(self.path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import unittest
+import shutil
+import tempfile
+
+from marbles.ie.semantics.regression import RegressionHarness, ResultCache, compare_results
+from marbles.test import dprint
+
+
+class RegressionHarnessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        txt = r'''(<T S[dcl] 1 2> (<T NP 0 2> (<L NP/N DT DT The NP/N>) (<L N NN NN boy N>) ) (<T S[dcl]\NP 0 2>
+        (<L (S[dcl]\NP)/(S[to]\NP) VBZ VBZ wants (S[dcl]\NP)/(S[to]\NP)>) (<T S[to]\NP 0 2>
+        (<L (S[to]\NP)/(S[b]\NP) TO TO to (S[to]\NP)/(S[b]\NP)>) (<T S[b]\NP 0 2>
+        (<L (S[b]\NP)/NP VB VB believe (S[b]\NP)/NP>) (<T NP 0 2> (<L NP/N DT DT the NP/N>)
+        (<L N NN NN girl N>) ) ) ) ) )'''
+        self.derivations = [('boy-girl', txt), ('broken', '(<T S[dcl] 1 2> (<L NP')]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test1_Cache(self):
+        for check in ['rules', 'compose']:
+            harness = RegressionHarness(check, cache_dir=self.path, processes=1, version='v1')
+            harness.run(self.derivations)
+            self.assertEqual(2, len(harness.results))
+            self.assertEqual(0, harness.cached)
+            self.assertListEqual(['broken'], [x.uid for x in harness.failed])
+
+            # Passed results are cached, failures are run again.
+            harness = RegressionHarness(check, cache_dir=self.path, processes=1, version='v1')
+            harness.run(self.derivations)
+            self.assertEqual(1, harness.cached)
+            self.assertEqual(1, harness.executed)
+            dprint(harness.get_json())
+
+            harness = RegressionHarness(check, cache_dir=self.path, processes=1, version='v2')
+            harness.run(self.derivations[0:1])
+            self.assertEqual(0, harness.cached)
+            self.assertListEqual(['v2', 'v1'], ResultCache.list_versions(self.path, check))
+            base = ResultCache(self.path, check, 'v1')
+            self.assertListEqual([], compare_results(base, harness.cache))
+
+    def test2_Parallel(self):
+        harness = RegressionHarness('compose', processes=2, shard_size=1, version='v1')
+        harness.run(self.derivations * 2)
+        self.assertEqual(4, len(harness.results))
+        self.assertEqual(2, len(harness.failed))
+        self.assertEqual(1, len(set([x.digest for x in harness.results if x.passed])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import json
+import os
+import re
+import timeit
+import unittest
+
+from marbles.ie.utils.text import preprocess_sentence, preprocess_sentences, PreprocessCache
+from marbles.test import dprint
+
+
+datapath = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def load_news_sentences():
+    sentences = []
+    for fn in sorted(os.listdir(datapath)):
+        if not fn.endswith('.json'):
+            continue
+        with open(os.path.join(datapath, fn), 'r') as fd:
+            body = json.load(fd, encoding='utf-8')
+        sentences.append(body['title'])
+        for p in filter(lambda y: len(y) != 0, map(lambda x: x.strip(), body['content'].split('\n'))):
+            # Approximates nltk sent_tokenize, whole paragraphs are also tested
+            sentences.append(p)
+            sentences.extend(filter(lambda x: len(x) != 0, re.split(r'(?<=[.?!"])\s+', p)))
+    return sentences
+
+
+class PreprocessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sentences = load_news_sentences()
+
+    def test1_Equivalence(self):
+        extra = [
+            "He said ′it won't work‵ and they wo n't go.",
+            "The boys' toys cost $5.99, £100 or €1,000.",
+            "“We're here,” said O'Neil's mother; he'd left.",
+            "I ca n't and sha n't go to St.'s church.",
+            "It's the U.S.'s policy: don't 'quote' me.",
+            "Trees grow  in  the woods.",
+            "Dogs",
+            '',
+        ]
+        cache = PreprocessCache(maxsize=50)
+        sentences = self.sentences + extra
+        expected = [preprocess_sentence(s) for s in sentences]
+        self.assertListEqual(expected, preprocess_sentences(sentences))
+        # Twice so the second pass is served from the cache
+        self.assertListEqual(expected, preprocess_sentences(sentences, cache=cache))
+        self.assertListEqual(expected, preprocess_sentences(sentences, cache=cache))
+        self.assertLessEqual(len(cache), 50)
+
+    def test2_Benchmark(self):
+        sentences = self.sentences
+        t1 = timeit.timeit(lambda: [preprocess_sentence(s) for s in sentences], number=5)
+        t2 = timeit.timeit(lambda: preprocess_sentences(sentences), number=5)
+        cache = PreprocessCache()
+        t3 = timeit.timeit(lambda: preprocess_sentences(sentences, cache=cache), number=5)
+        dprint('preprocess %d sentences: single %.1f ms, batch %.1f ms, cached %.1f ms' %
+               (len(sentences), 200.0 * t1, 200.0 * t2, 200.0 * t3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Ordered process pool map with resumable checkpoints."""
+
+from __future__ import unicode_literals, print_function
+import cPickle
+import hashlib
+import itertools
+import multiprocessing
+import os
+from marbles import safe_utf8_encode
+
+
+def get_checkpoint_path(checkpoint_dir, item):
+    """Get the checkpoint file for an item.
+
+    Args:
+        checkpoint_dir: The checkpoint folder.
+        item: The work item. Its repr() is used as the checkpoint key.
+    """
+    return os.path.join(checkpoint_dir, hashlib.sha1(safe_utf8_encode(repr(item))).hexdigest() + '.pkl')
+
+
+class _CheckpointedMap(object):
+    """Wraps the map function so each result is saved before it is returned to the parent process."""
+
+    def __init__(self, mapfn, checkpoint_dir):
+        self.mapfn = mapfn
+        self.checkpoint_dir = checkpoint_dir
+
+    def __call__(self, item):
+        result = self.mapfn(item)
+        if self.checkpoint_dir is not None:
+            filename = get_checkpoint_path(self.checkpoint_dir, item)
+            with open(filename + '.tmp', 'wb') as fd:
+                cPickle.dump(result, fd, cPickle.HIGHEST_PROTOCOL)
+            os.rename(filename + '.tmp', filename)
+        return result
+
+
+def map_ordered(mapfn, items, processes=None, checkpoint_dir=None):
+    """Apply a function to each item in a process pool. Results are returned in item order so a reduce
+    step over the results is deterministic and matches a serial run.
+
+    Args:
+        mapfn: A picklable function taking a single item. The result must be picklable.
+        items: A sequence of work items, for example file names.
+        processes: Number of worker processes. Default is the cpu count. If 1 run in this process.
+        checkpoint_dir: Optional folder. Each result is saved here, and items with a saved result are not
+            run again, so an interrupted run can be resumed.
+
+    Yields:
+        A tuple of the item and its result.
+    """
+    items = list(items)
+    if checkpoint_dir is not None and not os.path.exists(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    done = set()
+    if checkpoint_dir is not None:
+        done = set([i for i in range(len(items)) if os.path.exists(get_checkpoint_path(checkpoint_dir, items[i]))])
+    todo = [items[i] for i in range(len(items)) if i not in done]
+
+    fn = _CheckpointedMap(mapfn, checkpoint_dir)
+    pool = None
+    if (processes or multiprocessing.cpu_count()) == 1 or len(todo) <= 1:
+        results = itertools.imap(fn, todo)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap(fn, todo, chunksize=1)
+    try:
+        for i in range(len(items)):
+            if i in done:
+                with open(get_checkpoint_path(checkpoint_dir, items[i]), 'rb') as fd:
+                    yield items[i], cPickle.load(fd)
+            else:
+                yield items[i], next(results)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def clear_checkpoints(checkpoint_dir):
+    """Remove saved results from a checkpoint folder."""
+    if checkpoint_dir is None or not os.path.exists(checkpoint_dir):
+        return
+    for fname in os.listdir(checkpoint_dir):
+        if fname.endswith('.pkl') or fname.endswith('.pkl.tmp'):
+            os.remove(os.path.join(checkpoint_dir, fname))
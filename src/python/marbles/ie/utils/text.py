@@ -1,4 +1,6 @@
 from __future__ import unicode_literals, print_function
+import collections
+import threading
 import regex as re  # Has better support for unicode
 
 
@@ -13,12 +15,20 @@ _CURRENCY  = re.compile(r"([\u0024\u00a2-\u00a5\u20a0-\u20be\ufe69\uff04\uffe0\u
 _SQ = re.compile(r"(?<=s)([']\s|.?$)", re.UNICODE | re.IGNORECASE)
 _FS = re.compile(r"(\s+(?:[^\W.]+|'s|s'))(\.)$", re.UNICODE | re.IGNORECASE)
 _SP = re.compile(r'\s\s+')
+# Used by preprocess_sentences(). Double quotes and punctuation are both single character rewrites with no
+# context so one pass gives the same result as _UDQUOTE then _UPUNCT.
+_UDQUOTE_UPUNCT = re.compile(r'["\u2033\u2034\u2036\u2037\u201c\u201d(),:;\u00a1\u00a7\u00b6\u00b7\u00bf]', re.UNICODE)
+_NT = re.compile(r"(wo|ca|sha) n't", re.UNICODE)
+# Every quote rewrite needs one of these characters
+_QUOTES = re.compile(r"['\"\u2019\u2032\u2033\u2034\u2036\u2037\u201c\u201d]", re.UNICODE)
 
-def preprocess_sentence(text):
+def preprocess_sentence(text, spellchecker=None):
     """Pre-process a sentence.
 
     Args:
         text: The sentence.
+        spellchecker: Optional marbles.ie.kb.spell.SymSpell instance. If set then spelling errors in lower
+            case words are corrected.
 
     Returns:
         A sentence.
@@ -39,5 +49,90 @@ def preprocess_sentence(text):
     text = text.replace("ca n't", "can't")
     text = text.replace("sha n't", "shan't")
 
-    # TODO: Fixup spelling errors
+    if spellchecker is not None:
+        text = spellchecker.correct_text(text)
     return text
+
+
+def _punct_repl(m):
+    c = m.group(0)
+    return ' " ' if c in '"\u2033\u2034\u2036\u2037\u201c\u201d' else ' ' + c + ' '
+
+
+def _preprocess_sentence_fast(text):
+    # Same result as preprocess_sentence() without a spellchecker.
+    if _QUOTES.search(text) is None:
+        # No quotes or apostrophes so the quote rewrites are no-ops
+        text = _UPUNCT.sub(r' \1 ', text)
+        text = _SQ.sub(r' \1', text)
+        text = _FS.sub(r'\1', text)
+        text = _SP.sub(r' ', text)
+        return _CURRENCY.sub(r'\1 \2', text)
+
+    text = _USQUOTE.sub(r"'\1'", text).replace('\u2019', "'")
+    text = _UDQUOTE_UPUNCT.sub(_punct_repl, text)
+    text = _SQL1.sub(r' \1', text)
+    text = _SQL2.sub(r' \1', text)
+    text = _SQR.sub(r'\1 ', text)
+    text = _SQ.sub(r' \1', text)
+    text = _FS.sub(r'\1', text)
+    text = _SP.sub(r' ', text)
+    text = _CURRENCY.sub(r'\1 \2', text)
+    # wa, ca, sha are not part of the vocab
+    return _NT.sub(r"\1n't", text)
+
+
+class PreprocessCache(object):
+    """Thread safe LRU cache of pre-processed sentences."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, text):
+        with self._lock:
+            result = self._cache.pop(text, None)
+            if result is not None:
+                self._cache[text] = result
+            return result
+
+    def put(self, text, result):
+        with self._lock:
+            self._cache[text] = result
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+
+def preprocess_sentences(sentences, spellchecker=None, cache=None):
+    """Pre-process a list of sentences, for example all sentences in an article. The result is the same as
+    calling preprocess_sentence() for each sentence.
+
+    Args:
+        sentences: A list of sentences.
+        spellchecker: Optional marbles.ie.kb.spell.SymSpell instance. If set then spelling errors in lower
+            case words are corrected.
+        cache: Optional PreprocessCache instance. Duplicate sentences within the list are always processed once.
+
+    Returns:
+        A list of sentences.
+    """
+    done = {}
+    result = []
+    for text in sentences:
+        smod = done.get(text)
+        if smod is None:
+            smod = cache.get(text) if cache is not None else None
+            if smod is None:
+                smod = _preprocess_sentence_fast(text)
+                if cache is not None:
+                    cache.put(text, smod)
+            done[text] = smod
+        result.append(smod)
+
+    if spellchecker is not None:
+        result = [spellchecker.correct_text(x) for x in result]
+    return result
@@ -2,4 +2,6 @@ import foxnews
 import nytimes
 import reuters
 import washingtonpost
-import scraper
\ No newline at end of file
+import scraper
+import pool
+import refresher
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Pool of scraper sessions for archiving articles in parallel."""
+
+from __future__ import unicode_literals, print_function
+import Queue
+import collections
+import threading
+
+import requests
+
+from scraper import Browser, HttpSession, _DOM
+
+
+class _ScraperSession(object):
+    """A worker session. Owns an HttpSession and a lazily created Browser, and one scraper instance per
+    scraper class for each. Sessions are never shared between threads.
+    """
+
+    def __init__(self, browser_factory, timeout):
+        self.browser_factory = browser_factory
+        self.http = HttpSession(timeout=timeout)
+        self.browser = None
+        self.scrapers = {}
+
+    def get_scraper(self, scraper_class, static):
+        key = (scraper_class, static)
+        scraper = self.scrapers.get(key)
+        if scraper is None:
+            if static:
+                scraper = scraper_class(self.http)
+            else:
+                if self.browser is None:
+                    self.browser = self.browser_factory()
+                scraper = scraper_class(self.browser)
+            self.scrapers[key] = scraper
+        return scraper
+
+    def close(self):
+        self.scrapers = {}
+        self.http.close()
+        if self.browser is not None:
+            self.browser.close()
+            self.browser = None
+
+
+class ScraperPool(object):
+    """Archive articles with a pool of scraper sessions. Each session runs on its own thread. Pages are
+    first fetched with plain HTTP and only loaded in a browser if the scraper finds no article text.
+    Cookies are cleared per session by AbsractScraper.cookie_count().
+
+    A task for a domain already at its limit is put on the domain's deferred queue. The worker which
+    completes a task for that domain runs the next deferred task, so no worker waits on a busy domain.
+    """
+
+    def __init__(self, sessions=4, domain_limit=2, use_browser=True, browser_factory=None, timeout=30):
+        """Constructor.
+
+        Args:
+            sessions: Number of scraper sessions.
+            domain_limit: Maximum number of concurrent requests to a single domain.
+            use_browser: If True fall back to a browser when the plain HTTP page has no article text.
+            browser_factory: Callable returning a Browser instance. Defaults to Browser().
+            timeout: HTTP request timeout in seconds.
+        """
+        self.sessions = sessions
+        self.domain_limit = domain_limit
+        self.use_browser = use_browser
+        self.browser_factory = browser_factory or Browser
+        self.timeout = timeout
+        self._tasks = Queue.Queue()
+        self._workers = []
+        # Per domain count of running tasks and queue of tasks waiting for the domain
+        self._active = {}
+        self._deferred = {}
+        self._domains_lock = threading.Lock()
+
+    @staticmethod
+    def _get_domain(link):
+        m = _DOM.match(link)
+        return m.group('domain') if m is not None else ''
+
+    def _acquire_domain(self, domain, task):
+        """Start a task for a domain, or defer it if the domain is at its limit.
+
+        Returns:
+            True if the task can run now.
+        """
+        with self._domains_lock:
+            active = self._active.get(domain, 0)
+            if active >= self.domain_limit:
+                self._deferred.setdefault(domain, collections.deque()).append(task)
+                return False
+            self._active[domain] = active + 1
+            return True
+
+    def _release_domain(self, domain):
+        """Complete a task for a domain.
+
+        Returns:
+            The next deferred task for the domain, which takes over the completed task's slot, or None.
+        """
+        with self._domains_lock:
+            deferred = self._deferred.get(domain)
+            if deferred:
+                return deferred.popleft()
+            self._deferred.pop(domain, None)
+            self._active[domain] -= 1
+            if self._active[domain] == 0:
+                del self._active[domain]
+            return None
+
+    def _archive(self, session, article, scraper_class):
+        try:
+            arc = article.archive(session.get_scraper(scraper_class, True))
+        except requests.RequestException:
+            # Sites often block plain HTTP clients, for example with a 403, but let a browser through
+            if not self.use_browser:
+                raise
+            arc = None
+        if self.use_browser and (arc is None or len(arc['content'].strip()) == 0):
+            arc = article.archive(session.get_scraper(scraper_class, False))
+        return arc
+
+    def _run_worker(self):
+        session = _ScraperSession(self.browser_factory, self.timeout)
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    break
+                domain = self._get_domain(task[0].link)
+                if not self._acquire_domain(domain, task):
+                    continue
+                while task is not None:
+                    article, scraper_class, results = task
+                    try:
+                        results.put((article, self._archive(session, article, scraper_class), None))
+                    except Exception as e:
+                        results.put((article, None, e))
+                    finally:
+                        task = self._release_domain(domain)
+        finally:
+            session.close()
+
+    def start(self):
+        """Start the worker threads. Called automatically by archive()."""
+        while len(self._workers) < self.sessions:
+            th = threading.Thread(target=self._run_worker)
+            th.daemon = True
+            th.start()
+            self._workers.append(th)
+
+    def close(self):
+        """Stop the worker threads and close their sessions."""
+        for _ in self._workers:
+            self._tasks.put(None)
+        for th in self._workers:
+            th.join()
+        self._workers = []
+
+    def archive(self, items, state=None):
+        """Archive articles.
+
+        Args:
+            items: An iterable of (Article, scraper class) tuples.
+            state: Optional ServiceState. Pending articles are dropped once state.terminate is set.
+
+        Yields:
+            A tuple of the article, the archive dictionary, and the exception raised while archiving or
+            None. Results are yielded in completion order.
+        """
+        self.start()
+        results = Queue.Queue()
+        count = 0
+        for article, scraper_class in items:
+            self._tasks.put((article, scraper_class, results))
+            count += 1
+        try:
+            while count > 0:
+                if state is not None and state.terminate:
+                    return
+                try:
+                    result = results.get(timeout=1)
+                except Queue.Empty:
+                    continue
+                count -= 1
+                yield result
+        finally:
+            if count > 0:
+                self._drain(results)
+
+    def _drain(self, results):
+        pending = []
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except Queue.Empty:
+                break
+            if task is None or task[2] is not results:
+                pending.append(task)
+        for task in pending:
+            self._tasks.put(task)
+        with self._domains_lock:
+            for deferred in self._deferred.itervalues():
+                tasks = [x for x in deferred if x[2] is not results]
+                deferred.clear()
+                deferred.extend(tasks)
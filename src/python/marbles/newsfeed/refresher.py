@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Concurrent RSS feed refresh with per-host politeness."""
+
+from __future__ import unicode_literals, print_function
+import logging
+import threading
+import time
+from concurrent import futures
+
+from marbles.log import ExceptionRateLimitedLogAdaptor
+
+
+_actual_logger = logging.getLogger(__name__)
+_logger = ExceptionRateLimitedLogAdaptor(_actual_logger)
+
+
+class _HostGate(object):
+    """Serializes requests to a host and spaces them by a minimum interval."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        delay = self.last + self.interval - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.last = time.time()
+        self.lock.release()
+        return False
+
+
+class FeedRefresher(object):
+    """Refresh a set of feeds concurrently. Feeds on different hosts are fetched in parallel so a refresh
+    takes about as long as the slowest host. Feeds on the same host are fetched one at a time with at
+    least `host_interval` seconds between requests.
+    """
+
+    def __init__(self, max_workers=8, host_interval=1.0, state=None):
+        """Constructor.
+
+        Args:
+            max_workers: Maximum number of concurrent requests.
+            host_interval: Minimum time in seconds between requests to the same host.
+            state: Optional ServiceState. Pending fetches are skipped once state.terminate is set.
+        """
+        self.max_workers = max_workers
+        self.host_interval = host_interval
+        self.state = state
+        self._gates = {}
+        self._gates_lock = threading.Lock()
+        self.stats = {'changed': 0, 'unchanged': 0, 'errors': 0}
+
+    def _get_gate(self, host):
+        with self._gates_lock:
+            gate = self._gates.get(host)
+            if gate is None:
+                gate = _HostGate(self.host_interval)
+                self._gates[host] = gate
+            return gate
+
+    def _refresh_one(self, feed):
+        global _logger
+        if self.state is not None and self.state.terminate:
+            return None
+        with self._get_gate(feed.host):
+            try:
+                return feed.refresh()
+            except Exception as e:
+                _logger.exception('FeedRefresher.refresh %s', feed.link, exc_info=e, rlimitby=feed.link)
+                return None
+
+    def refresh(self, feeds):
+        """Refresh feeds.
+
+        Args:
+            feeds: A list of RssFeed instances.
+
+        Returns:
+            The list of feeds that changed since their last refresh.
+        """
+        feeds = list(feeds)
+        if len(feeds) == 0:
+            return []
+        executor = futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(feeds)))
+        try:
+            results = list(executor.map(self._refresh_one, feeds))
+        finally:
+            executor.shutdown(wait=True)
+
+        changed = []
+        for feed, result in zip(feeds, results):
+            if result is None:
+                self.stats['errors'] += 1
+            elif result:
+                self.stats['changed'] += 1
+                changed.append(feed)
+            else:
+                self.stats['unchanged'] += 1
+        return changed
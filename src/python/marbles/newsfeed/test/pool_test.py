@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import threading
+import time
+import unittest
+import urllib2
+
+from bs4 import BeautifulSoup
+
+from marbles.newsfeed.scraper import AbsractScraper, Article
+from marbles.newsfeed.pool import ScraperPool
+from marbles.test import StubServer
+
+
+def _get_page(request):
+    time.sleep(request.server.delay)
+    if request.path == '/missing':
+        request.send_response(404)
+        request.end_headers()
+        return
+    if request.path == '/blocked' and 'marbles-newsreader' in request.headers.get('User-Agent', ''):
+        request.send_response(403)
+        request.end_headers()
+        return
+    body = b'<html><body><p>Text of %s</p></body></html>' % request.path.encode('utf-8')
+    request.send_response(200)
+    request.send_header('Content-Type', 'text/html; charset=utf-8')
+    request.send_header('Content-Length', str(len(body)))
+    request.end_headers()
+    request.wfile.write(body)
+
+
+class _Entry(object):
+    def __init__(self, link):
+        self.link = link
+        self.id = link
+        self.title = link
+
+
+class _Feed(object):
+    link = 'http://127.0.0.1/'
+
+
+class _TimedArticle(object):
+    """Records the concurrent archive calls for each domain."""
+
+    lock = threading.Lock()
+
+    def __init__(self, link, active, peak):
+        self.link = link
+        self.domain = link.split('/')[2]
+        self.active = active
+        self.peak = peak
+
+    def archive(self, scraper):
+        with self.lock:
+            self.active[self.domain] = self.active.get(self.domain, 0) + 1
+            self.peak[self.domain] = max(self.peak.get(self.domain, 0), self.active[self.domain])
+        time.sleep(0.2)
+        with self.lock:
+            self.active[self.domain] -= 1
+        return {'content': self.link}
+
+
+class _StubBrowser(object):
+    """Browser stand-in which fetches pages with a browser user agent."""
+
+    def __init__(self):
+        self.page_source = ''
+        self.urls = []
+
+    def register_scraper(self, scraper):
+        pass
+
+    def get(self, url):
+        self.urls.append(url)
+        req = urllib2.Request(url, headers={'User-Agent': 'Mozilla/5.0 (stub browser)'})
+        self.page_source = urllib2.urlopen(req).read().decode('utf-8')
+
+    def delete_all_cookies(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _StubScraper(AbsractScraper):
+
+    def __init__(self, *args, **kwargs):
+        super(_StubScraper, self).__init__(*args, **kwargs)
+        self.count = self.max_count = 2
+
+    def get_article_text(self, url):
+        self.browser.get(url)
+        soup = BeautifulSoup(self.browser.page_source, 'html.parser')
+        self.cookie_count()
+        return '\n'.join([p.text for p in soup.find_all('p')])
+
+
+class ScraperPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(_get_page, delay=0.2).start()
+        self.base = self.server.base
+
+    def tearDown(self):
+        self.server.stop()
+
+    def make_items(self, paths):
+        return [(Article(_Entry(self.base + p), _Feed()), _StubScraper) for p in paths]
+
+    def test1_Archive(self):
+        pool = ScraperPool(sessions=2, domain_limit=2, use_browser=False)
+        try:
+            results = list(pool.archive(self.make_items(['/a', '/b', '/missing'])))
+        finally:
+            pool.close()
+        self.assertEqual(3, len(results))
+        content = dict([(a.link.split('/')[-1], arc['content']) for a, arc, error in results if error is None])
+        self.assertEqual({'a': 'Text of /a', 'b': 'Text of /b'}, content)
+        errors = [a.link for a, arc, error in results if error is not None]
+        self.assertListEqual([self.base + '/missing'], errors)
+
+    def test2_Throughput(self):
+        paths = ['/%d' % i for i in range(8)]
+        pool = ScraperPool(sessions=4, domain_limit=4, use_browser=False)
+        try:
+            start = time.time()
+            self.assertEqual(8, len(list(pool.archive(self.make_items(paths)))))
+            parallel = time.time() - start
+        finally:
+            pool.close()
+        # 8 pages at 0.2 seconds each take 1.6 seconds serially.
+        self.assertLess(parallel, 1.0)
+
+        # Domain limit caps concurrent requests to the host.
+        pool = ScraperPool(sessions=4, domain_limit=1, use_browser=False)
+        try:
+            start = time.time()
+            self.assertEqual(4, len(list(pool.archive(self.make_items(paths[0:4])))))
+            capped = time.time() - start
+        finally:
+            pool.close()
+        self.assertGreaterEqual(capped, 0.75)
+
+    def test3_DeferredDomain(self):
+        active = {}
+        peak = {}
+        links = ['http://a.test/%d' % i for i in range(3)] + ['http://b.test/0']
+        items = [(_TimedArticle(x, active, peak), _StubScraper) for x in links]
+        pool = ScraperPool(sessions=2, domain_limit=1, use_browser=False)
+        try:
+            start = time.time()
+            results = [a.link for a, arc, error in pool.archive(items)]
+            elapsed = time.time() - start
+        finally:
+            pool.close()
+        self.assertSetEqual(set(links), set(results))
+        self.assertDictEqual({'a.test': 1, 'b.test': 1}, peak)
+        # The busy domain does not hold up the other domain
+        self.assertIn('http://b.test/0', results[0:2])
+        self.assertLess(elapsed, 0.9)
+
+    def test4_BrowserFallback(self):
+        browsers = []
+
+        def browser_factory():
+            browsers.append(_StubBrowser())
+            return browsers[-1]
+
+        # The plain HTTP fetch gets a 403 so the browser is used
+        pool = ScraperPool(sessions=1, use_browser=True, browser_factory=browser_factory)
+        try:
+            results = list(pool.archive(self.make_items(['/blocked'])))
+        finally:
+            pool.close()
+        self.assertEqual(1, len(results))
+        article, arc, error = results[0]
+        self.assertIsNone(error)
+        self.assertEqual('Text of /blocked', arc['content'])
+        self.assertListEqual([self.base + '/blocked'], browsers[0].urls)
+
+        pool = ScraperPool(sessions=1, use_browser=False, browser_factory=browser_factory)
+        try:
+            results = list(pool.archive(self.make_items(['/blocked'])))
+        finally:
+            pool.close()
+        self.assertIsNotNone(results[0][2])
+        self.assertEqual(1, len(browsers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import threading
+import time
+import unittest
+
+from marbles.newsfeed.scraper import RssFeed
+from marbles.newsfeed.refresher import FeedRefresher
+from marbles.test import StubServer
+
+
+_RSS = b'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Stub</title><link>http://stub.test/</link><description>Stub</description>
+<item><title>Story %d</title><link>http://stub.test/story%d</link><guid>http://stub.test/story%d</guid></item>
+</channel></rss>'''
+
+
+def _get_feed(request):
+    server = request.server
+    with server.lock:
+        server.requests.append((request.path, time.time(), request.headers.get('If-None-Match')))
+    time.sleep(server.delay)
+    etag = '"v%d"' % server.version
+    if request.headers.get('If-None-Match') == etag:
+        request.send_response(304)
+        request.end_headers()
+        return
+    body = _RSS % (server.version, server.version, server.version)
+    request.send_response(200)
+    request.send_header('Content-Type', 'application/rss+xml')
+    request.send_header('Content-Length', str(len(body)))
+    request.send_header('ETag', etag)
+    request.end_headers()
+    request.wfile.write(body)
+
+
+class FeedRefresherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(_get_feed, delay=0.0, version=1, requests=[], lock=threading.Lock()).start()
+        self.port = self.server.port
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test1_ConditionalGet(self):
+        feed = RssFeed('http://127.0.0.1:%d/feed' % self.port)
+        self.assertEqual(1, len(feed.get_articles()))
+        refresher = FeedRefresher(host_interval=0)
+        self.assertListEqual([], refresher.refresh([feed]))
+        self.assertEqual('"v1"', self.server.requests[-1][2])
+        self.assertEqual(1, refresher.stats['unchanged'])
+        self.server.version = 2
+        self.assertListEqual([feed], refresher.refresh([feed]))
+        articles = feed.get_articles()
+        self.assertEqual(1, len(articles))
+        self.assertEqual('http://stub.test/story2', articles[0].entry.id)
+
+    def test2_Concurrent(self):
+        self.server.delay = 0.5
+        # Different host names for the same server so the requests are not serialized.
+        feeds = [RssFeed('http://127.0.0.1:%d/feed' % self.port), RssFeed('http://localhost:%d/feed' % self.port)]
+        self.server.version = 2
+        start = time.time()
+        self.assertEqual(2, len(FeedRefresher(host_interval=0).refresh(feeds)))
+        self.assertLess(time.time() - start, 0.9)
+
+    def test3_Politeness(self):
+        feeds = [RssFeed('http://127.0.0.1:%d/feed%d' % (self.port, i)) for i in range(3)]
+        del self.server.requests[:]
+        FeedRefresher(host_interval=0.3).refresh(feeds)
+        times = sorted([x[1] for x in self.server.requests])
+        self.assertEqual(3, len(times))
+        for i in range(1, len(times)):
+            self.assertGreaterEqual(times[i] - times[i-1], 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
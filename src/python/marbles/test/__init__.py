@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
+import BaseHTTPServer
+import SocketServer
 import inspect
+import threading
 
 
 def isdebugging():
@@ -17,3 +20,48 @@ def dprint(*args, **kwargs):
     global DPRINT_ON
     if DPRINT_ON:
         print(*args, **kwargs)
+
+
+class _StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.do_GET(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded HTTP server on a free local port. GET requests are answered by a test supplied function."""
+    daemon_threads = True
+
+    def __init__(self, do_GET, **kwargs):
+        """Constructor.
+
+        Args:
+            do_GET: A function taking the BaseHTTPRequestHandler instance. The handler's server attribute is
+                this server.
+            kwargs: Attributes set on the server, for example a response delay.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), _StubHandler)
+        self.do_GET = do_GET
+        self.port = self.server_address[1]
+        self.base = 'http://127.0.0.1:%d' % self.port
+        self.thread = None
+        for k, v in kwargs.iteritems():
+            setattr(self, k, v)
+
+    def start(self):
+        """Serve requests on a daemon thread.
+
+        Returns:
+            The server.
+        """
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -123,6 +123,8 @@ class TestAWS(unittest.TestCase):
         self.assertListEqual(actual, expected)
         self.assertEqual(len(nqw.hash_cache), 4)
         self.assertTrue(nqw.check_hash_exists('77a7e0b715396ba02b7fe12aa6c87336'))
+        self.assertTrue(nqw.check_bucket_exists('marbles-ai-feeds-hash'))
+        self.assertFalse(nqw.check_bucket_exists('marbles-ai-no-such-bucket'))
         self.assertTrue(nqw.check_hash_exists('774e08800dfe1aaa4598149cf5208df3'))
         self.assertTrue(nqw.check_hash_exists('a223515d444768b863e3a4d94b2a19a3'))
         self.assertTrue(nqw.check_hash_exists('c0053ac368cf2e5c2599f035f2ee4eea'))
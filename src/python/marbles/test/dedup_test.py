@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from marbles.aws.dedup import BloomFilter, DedupIndex
+
+
+class MockedObject(object):
+    def __init__(self, key):
+        self.key = key
+
+
+class MockedObjects(object):
+    def __init__(self, keys):
+        self.keys = keys
+
+    def all(self):
+        return [MockedObject(k) for k in self.keys]
+
+
+class MockedBucket(object):
+    def __init__(self, keys):
+        self.objects = MockedObjects(keys)
+
+
+def make_hash(i):
+    return hashlib.md5(str(i)).hexdigest()
+
+
+class DedupIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test1_Bloom(self):
+        bf = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bf.add(make_hash(i))
+        for i in range(1000):
+            self.assertTrue(make_hash(i) in bf)
+        fp = len([i for i in range(1000, 11000) if make_hash(i) in bf])
+        self.assertLess(fp, 300)
+
+    def test2_Persist(self):
+        index = DedupIndex(self.path, capacity=16)
+        self.assertTrue(index.add(make_hash(0), 'bucket/a.json'))
+        self.assertFalse(index.add(make_hash(0)))
+        for i in range(1, 40):
+            index.add(make_hash(i))
+        self.assertEqual(40, len(index))
+        self.assertGreaterEqual(index.capacity, 40)
+        index.close()
+
+        index = DedupIndex(self.path)
+        try:
+            self.assertEqual(40, len(index))
+            self.assertTrue(make_hash(39) in index)
+            self.assertFalse(make_hash(40) in index)
+            self.assertEqual('bucket/a.json', index.get(make_hash(0)))
+            self.assertIsNone(index.get(make_hash(40)))
+        finally:
+            index.close()
+
+    def test3_Sync(self):
+        index = DedupIndex(self.path)
+        try:
+            self.assertTrue(index.needs_sync(3600))
+            index.add(make_hash(0))
+            self.assertEqual(2, index.sync(MockedBucket([make_hash(i) for i in range(3)])))
+            self.assertFalse(index.needs_sync(3600))
+            self.assertEqual(3, len(index))
+            self.assertTrue(make_hash(2) in index)
+        finally:
+            index.close()
+
+    def test4_PersistCapacity(self):
+        index = DedupIndex(self.path, capacity=64)
+        for i in range(10):
+            index.add(make_hash(i))
+        index.close()
+        # A rebuild keeps the persisted capacity, not the constructor default
+        os.remove(os.path.join(self.path, 'bloom.bin'))
+        index = DedupIndex(self.path)
+        try:
+            self.assertEqual(64, index.capacity)
+            self.assertEqual(64, index.meta['capacity'])
+            self.assertTrue(make_hash(9) in index)
+        finally:
+            index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
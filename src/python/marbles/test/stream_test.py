@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import json
+import unittest
+
+from marbles.aws.stream import CcgQueueSink, IndexSink, iter_article_sentences
+from marbles.ie.utils.text import preprocess_sentence
+
+
+class MockedTokenizer(object):
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, text):
+        self.calls += 1
+        return [x + '.' for x in text.rstrip('.').split('. ')]
+
+
+class MockedQueue(object):
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, MessageAttributes, MessageBody):
+        self.messages.append(MessageBody)
+        return {'MessageId': str(len(self.messages))}
+
+
+class MockedIndex(object):
+    def __init__(self):
+        self.sentences = []
+        self.batch = None
+
+    def add_sentence(self, entry, mhash, i, j):
+        self.sentences.append((mhash, i, j))
+
+    def begin(self):
+        self.batch = len(self.sentences)
+
+    def commit(self):
+        self.batch = None
+
+    def rollback(self):
+        del self.sentences[self.batch:]
+        self.batch = None
+
+
+def make_entry(n):
+    return {'lexemes': [{'word': 'w%d' % k} for k in range(n)], 'constituents': []}
+
+
+class StreamTest(unittest.TestCase):
+
+    def test1_Sentences(self):
+        tokenizer = MockedTokenizer()
+        content = 'First one. Second one.\n\n  \nThird one.\nFourth. Fifth.'
+        it = iter_article_sentences(content, tokenizer)
+        # Only the first paragraph is tokenized before the first sentence is returned
+        self.assertEqual((0, 0, preprocess_sentence('First one.')), next(it))
+        self.assertEqual(1, tokenizer.calls)
+        expected = [(0, 1, 'Second one.'), (1, 0, 'Third one.'), (2, 0, 'Fourth.'), (2, 1, 'Fifth.')]
+        self.assertListEqual([(i, j, preprocess_sentence(s)) for i, j, s in expected], list(it))
+
+    def test2_CcgSink(self):
+        queue = MockedQueue()
+        sink = CcgQueueSink(queue, {}, limit=4096)
+        sink.begin('hash', make_entry(2))
+        for i in range(100):
+            for j in range(3):
+                sink.add(i, j, make_entry(5))
+                if sink.full:
+                    # Nothing is held once the message is full
+                    self.assertEqual(0, len(sink.current))
+        sink.end()
+        self.assertEqual(1, len(queue.messages))
+        self.assertLess(len(queue.messages[0]), 4096)
+        result = json.loads(queue.messages[0])
+        self.assertGreater(len(result['paragraphs']), 0)
+        self.assertLess(len(result['paragraphs']), 100)
+        self.assertTrue(all([len(p) == 3 for p in result['paragraphs']]))
+        self.assertEqual(100, sink.total)
+
+        # A single paragraph is always sent
+        sink = CcgQueueSink(queue, {}, limit=512)
+        sink.begin('hash', make_entry(2))
+        for j in range(10):
+            sink.add(0, j, make_entry(5))
+        sink.end()
+        self.assertEqual(10, len(json.loads(queue.messages[-1])['paragraphs'][0]))
+
+    def test3_IndexSink(self):
+        index = MockedIndex()
+        sink = IndexSink(index)
+        sink.begin('a', make_entry(1))
+        sink.add(0, 0, make_entry(1))
+        # Sentences are not held by the sink
+        self.assertListEqual([('a', -1, 0), ('a', 0, 0)], index.sentences)
+        sink.abort()
+        sink.begin('b', make_entry(1))
+        sink.add(0, 0, make_entry(1))
+        sink.add(0, 1, make_entry(1))
+        sink.end()
+        self.assertListEqual([('b', -1, 0), ('b', 0, 0), ('b', 0, 1)], index.sentences)
+
+
+if __name__ == '__main__':
+    unittest.main()
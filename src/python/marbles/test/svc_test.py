@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import logging
+import threading
+import time
+import unittest
+
+from marbles.aws import svc
+
+
+class MockedState(svc.ServiceState):
+    def __init__(self, *args, **kwargs):
+        super(MockedState, self).__init__(*args, **kwargs)
+        self.pass_on_exceptions = True
+        self.stop = False
+
+    @property
+    def terminate(self):
+        return self.stop
+
+
+class MockedExecutor(svc.ServiceExecutor):
+    def __init__(self, state):
+        super(MockedExecutor, self).__init__(wakeup=60, state_or_logger=state)
+        self.wakes = 0
+
+    def on_wake(self):
+        self.wakes += 1
+
+
+class WorkSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = MockedState(logging.getLogger(__name__))
+
+    def test1_Backoff(self):
+        results = [0, 0, 0, 0, 3, 0]
+        src = svc.WorkSource('test', lambda: results.pop(0), interval=0, max_interval=4)
+        delays = []
+        for i in range(6):
+            src.run(100)
+            delays.append(src.delay)
+        self.assertListEqual([1, 2, 4, 4, 0, 1], delays)
+        self.assertEqual(101, src.due)
+        self.assertFalse(src.is_ready(100.5))
+        src.notify()
+        self.assertTrue(src.is_ready(100.5))
+
+    def test2_EventLoop(self):
+        executor = MockedExecutor(self.state)
+        runs = []
+
+        def callback():
+            runs.append(time.time())
+            if len(runs) == 2:
+                self.state.stop = True
+            return 0
+
+        src = svc.WorkSource('test', callback, interval=30, max_interval=30)
+        executor.add_work_source(src)
+        # Notify from another thread, the loop must not wait for the 30 second interval
+        timer = threading.Timer(0.2, src.notify)
+        timer.start()
+        start = time.time()
+        executor._run_loop()
+        timer.join()
+        self.assertEqual(2, len(runs))
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(0, executor.wakes)
+
+
+if __name__ == '__main__':
+    unittest.main()
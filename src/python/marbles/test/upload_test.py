@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals, print_function
+import base64
+import threading
+import time
+import unittest
+
+from marbles.aws.upload import UploadStage, retry_with_backoff
+from marbles.test import StubServer
+
+
+def _get_image(request):
+    time.sleep(0.2)
+    if request.path.startswith('/error'):
+        request.send_error(500)
+        return
+    body = b'image:' + request.path.encode('utf-8')
+    request.send_response(200)
+    request.send_header('Content-Type', 'image/jpeg')
+    request.send_header('Content-Length', str(len(body)))
+    request.end_headers()
+    request.wfile.write(body)
+
+
+class MockedS3Client(object):
+    """S3 stand-in. Each put takes 0.2 seconds and the first put of every key fails."""
+
+    def __init__(self):
+        self.objects = {}
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body):
+        time.sleep(0.2)
+        with self.lock:
+            if (Bucket, Key) not in self.failed:
+                self.failed.add((Bucket, Key))
+                raise IOError('connection reset')
+            self.objects[(Bucket, Key)] = Body
+
+
+class MockedQueue(object):
+    def __init__(self):
+        self.batches = []
+
+    def send_messages(self, Entries):
+        self.batches.append(Entries)
+        return {'Successful': [{'Id': e['Id'], 'MessageId': 'msg-' + e['Id']} for e in Entries]}
+
+
+class UploadStageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(_get_image).start()
+        self.base = self.server.base
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test1_Retry(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) < 3:
+                raise IOError('fail')
+            return 'done'
+
+        self.assertEqual('done', retry_with_backoff(fn, retries=3, backoff=0.01))
+        calls = []
+        self.assertRaises(IOError, retry_with_backoff, fn, 1, 0.01)
+
+    def test2_Upload(self):
+        s3 = MockedS3Client()
+        queue = MockedQueue()
+        stage = UploadStage(s3, queue, max_workers=12, backoff=0.01)
+        start = time.time()
+        for i in range(12):
+            hash = '%032x' % i
+            arc = {'title': 'Story', 'media': {'content': [{'url': self.base + '/%d.jpg' % i}], 'thumbnail': 0}}
+            stage.submit(hash, 'bucket', 'story/%s.json' % hash, '{"id": %d}' % i, arc)
+            self.assertTrue(hash in stage)
+        results = stage.close()
+        elapsed = time.time() - start
+        # Serially 12 articles take 12 * (4 puts * 0.2 + 0.2 thumbnail) = 12 seconds.
+        self.assertLess(elapsed, 4.0)
+        self.assertEqual(12, len(results))
+        self.assertTrue(all([r.error is None for r in results]))
+        self.assertEqual(24, len(s3.objects))
+        self.assertEqual('bucket/story/%032x.json' % 3, s3.objects[('marbles-ai-feeds-hash', '%032x' % 3)])
+        # Ten messages per batch
+        self.assertListEqual([10, 2], [len(b) for b in queue.batches])
+        entry = queue.batches[0][0]
+        self.assertEqual(b'image:/' + entry['MessageBody'][7:-1].encode('utf-8') + b'.jpg',
+                         base64.b64decode(entry['MessageAttributes']['media_thumbnail']['StringValue']))
+        self.assertEqual('image/jpeg', entry['MessageAttributes']['media_type']['StringValue'])
+
+    def test3_ThumbnailError(self):
+        s3 = MockedS3Client()
+        queue = MockedQueue()
+        stage = UploadStage(s3, queue, retries=1, backoff=0.01)
+        # Retries are exhausted so the thumbnail fetch raises RetryError
+        arc = {'title': 'Story', 'media': {'content': [{'url': self.base + '/error.jpg'}], 'thumbnail': 0}}
+        stage.submit('%032x' % 1, 'bucket', 'story/1.json', '{"id": 1}', arc)
+        results = stage.close()
+        self.assertEqual(1, len(results))
+        self.assertIsNone(results[0].error)
+        self.assertNotIn('media_thumbnail', queue.batches[0][0]['MessageAttributes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,12 +20,16 @@ else:
 
 from marbles.ie import grpc
 from marbles.aws import svc
+from marbles.aws.svc import WorkSource
 
 
 class CcgParserExecutor(svc.ServiceExecutor):
 
-    def __init__(self, state, news_queue_name, ccg_queue_name, grpc_daemon_name, jar_file, extra_args):
+    def __init__(self, state, news_queue_name, ccg_queue_name, grpc_daemon_name, jar_file, extra_args,
+                 index_dir=None):
         super(CcgParserExecutor, self).__init__(wakeup=5*60, state_or_logger=state)
+        self.index_dir = index_dir
+        self.index = None
         self.grpc_daemon_name = grpc_daemon_name
         self.grpc_daemon = None
         self.parsers = None
@@ -42,22 +46,31 @@ class CcgParserExecutor(svc.ServiceExecutor):
                                                  jarfile=self.jar_file)
         # If we run multiple threads then each thread needs its own resources (S3, SQS etc).
         res = AwsNewsQueueReaderResources(self.grpc_daemon.open_client(), news_queue_name, ccg_queue_name)
+        if self.index_dir is not None:
+            self.index = IndexWriter(self.index_dir)
         self.parsers = [
-            AwsNewsQueueReader(res, state, CO_NO_WIKI_SEARCH)
+            AwsNewsQueueReader(res, state, CO_NO_WIKI_SEARCH, index=self.index)
         ]
+        # The SQS long poll is the wait so the source is never delayed.
+        self.add_work_source(WorkSource('news-queue', self.read_queue))
 
     def on_term(self, graceful):
         pass
 
     def on_shutdown(self):
+        if self.index is not None:
+            self.index.close()
+            self.logger.info('local index flushed')
         if self.grpc_daemon is not None:
             self.grpc_daemon.shutdown()
             self.logger.info('gRPC ccg parser service stopped')
 
-    def on_wake(self):
-        """Called regularly in run loop"""
+    def read_queue(self):
+        """Process news queue messages, long polling for up to 20 seconds when the queue is empty."""
+        count = 0
         for ccgp in self.parsers:
-            ccgp.run()
+            count += ccgp.run(wait_time=20)
+        return count
 
 
 #-jar $ESRLPATH/build/libs/easysrl-$VERSION-standalone.jar --model $ESRLPATH/model/text
@@ -70,12 +83,15 @@ if __name__ == '__main__':
                       help='Jar file. Must be combined with -m.')
     parser.add_option('-m', '--model', type='string', action='store', dest='model_dir',
                       help='Model folder. Must be combined with -m.')
+    parser.add_option('-I', '--index-dir', type='string', action='store', dest='index_dir',
+                      help='Add parsed articles to a local search index in this folder.')
     svc.init_parser_options(parser)
 
     (options, args) = parser.parse_args()
     # Delay import so help is displayed quickly without loading model.
     from marbles.aws import AwsNewsQueueReaderResources, AwsNewsQueueReader
     from marbles.ie.core.constants import CO_NO_WIKI_SEARCH
+    from marbles.ie.kb.localsearch import IndexWriter
 
     grpc_daemon_name = options.grpc_daemon or 'easysrl'
     if ':' in grpc_daemon_name:
@@ -119,5 +135,5 @@ if __name__ == '__main__':
     gargs.extend(['-m', model_dir, '-A', stream_name, '-l', getLevelName(state.root_logger.level)])
     svc = CcgParserExecutor(state, news_queue_name=news_queue_name, ccg_queue_name=ccg_queue_name,
                             grpc_daemon_name=grpc_daemon_name, jar_file=jar_file,
-                            extra_args=gargs)
+                            extra_args=gargs, index_dir=options.index_dir)
     svc.run(thisdir)
@@ -32,6 +32,7 @@ class InfoxService(infox_service_pb2.InfoxServiceServicer):
 
     def __init__(self, ccg_stub, state):
         self.ccg_stub = ccg_stub
+        self.preprocess_cache = PreprocessCache()
         self.state = state
 
     @property
@@ -49,7 +50,7 @@ class InfoxService(infox_service_pb2.InfoxServiceServicer):
 
             try:
                 # EasyXXX does not handle these
-                smod = preprocess_sentence(request.text)
+                smod = preprocess_sentences([request.text], cache=self.preprocess_cache)[0]
                 ccgbank = gsvc.ccg_parse(self.ccg_stub, smod, gsvc.DEFAULT_SESSION)
                 pt = parse_ccg_derivation(ccgbank)
                 ccg = process_ccg_pt(pt, options=request.options)
@@ -161,7 +162,7 @@ if __name__ == '__main__':
     # Delay import so help is displayed quickly without loading model.
     from marbles.ie.ccg import parse_ccg_derivation2 as parse_ccg_derivation
     from marbles.ie.semantics.ccg import process_ccg_pt
-    from marbles.ie.utils.text import preprocess_sentence
+    from marbles.ie.utils.text import preprocess_sentences, PreprocessCache
 
     grpc_daemon_name = options.grpc_daemon or 'easysrl'
     if ':' in grpc_daemon_name:
@@ -16,6 +16,7 @@ terminate = False
 
 from marbles import newsfeed as nf
 from marbles.aws import svc
+from marbles.aws.svc import WorkSource
 
 
 class NewsSource(object):
@@ -29,8 +30,12 @@ class NewsSource(object):
 
 class NewsReaderExecutor(svc.ServiceExecutor):
 
-    def __init__(self, state, news_queue_name, oneshot, ghost_log_file=None):
+    def __init__(self, state, news_queue_name, oneshot, ghost_log_file=None, sessions=0, dedup_dir=None,
+                 upload_workers=0):
         super(NewsReaderExecutor, self).__init__(wakeup=5*60, state_or_logger=state)
+        self.sessions = sessions
+        self.dedup_dir = dedup_dir
+        self.upload_workers = upload_workers
         self.archivers = None
         self.news_queue_name = news_queue_name
         self.ignore_read = True
@@ -38,6 +43,7 @@ class NewsReaderExecutor(svc.ServiceExecutor):
         self.oneshot = oneshot
         self.ghost_log_file = ghost_log_file
         self.browser = None
+        self.feed_source = None
 
     def on_start(self, workdir):
         # If we run multiple theads then each thread needs its own AWS resources (S3, SQS etc).
@@ -51,11 +57,30 @@ class NewsReaderExecutor(svc.ServiceExecutor):
             NewsSource(nf.foxnews.FoxScraper(self.browser), [nf.foxnews.FOX_Politics]),
         ]
 
+        pool = None
+        if self.sessions > 0:
+            pool = nf.pool.ScraperPool(sessions=self.sessions,
+                                       browser_factory=lambda: nf.scraper.Browser(ghost_log_file=self.ghost_log_file))
+        dedup = DedupIndex(self.dedup_dir or os.path.join(workdir, 'dedup'))
+        uploader = None
+        if self.upload_workers > 0:
+            uploader = UploadStage(aws.s3.meta.client, aws.news_queue, max_workers=self.upload_workers)
         self.archivers = [
-            AwsNewsQueueWriter(aws, state, sources, self.browser),
+            AwsNewsQueueWriter(aws, state, sources, self.browser, pool=pool, dedup=dedup, uploader=uploader),
         ]
+        # Feeds are refreshed with conditional requests so checking every minute is cheap. Back off to
+        # five minutes while nothing changes.
+        self.feed_source = WorkSource('news-feeds', self.read_feeds, interval=60, max_interval=5*60)
+        self.add_work_source(self.feed_source)
 
     def on_term(self, graceful):
+        for arc in self.archivers:
+            if arc.pool is not None:
+                arc.pool.close()
+            if arc.uploader is not None:
+                arc.complete_uploads(arc.uploader.close())
+            if arc.dedup is not None:
+                arc.dedup.close()
         self.archivers = []
         self.browser.close()
 
@@ -64,12 +89,22 @@ class NewsReaderExecutor(svc.ServiceExecutor):
         for arc in self.archivers:
             arc.retire_hash_cache(0)    # clears hash cache
             arc.clear_bucket_cache()
+        # Force read now
+        if self.feed_source is not None:
+            self.feed_source.notify()
+
+    def read_feeds(self):
+        """Refresh feeds and archive new articles.
 
-    def on_wake(self):
+        Returns:
+            The number of feeds which changed.
+        """
+        changed = 1
         if self.init_done:
             # Refresh RSS feeds
+            changed = 0
             for arc in self.archivers:
-                arc.refresh()
+                changed += len(arc.refresh())
 
         for arc in self.archivers:
             arc.read_all(self.ignore_read)
@@ -80,6 +115,7 @@ class NewsReaderExecutor(svc.ServiceExecutor):
         self.ignore_read = True
         if self.oneshot:
             self.force_terminate()
+        return changed
 
 
 if __name__ == '__main__':
@@ -89,12 +125,20 @@ if __name__ == '__main__':
                       help='Force read.')
     parser.add_option('-X', '--one-shot', action='store_true', dest='oneshot', default=False,
                       help='Exit after first sync completes.')
+    parser.add_option('-j', '--sessions', type='int', action='store', dest='sessions', default=0,
+                      help='Number of parallel scraper sessions. Default is 0, scrape serially.')
+    parser.add_option('-D', '--dedup-dir', type='string', action='store', dest='dedup_dir', default=None,
+                      help='Local article hash index folder. Default is ./dedup in the working directory.')
+    parser.add_option('-w', '--upload-workers', type='int', action='store', dest='upload_workers', default=0,
+                      help='Number of concurrent S3 upload threads. Default is 0, upload serially.')
     svc.init_parser_options(parser)
 
     (options, args) = parser.parse_args()
 
     # Delay import so help is displayed quickly
     from marbles.aws import AwsNewsQueueWriterResources, AwsNewsQueueWriter
+    from marbles.aws.dedup import DedupIndex
+    from marbles.aws.upload import UploadStage
 
     # Setup logging
     svc_name = os.path.splitext(os.path.basename(__file__))[0]
@@ -102,7 +146,8 @@ if __name__ == '__main__':
     queue_name = args[0] if len(args) != 0 else None
 
     svc = NewsReaderExecutor(state, news_queue_name=queue_name, oneshot=options.oneshot,
-                             ghost_log_file=options.ghost_log_file)
+                             ghost_log_file=options.ghost_log_file, sessions=options.sessions,
+                             dedup_dir=options.dedup_dir, upload_workers=options.upload_workers)
     if options.force_read:
         svc.force_hup()
     svc.run(thisdir)